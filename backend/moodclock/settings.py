@@ -109,6 +109,18 @@ REST_FRAMEWORK = {
 
 GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY", "")
 PROVIDER = os.environ.get("PROVIDER", "composite")
+RECORD_PROVIDER = os.environ.get("RECORD_PROVIDER", "composite")
+REPLAY_PATH = os.environ.get("REPLAY_PATH", str(BASE_DIR / "recordings" / "providers.jsonl.gz"))
+REPLAY_TIME_SCALE = float(os.environ.get("REPLAY_TIME_SCALE", "1"))
+REPLAY_LOOP = os.environ.get("REPLAY_LOOP", "true").lower() == "true"
+REPLAY_MULTIPLIER = int(os.environ.get("REPLAY_MULTIPLIER", "1"))
+REPLAY_LATENCY_MS = float(os.environ.get("REPLAY_LATENCY_MS", "0"))
+REPLAY_JITTER_MS = float(os.environ.get("REPLAY_JITTER_MS", "0"))
+REPLAY_ERROR_RATE = float(os.environ.get("REPLAY_ERROR_RATE", "0"))
+SYNTHETIC_SEED = int(os.environ.get("SYNTHETIC_SEED", "0"))
+SYNTHETIC_TOPICS = int(os.environ.get("SYNTHETIC_TOPICS", "10"))
+SYNTHETIC_POSTS_PER_TOPIC = int(os.environ.get("SYNTHETIC_POSTS_PER_TOPIC", "50"))
+SYNTHETIC_DUPLICATE_RATE = float(os.environ.get("SYNTHETIC_DUPLICATE_RATE", "0.15"))
 X_BEARER_TOKEN = os.environ.get("X_BEARER_TOKEN", "")
 REDDIT_CLIENT_ID = os.environ.get("REDDIT_CLIENT_ID", "")
 REDDIT_CLIENT_SECRET = os.environ.get("REDDIT_CLIENT_SECRET", "")
@@ -117,6 +129,59 @@ SOURCE_WEIGHT_X = float(os.environ.get("SOURCE_WEIGHT_X", "0.6"))
 SOURCE_WEIGHT_REDDIT = float(os.environ.get("SOURCE_WEIGHT_REDDIT", "0.4"))
 TOP_COUNTRIES = [code.strip() for code in os.environ.get("TOP_COUNTRIES", "US,GB,CA,DE,FR,BR,IN,JP,AU,ZA,MX,ES,IT,NL,SE,NO,FI,DK,PL,TR,AR,CL,CO,NG,EG,KE,SA,AE,CN,KR,ID,PH,TH,VN,PK,BD,UA,CH,BE,AT").split(",") if code.strip()]
 WINDOW_MINUTES = int(os.environ.get("WINDOW_MINUTES", "15"))
+REFRESH_DEADLINE_SECONDS = int(os.environ.get("REFRESH_DEADLINE_SECONDS", str(WINDOW_MINUTES * 60)))
+LEXICON_PATH = os.environ.get("LEXICON_PATH", "")
+SCORE_CACHE_SIZE = int(os.environ.get("SCORE_CACHE_SIZE", "100000"))
+SCORE_CACHE_SHARED = os.environ.get("SCORE_CACHE_SHARED", "false").lower() == "true"
+SCORE_CACHE_TTL = int(os.environ.get("SCORE_CACHE_TTL", "86400"))
+SCORING_EXECUTOR = os.environ.get("SCORING_EXECUTOR", "auto")
+SCORING_PARALLEL_THRESHOLD = int(os.environ.get("SCORING_PARALLEL_THRESHOLD", "5000"))
+SCORING_CHUNK_SIZE = int(os.environ.get("SCORING_CHUNK_SIZE", "1000"))
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", "0"))
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "16"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", str(FETCH_WORKERS)))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.3"))
+CIRCUIT_BREAKER_ENABLED = os.environ.get("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = float(os.environ.get("CIRCUIT_COOLDOWN", "30"))
+ADAPTIVE_TIMEOUTS = os.environ.get("ADAPTIVE_TIMEOUTS", "true").lower() == "true"
+ADAPTIVE_TIMEOUT_MIN = float(os.environ.get("ADAPTIVE_TIMEOUT_MIN", "1"))
+HEDGE_ENDPOINTS = {endpoint.strip() for endpoint in os.environ.get("HEDGE_ENDPOINTS", "").split(",") if endpoint.strip()}
+PROVIDER_CONCURRENCY = {
+    "x": int(os.environ.get("X_CONCURRENCY", "4")),
+    "reddit": int(os.environ.get("REDDIT_CONCURRENCY", "4")),
+}
+ASYNC_CONCURRENCY = int(os.environ.get("ASYNC_CONCURRENCY", "256"))
+ASYNC_COUNTRY_CONCURRENCY = int(os.environ.get("ASYNC_COUNTRY_CONCURRENCY", "64"))
+RATE_LIMIT_SCHEDULING = os.environ.get("RATE_LIMIT_SCHEDULING", "true").lower() == "true"
+RATE_LIMIT_RESERVE = int(os.environ.get("RATE_LIMIT_RESERVE", "1"))
+RATE_LIMIT_SPLIT = os.environ.get("RATE_LIMIT_SPLIT", "priority")
+COUNTRY_PRIORITY = {
+    code.strip().upper(): float(weight)
+    for code, _, weight in (item.partition(":") for item in os.environ.get("COUNTRY_PRIORITY", "").split(","))
+    if code.strip() and weight
+}
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTLS = {
+    endpoint.strip(): int(ttl)
+    for endpoint, _, ttl in (
+        item.partition(":") for item in os.environ.get("RESPONSE_CACHE_TTLS", "trends:600,hot:300,search:60").split(",")
+    )
+    if endpoint.strip() and ttl
+}
+RESPONSE_CACHE_WAIT = float(os.environ.get("RESPONSE_CACHE_WAIT", "5"))
+COUNTRY_REGISTRY_CHECK_SECONDS = float(os.environ.get("COUNTRY_REGISTRY_CHECK_SECONDS", "30"))
+INCREMENTAL_INGESTION = os.environ.get("INCREMENTAL_INGESTION", "true").lower() == "true"
+TOPIC_SHARING = os.environ.get("TOPIC_SHARING", "true").lower() == "true"
+TOPIC_SHARING_WAIT = float(os.environ.get("TOPIC_SHARING_WAIT", "30"))
+CURSOR_TTL = int(os.environ.get("CURSOR_TTL", str(WINDOW_MINUTES * 60 * 4)))
+CARRY_FORWARD_WEIGHT = float(os.environ.get("CARRY_FORWARD_WEIGHT", "0.5"))
+METRICS_PUSHGATEWAY_URL = os.environ.get("METRICS_PUSHGATEWAY_URL", "")
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_SIMILARITY = float(os.environ.get("DEDUP_SIMILARITY", "0.95"))
+BROADCAST_DEBOUNCE = float(os.environ.get("BROADCAST_DEBOUNCE", "0"))
+BROADCAST_BUFFER = int(os.environ.get("BROADCAST_BUFFER", "256"))
 ENABLE_THREEJS = os.environ.get("ENABLE_THREEJS", "false").lower() == "true"
 
 CELERY_BROKER_URL = REDIS_URL
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.db.models import Prefetch
 
-from moods.models import Country, MoodDriver, MoodSnapshot, TextSample
+from moods.models import Country, MoodDriver, MoodRollup, MoodSnapshot, TextSample
 
 
 class MoodDriverInline(admin.TabularInline):
@@ -23,6 +23,12 @@ class MoodSnapshotAdmin(admin.ModelAdmin):
     inlines = [MoodDriverInline, TextSampleInline]
 
 
+@admin.register(MoodRollup)
+class MoodRollupAdmin(admin.ModelAdmin):
+    list_display = ("country", "window_start", "window_minutes", "emoji", "mood_score", "energy", "confidence", "n_items")
+    list_filter = ("confidence", "window_minutes")
+
+
 @admin.register(Country)
 class CountryAdmin(admin.ModelAdmin):
     list_display = ("code", "name", "has_trends", "latest_refresh", "latest_items")
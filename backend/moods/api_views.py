@@ -1,22 +1,36 @@
 from __future__ import annotations
 
+from django.db.models import prefetch_related_objects
+from django.http import Http404
 from django.utils import timezone
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from moods.models import Country, MoodSnapshot
-from moods.serializers import CountryDetailSerializer, CountryListSerializer, MoodSnapshotSerializer
+from moods.models import MoodRollup, MoodSnapshot
+from moods.registry import get_country, get_registry
+from moods.rollups import RESOLUTIONS
+from moods.serializers import (
+    CountryDetailSerializer,
+    CountryListSerializer,
+    MoodRollupSerializer,
+    MoodSnapshotSerializer,
+)
 
 
 class CountryListView(APIView):
     def get(self, request):
-        countries = Country.objects.all().prefetch_related("snapshots")
+        countries = [info.to_model() for info in get_registry()]
+        prefetch_related_objects(countries, "snapshots")
         return Response(CountryListSerializer(countries, many=True).data)
 
 
 class CountryDetailView(APIView):
     def get(self, request, code: str):
-        country = Country.objects.prefetch_related("snapshots__drivers", "snapshots__samples").get(code=code.upper())
+        country = get_country(code)
+        if country is None:
+            raise Http404("No such country")
+        prefetch_related_objects([country], "snapshots__drivers", "snapshots__samples")
         return Response(CountryDetailSerializer(country).data)
 
 
@@ -24,6 +38,9 @@ class LatestSnapshotsView(APIView):
     def get(self, request):
         minutes = int(request.query_params.get("minutes", "15"))
         cutoff = timezone.now() - timezone.timedelta(minutes=minutes)
+        if minutes in RESOLUTIONS:
+            rollups = MoodRollup.objects.filter(window_start__gte=cutoff, window_minutes=minutes)
+            return Response(MoodRollupSerializer(rollups, many=True).data)
         snapshots = MoodSnapshot.objects.filter(window_start__gte=cutoff, window_minutes=minutes)
         return Response(MoodSnapshotSerializer(snapshots, many=True).data)
 
@@ -32,5 +49,17 @@ class SnapshotHistoryView(APIView):
     def get(self, request, code: str):
         hours = int(request.query_params.get("hours", "24"))
         cutoff = timezone.now() - timezone.timedelta(hours=hours)
+        resolution = request.query_params.get("resolution")
+        if resolution is not None:
+            resolution = int(resolution)
+            if resolution not in RESOLUTIONS:
+                return Response(
+                    {"detail": f"Unsupported resolution {resolution}; expected one of {list(RESOLUTIONS)} minutes."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rollups = MoodRollup.objects.filter(
+                country__code=code.upper(), window_minutes=resolution, window_start__gte=cutoff
+            )
+            return Response(MoodRollupSerializer(rollups, many=True).data)
         snapshots = MoodSnapshot.objects.filter(country__code=code.upper(), window_start__gte=cutoff)
         return Response(MoodSnapshotSerializer(snapshots, many=True).data)
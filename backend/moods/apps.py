@@ -6,4 +6,12 @@ class MoodsConfig(AppConfig):
     name = "moods"
 
     def ready(self) -> None:
+        import moods.registry  # noqa: F401
         import moods.signals  # noqa: F401
+        from django.conf import settings
+
+        if settings.LEXICON_PATH:
+            from moods.lexicon import Lexicon
+            from moods.scoring import set_lexicon
+
+            set_lexicon(Lexicon.from_file(settings.LEXICON_PATH))
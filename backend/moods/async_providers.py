@@ -0,0 +1,419 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+import weakref
+from typing import Any, Callable, Protocol
+
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from moods.metrics import observe_response
+from moods.providers import (
+    MockProvider,
+    RedditProvider,
+    TrendProvider,
+    TrendTopic,
+    XProvider,
+    country_woeid,
+    merge_source_trends,
+    provider_from_settings,
+    parse_reddit_posts,
+    parse_reddit_trends,
+    parse_x_posts,
+    parse_x_trends,
+    source_limits,
+)
+from moods.ratelimit import RequestDeferred, acquire, record
+from moods.resilience import CircuitOpen, ahedged, before_request, is_open, record_outcome, release_probe, timeout_for
+from moods.response_cache import acached_request
+from moods.transport import aforget_token, aget_token, close_async_clients, get_async_client
+
+logger = logging.getLogger(__name__)
+
+_limits: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]] = weakref.WeakKeyDictionary()
+
+
+class AsyncTrendProvider(Protocol):
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        raise NotImplementedError
+
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        raise NotImplementedError
+
+
+def provider_limit(name: str) -> asyncio.Semaphore:
+    """Cap on in-flight requests to one upstream on the running loop (``ASYNC_CONCURRENCY``)."""
+    limits = _limits.setdefault(asyncio.get_running_loop(), {})
+    limit = limits.get(name)
+    if limit is None:
+        limit = limits[name] = asyncio.Semaphore(max(settings.ASYNC_CONCURRENCY, 1))
+    return limit
+
+
+def limited(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Async counterpart of ``moods.concurrency.limited``."""
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with provider_limit(self.name):
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+async def _observed_request(method: str, url: str, labels: tuple[str, str, str], **kwargs) -> httpx.Response:
+    """Async ``moods.providers._observed_request``, sharing its response cache entries."""
+    return await acached_request(method, url, labels, _send, **kwargs)
+
+
+async def _send(method: str, url: str, labels: tuple[str, str, str], **kwargs) -> httpx.Response:
+    """Async ``moods.providers._send``, behind the same circuits and rate-limit budget."""
+    provider, endpoint = labels[0], labels[1]
+    try:
+        probe = await asyncio.to_thread(before_request, provider, endpoint)
+    except CircuitOpen:
+        observe_response(*labels, "open")
+        raise
+    if not await asyncio.to_thread(acquire, *labels):
+        if probe:
+            release_probe(provider, endpoint)
+        observe_response(*labels, "deferred")
+        raise RequestDeferred(f"{provider} {endpoint} budget spent for {labels[2]}")
+    if "timeout" in kwargs:
+        kwargs["timeout"] = timeout_for(provider, endpoint, kwargs["timeout"])
+    client = get_async_client(provider)
+    started = time.monotonic()
+    try:
+        response = await ahedged(labels, lambda: client.request(method, url, **kwargs))
+    except httpx.HTTPError:
+        observe_response(*labels, "error")
+        await asyncio.to_thread(record_outcome, provider, endpoint, False, None, probe)
+        raise
+    observe_response(*labels, response.status_code)
+    await asyncio.to_thread(
+        record_outcome, provider, endpoint, response.status_code < 500, time.monotonic() - started, probe
+    )
+    await asyncio.to_thread(record, provider, endpoint, response.status_code, response.headers)
+    return response
+
+
+class AsyncXProvider(XProvider):
+    """``XProvider`` on an async client; parsing and cursors behave the same."""
+
+    @limited
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        if not self.bearer_token:
+            return []
+        woeid = await sync_to_async(country_woeid)(country)
+        if woeid:
+            url, params = f"{self.BASE_URL}/trends/by/woeid/{woeid}", None
+        else:
+            url, params = f"{self.BASE_URL}/tweets/search/recent", {"query": country, "max_results": 10}
+        try:
+            response = await _observed_request(
+                "GET", url, headers=self._headers(), params=params, timeout=10, labels=(self.name, "trends", country)
+            )
+            if response.status_code == 429:
+                logger.warning("X rate limit hit for trends")
+                return []
+            if response.status_code >= 400:
+                logger.warning("X trends error: %s", response.text)
+                return []
+            return parse_x_trends(response.json(), by_woeid=bool(woeid))
+        except RequestDeferred:
+            return []
+        except httpx.HTTPError as exc:
+            logger.exception("X trends request failed: %s", exc)
+            return []
+
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        posts, _ = await self.sample_new_posts(country, topic, limit, cursor=None)
+        return posts
+
+    @limited
+    async def sample_new_posts(
+        self, country: str, topic: str, limit: int, cursor: str | None
+    ) -> tuple[list[str], str | None]:
+        if not self.bearer_token:
+            return [], cursor
+        params = {"query": f"{topic} lang:en -is:retweet", "max_results": min(limit, 100)}
+        if cursor:
+            params["since_id"] = cursor
+        try:
+            response = await _observed_request(
+                "GET",
+                f"{self.BASE_URL}/tweets/search/recent",
+                headers=self._headers(),
+                params=params,
+                timeout=10,
+                labels=(self.name, "search", country),
+            )
+            if response.status_code == 429:
+                logger.warning("X rate limit hit for search")
+                return [], cursor
+            if response.status_code >= 400:
+                logger.warning("X search error: %s", response.text)
+                return [], cursor
+            posts, newest = parse_x_posts(response.json())
+            return posts, newest or cursor
+        except RequestDeferred:
+            return [], cursor
+        except httpx.HTTPError as exc:
+            logger.exception("X search request failed: %s", exc)
+            return [], cursor
+
+
+class AsyncRedditProvider(RedditProvider):
+    """``RedditProvider`` on an async client, sharing its OAuth token cache entries."""
+
+    async def _get_token(self) -> str | None:
+        if not self.client_id or not self.client_secret:
+            return None
+        return await aget_token(self.name, self.client_id, self._fetch_token)
+
+    async def _fetch_token(self) -> tuple[str, int] | None:
+        try:
+            response = await _observed_request(
+                "POST",
+                self.TOKEN_URL,
+                auth=(self.client_id, self.client_secret),
+                data={"grant_type": "client_credentials"},
+                headers={"User-Agent": self.user_agent},
+                timeout=10,
+                labels=(self.name, "token", ""),
+            )
+            if response.status_code >= 400:
+                logger.warning("Reddit token error: %s", response.text)
+                return None
+            payload = response.json()
+            if not payload.get("access_token"):
+                return None
+            return payload["access_token"], int(payload.get("expires_in", 3600))
+        except httpx.HTTPError as exc:
+            logger.exception("Reddit token request failed: %s", exc)
+            return None
+
+    @limited
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        token = await self._get_token()
+        if not token:
+            return []
+        subreddits = [f"{country.lower()}news", f"{country.lower()}"]
+        responses = await asyncio.gather(
+            *(
+                _observed_request(
+                    "GET",
+                    f"{self.BASE_URL}/r/{subreddit}/hot",
+                    headers=self._headers(token),
+                    params={"limit": 5},
+                    timeout=10,
+                    labels=(self.name, "hot", country),
+                )
+                for subreddit in subreddits
+            ),
+            return_exceptions=True,
+        )
+        topics: list[TrendTopic] = []
+        for response in responses:
+            if isinstance(response, (httpx.HTTPError, RequestDeferred)):
+                continue
+            if isinstance(response, BaseException):
+                raise response
+            if response.status_code == 401:
+                await aforget_token(self.name, self.client_id)
+            if response.status_code >= 400:
+                continue
+            topics.extend(parse_reddit_trends(response.json()))
+        return topics
+
+    @limited
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        posts, _ = await self._search(country, topic, limit, {"sort": "hot"})
+        return posts
+
+    @limited
+    async def sample_new_posts(
+        self, country: str, topic: str, limit: int, cursor: str | None
+    ) -> tuple[list[str], str | None]:
+        params = {"sort": "new"}
+        if cursor:
+            params["before"] = cursor
+        posts, newest = await self._search(country, topic, limit, params)
+        return posts, newest or cursor
+
+    async def _search(self, country: str, topic: str, limit: int, params: dict[str, str]) -> tuple[list[str], str | None]:
+        token = await self._get_token()
+        if not token:
+            return [], None
+        try:
+            response = await _observed_request(
+                "GET",
+                f"{self.BASE_URL}/search",
+                headers=self._headers(token),
+                params={"q": topic, "limit": min(limit, 100), **params},
+                timeout=10,
+                labels=(self.name, "search", country),
+            )
+            if response.status_code == 401:
+                await aforget_token(self.name, self.client_id)
+            if response.status_code >= 400:
+                return [], None
+            return parse_reddit_posts(response.json())
+        except (httpx.HTTPError, RequestDeferred):
+            return [], None
+
+
+class AsyncCompositeProvider:
+    name = "composite"
+    global_search = True
+
+    def __init__(self, x_provider: AsyncTrendProvider, reddit_provider: AsyncTrendProvider) -> None:
+        self.x_provider = x_provider
+        self.reddit_provider = reddit_provider
+
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        x_trends, reddit_trends = await asyncio.gather(
+            self.x_provider.get_trends(country), self.reddit_provider.get_trends(country)
+        )
+        return merge_source_trends(x_trends, reddit_trends)
+
+    async def _search_sources(self, limit: int) -> list[tuple[str, AsyncTrendProvider, int]]:
+        x_open, reddit_open = await asyncio.gather(
+            asyncio.to_thread(is_open, self.x_provider.name, "search"),
+            asyncio.to_thread(is_open, self.reddit_provider.name, "search"),
+        )
+        x_limit, reddit_limit = source_limits(limit, x_open, reddit_open)
+        sources = [("x", self.x_provider, x_limit), ("reddit", self.reddit_provider, reddit_limit)]
+        return [source for source in sources if source[2]]
+
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        sources = await self._search_sources(limit)
+        batches = await asyncio.gather(
+            *(source.sample_posts(country, topic, source_limit) for _, source, source_limit in sources)
+        )
+        return [post for batch in batches for post in batch]
+
+    async def sample_new_posts(self, country: str, topic: str, limit: int, cursor: dict | None) -> tuple[list[str], dict]:
+        cursor = cursor or {}
+        sources = await self._search_sources(limit)
+        results = await asyncio.gather(
+            *(
+                source.sample_new_posts(country, topic, source_limit, cursor.get(key))
+                for key, source, source_limit in sources
+            )
+        )
+        posts: list[str] = []
+        next_cursor = {"x": cursor.get("x"), "reddit": cursor.get("reddit")}
+        for (key, _, _), (source_posts, source_cursor) in zip(sources, results):
+            posts.extend(source_posts)
+            next_cursor[key] = source_cursor
+        return posts, next_cursor
+
+
+class AsyncMockProvider(MockProvider):
+    """``MockProvider`` with coroutine methods; results are identical."""
+
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        return MockProvider.get_trends(self, country)
+
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        return MockProvider.sample_posts(self, country, topic, limit)
+
+
+class AsyncProviderAdapter:
+    """Run a sync ``TrendProvider`` on the async path, each call in a worker thread."""
+
+    def __init__(self, provider: TrendProvider) -> None:
+        self.provider = provider
+        self.name = getattr(provider, "name", type(provider).__name__.lower())
+        self.global_search = getattr(provider, "global_search", False)
+
+    async def get_trends(self, country: str) -> list[TrendTopic]:
+        return await asyncio.to_thread(self.provider.get_trends, country)
+
+    async def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        return await asyncio.to_thread(self.provider.sample_posts, country, topic, limit)
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Expose sample_new_posts only when the wrapped provider has it, since its
+        # presence is what turns on incremental ingestion.
+        if attribute != "sample_new_posts":
+            raise AttributeError(attribute)
+        method = getattr(self.provider, attribute)
+
+        async def sample_new_posts(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return sample_new_posts
+
+
+class SyncProviderAdapter:
+    """Expose an ``AsyncTrendProvider`` to the existing sync callers.
+
+    Every call runs to completion on its own short-lived loop, whose HTTP clients are
+    closed before it returns, so the adapter is safe from any thread.
+    """
+
+    def __init__(self, provider: AsyncTrendProvider) -> None:
+        self.provider = provider
+        self.name = getattr(provider, "name", type(provider).__name__.lower())
+        self.global_search = getattr(provider, "global_search", False)
+
+    def get_trends(self, country: str) -> list[TrendTopic]:
+        return run_sync(self.provider.get_trends, country)
+
+    def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        return run_sync(self.provider.sample_posts, country, topic, limit)
+
+    def __getattr__(self, attribute: str) -> Any:
+        if attribute != "sample_new_posts":
+            raise AttributeError(attribute)
+        method = getattr(self.provider, attribute)
+        return functools.partial(run_sync, method)
+
+
+def run_sync(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call coroutine function ``fn`` from sync code and close the loop's clients after."""
+
+    async def call():
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            await close_async_clients()
+
+    return async_to_sync(call)()
+
+
+def as_async(provider: TrendProvider | AsyncTrendProvider) -> AsyncTrendProvider:
+    if isinstance(provider, SyncProviderAdapter):
+        return provider.provider
+    if asyncio.iscoroutinefunction(getattr(provider, "get_trends", None)):
+        return provider
+    return AsyncProviderAdapter(provider)
+
+
+def async_provider_from_settings() -> AsyncTrendProvider:
+    """Async counterpart of ``provider_from_settings``, with the same fallbacks to the mock."""
+    provider = settings.PROVIDER
+    if provider in {"record", "replay", "synthetic"}:
+        return AsyncProviderAdapter(provider_from_settings())
+    if provider == "x":
+        if not settings.X_BEARER_TOKEN:
+            return AsyncMockProvider()
+        return AsyncXProvider(settings.X_BEARER_TOKEN)
+    if provider == "reddit":
+        if not settings.REDDIT_CLIENT_ID or not settings.REDDIT_CLIENT_SECRET:
+            return AsyncMockProvider()
+        return AsyncRedditProvider(settings.REDDIT_CLIENT_ID, settings.REDDIT_CLIENT_SECRET, settings.REDDIT_USER_AGENT)
+    if provider == "composite":
+        if not settings.X_BEARER_TOKEN or not settings.REDDIT_CLIENT_ID or not settings.REDDIT_CLIENT_SECRET:
+            return AsyncMockProvider()
+        return AsyncCompositeProvider(
+            AsyncXProvider(settings.X_BEARER_TOKEN),
+            AsyncRedditProvider(settings.REDDIT_CLIENT_ID, settings.REDDIT_CLIENT_SECRET, settings.REDDIT_USER_AGENT),
+        )
+    return AsyncMockProvider()
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import json
+import platform
+import random
+import statistics
+import string
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from moods.models import Country
+from moods.registry import invalidate as invalidate_countries
+from moods.score_cache import get_score_cache, local_score_cache
+from moods.scoring import aggregate_scores, score_text, variance
+from moods.services import refresh_all, refresh_country
+from moods.synthetic import SyntheticProvider, WorkloadShape, generate_posts
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_COUNTRIES = (40, 200, 1_000)
+TOPICS_PER_COUNTRY = 10
+POSTS_PER_COUNTRY = 200
+# p99 is only reported for at least this many samples; the max is always reported.
+PERCENTILE_SAMPLES = 100
+
+
+@dataclass
+class BenchmarkResult:
+    case: str
+    size: int
+    throughput: float
+    p50_ms: float
+    p99_ms: float | None
+    max_ms: float
+    peak_memory_kb: float
+    queries: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.case}:{self.size}"
+
+
+def synthetic_posts(count: int, seed: int = 7) -> list[str]:
+    return generate_posts(random.Random(seed), count)
+
+
+def benchmark_provider(posts_per_country: int) -> SyntheticProvider:
+    shape = WorkloadShape(topics_per_country=TOPICS_PER_COUNTRY, posts_per_topic=max(posts_per_country // TOPICS_PER_COUNTRY, 1))
+    return SyntheticProvider(seed=7, shape=shape)
+
+
+def _percentile(samples: list[float], percentile: float) -> float | None:
+    """The percentile in milliseconds, or ``None`` with too few samples for it to differ from the max."""
+    if len(samples) < PERCENTILE_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    index = min(int(round(percentile / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index] * 1000
+
+
+class _QueryCounter:
+    """``execute_wrapper`` hook; unlike CaptureQueriesContext it has no 9000-query cap."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _measure(case: str, size: int, units: int, run: Callable[[], object], repeat: int) -> BenchmarkResult:
+    """Time ``run`` ``repeat`` times, then once more under tracemalloc for peak memory."""
+    latencies = []
+    queries = []
+    for _ in range(repeat):
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - start)
+        queries.append(counter.count)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return BenchmarkResult(
+        case=case,
+        size=size,
+        throughput=units * repeat / sum(latencies),
+        p50_ms=statistics.median(latencies) * 1000,
+        p99_ms=_percentile(latencies, 99),
+        max_ms=max(latencies) * 1000,
+        peak_memory_kb=peak / 1024,
+        queries=statistics.mean(queries),
+    )
+
+
+def _measure_per_item(case: str, posts: list[str], run: Callable[[str], object]) -> BenchmarkResult:
+    latencies = []
+    started = time.perf_counter()
+    for post in posts:
+        start = time.perf_counter()
+        run(post)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    for post in posts[:1000]:
+        run(post)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return BenchmarkResult(
+        case=case,
+        size=len(posts),
+        throughput=len(posts) / elapsed,
+        p50_ms=statistics.median(latencies) * 1000,
+        p99_ms=_percentile(latencies, 99),
+        max_ms=max(latencies) * 1000,
+        peak_memory_kb=peak / 1024,
+        queries=0,
+    )
+
+
+def _benchmark_country_codes(count: int) -> list[str]:
+    """Two-character codes not already used by real countries, so benchmarks run against a seeded database.
+
+    Codes with a digit come first since no real country has one.
+    """
+    existing = set(Country.objects.values_list("code", flat=True))
+    alphabet = string.digits + string.ascii_uppercase
+    candidates = sorted((first + second for first in alphabet for second in alphabet), key=str.isalpha)
+    codes = [code for code in candidates if code not in existing][:count]
+    if len(codes) < count:
+        raise ValueError(f"Only {len(codes)} unused country codes left for {count} benchmark countries")
+    return codes
+
+
+def _reset_caches() -> None:
+    """Forget scores from earlier runs, so every repeat scores its posts from scratch."""
+    cache = get_score_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def _refresh_all(provider: SyntheticProvider) -> None:
+    _reset_caches()
+    refresh_all(provider=provider, window_minutes=15)
+
+
+def run_benchmarks(
+    sizes: tuple[int, ...] = DEFAULT_SIZES,
+    countries: tuple[int, ...] = DEFAULT_COUNTRIES,
+    log: Callable[[str], None] = print,
+) -> list[BenchmarkResult]:
+    """Run every case inside a rolled-back transaction so the database is left untouched."""
+    results: list[BenchmarkResult] = []
+
+    def record(result: BenchmarkResult) -> None:
+        results.append(result)
+        p99 = "-" if result.p99_ms is None else f"{result.p99_ms:.3f}ms"
+        log(f"{result.key:<24} {result.throughput:>12.1f}/s  p50 {result.p50_ms:9.3f}ms  p99 {p99:>11}  "
+            f"max {result.max_ms:9.3f}ms  peak {result.peak_memory_kb:10.1f}KB  queries {result.queries:.1f}")
+
+    layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    # Scores are cached locally and cleared before every run; the synthetic provider
+    # sends no requests, and the response cache is off so no run can be served from it.
+    isolated = override_settings(CHANNEL_LAYERS=layers, RESPONSE_CACHE_ENABLED=False, INCREMENTAL_INGESTION=False)
+    with isolated, local_score_cache(), transaction.atomic():
+        for size in sizes:
+            posts = synthetic_posts(size)
+            _reset_caches()
+            record(_measure_per_item("score_text", posts, score_text))
+            items = [score_text(post) for post in posts]
+            repeat = max(3, min(20, 1_000_000 // size))
+            record(_measure("aggregate_scores", size, size, lambda: aggregate_scores(items), repeat))
+            polarities = [item.polarity for item in items]
+            record(_measure("variance", size, size, lambda: variance(polarities), repeat))
+            del items, polarities
+
+            code = _benchmark_country_codes(1)[0]
+            country = Country.objects.create(code=code, name="Benchmark", has_trends=True, centroid_lat=0, centroid_lng=0)
+            provider = benchmark_provider(size)
+
+            def refresh_one() -> None:
+                _reset_caches()
+                refresh_country(country, provider=provider, window_minutes=15)
+
+            record(_measure("refresh_country", size, size, refresh_one, repeat=3))
+            country.delete()
+
+        provider = benchmark_provider(POSTS_PER_COUNTRY)
+        for count in countries:
+            codes = _benchmark_country_codes(count)
+            Country.objects.bulk_create(
+                Country(code=code, name=f"Benchmark {code}", has_trends=True, centroid_lat=0, centroid_lng=0)
+                for code in codes
+            )
+            invalidate_countries()
+            with override_settings(TOP_COUNTRIES=codes):
+                record(_measure("refresh_all", count, count, lambda: _refresh_all(provider), repeat=3))
+            Country.objects.filter(code__in=codes).delete()
+        transaction.set_rollback(True)
+    # Bulk writes and the rollback bypass the registry's signals.
+    invalidate_countries()
+    return results
+
+
+def write_results(results: list[BenchmarkResult], path: str | Path) -> None:
+    payload = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": [asdict(result) for result in results],
+    }
+    Path(path).write_text(json.dumps(payload, indent=2) + "\n")
+
+
+def compare_to_baseline(results: list[BenchmarkResult], baseline_path: str | Path, tolerance: float) -> list[str]:
+    """Regression messages for cases slower, hungrier or chattier than the stored baseline."""
+    baseline = {
+        f"{entry['case']}:{entry['size']}": entry
+        for entry in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    regressions = []
+    for result in results:
+        reference = baseline.get(result.key)
+        if reference is None:
+            continue
+        if result.throughput < reference["throughput"] * (1 - tolerance):
+            regressions.append(f"{result.key} throughput {result.throughput:.1f}/s < baseline {reference['throughput']:.1f}/s")
+        if result.p99_ms is not None and reference.get("p99_ms") is not None:
+            if result.p99_ms > reference["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{result.key} p99 {result.p99_ms:.3f}ms > baseline {reference['p99_ms']:.3f}ms")
+        elif reference.get("max_ms") is not None and result.max_ms > reference["max_ms"] * (1 + tolerance):
+            regressions.append(f"{result.key} max {result.max_ms:.3f}ms > baseline {reference['max_ms']:.3f}ms")
+        if result.peak_memory_kb > reference["peak_memory_kb"] * (1 + tolerance):
+            regressions.append(
+                f"{result.key} peak memory {result.peak_memory_kb:.1f}KB > baseline {reference['peak_memory_kb']:.1f}KB"
+            )
+        if result.queries > reference["queries"]:
+            regressions.append(f"{result.key} queries {result.queries:.1f} > baseline {reference['queries']:.1f}")
+    return regressions
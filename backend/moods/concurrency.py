@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, TypeVar
+
+from django.conf import settings
+from django.db import connections
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Topic fan-out and per-source fan-out use separate pools: a topic task blocks on its
+# source tasks, so sharing one bounded pool could deadlock once every worker waits.
+STAGES = ("topics", "sources")
+
+_pools: dict[str, ThreadPoolExecutor] = {}
+_limits: dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+def _get_pool(stage: str) -> ThreadPoolExecutor:
+    with _lock:
+        pool = _pools.get(stage)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=settings.FETCH_WORKERS, thread_name_prefix=f"fetch-{stage}")
+            _pools[stage] = pool
+        return pool
+
+
+def _release_connections(fn: Callable[[T], R], item: T) -> R:
+    try:
+        return fn(item)
+    finally:
+        # Worker threads outlive the call; don't leave their DB connections open.
+        connections.close_all()
+
+
+def fetch_ordered(stage: str, fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+    """``[fn(item) for item in items]`` with the calls made concurrently on ``stage``'s pool.
+
+    Results keep the order of ``items`` regardless of completion order, so callers stay
+    deterministic. With ``FETCH_WORKERS`` <= 1 or a single item the calls run inline.
+    """
+    items = list(items)
+    if settings.FETCH_WORKERS <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(_get_pool(stage).map(functools.partial(_release_connections, fn), items))
+
+
+def provider_limit(name: str) -> threading.BoundedSemaphore:
+    """Process-wide cap on in-flight requests to one upstream (``PROVIDER_CONCURRENCY``)."""
+    with _lock:
+        limit = _limits.get(name)
+        if limit is None:
+            limit = threading.BoundedSemaphore(max(settings.PROVIDER_CONCURRENCY.get(name, settings.FETCH_WORKERS), 1))
+            _limits[name] = limit
+        return limit
+
+
+def limited(method: Callable[..., R]) -> Callable[..., R]:
+    """Hold a slot of ``self.name``'s provider limit for the duration of ``method``."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with provider_limit(self.name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,15 +1,138 @@
 import json
+from typing import Any
+from urllib.parse import parse_qs
 
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from moods.registry import get_registry
+from moods.signals import GROUP, current_state, updates_since
+
+FORMATS = ("json", "msgpack")
+
 
 class MoodUpdatesConsumer(AsyncWebsocketConsumer):
+    """Mood updates for the countries a client subscribes to, as deltas.
+
+    Clients start subscribed to every country and narrow it with
+    ``{"type": "subscribe", "countries": [...], "bounds": {"south", "west", "north", "east"}}``;
+    either key may be left out, and ``"countries": "*"`` subscribes to all again. Countries
+    a subscription adds arrive at once in a ``{"type": "state", "countries": [...]}`` frame
+    with their latest update. Each ``{"type": "delta", "updates": [...]}`` frame lists, per
+    subscribed country, only the fields that changed since this connection last sent them. ``?format=msgpack`` switches
+    both directions to msgpack binary frames.
+
+    Frames carry the broadcast ``sequence``. A reconnecting client passes the last one it
+    saw as ``?since=`` or as ``"since"`` in its subscribe message, and gets the missed
+    updates as one delta frame, or a ``{"type": "state", "countries": [...]}`` frame with
+    every subscribed country's latest update when the gap has left the replay buffer.
+    Neither touches the database.
+    """
+
     async def connect(self):
-        await self.channel_layer.group_add("mood_updates", self.channel_name)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        requested = query.get("format", ["json"])[0]
+        self.format = requested if requested in FORMATS else "json"
+        self.countries: set[str] | None = None
+        self.sent: dict[str, dict[str, Any]] = {}
+        await self.channel_layer.group_add(GROUP, self.channel_name)
         await self.accept()
+        if "since" in query:
+            try:
+                since = int(query["since"][0])
+            except ValueError:
+                since = -1
+            await self.resync(since)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("mood_updates", self.channel_name)
+        await self.channel_layer.group_discard(GROUP, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = msgpack.unpackb(bytes_data) if bytes_data is not None else json.loads(text_data)
+        except (ValueError, msgpack.UnpackException):
+            await self.send_frame({"type": "error", "detail": "Malformed message"})
+            return
+        if not isinstance(message, dict) or message.get("type") != "subscribe":
+            await self.send_frame({"type": "error", "detail": "Unknown message type"})
+            return
+        try:
+            since = None if message.get("since") is None else int(message["since"])
+            await self.subscribe(message.get("countries"), message.get("bounds"))
+        except (TypeError, ValueError, KeyError):
+            await self.send_frame({"type": "error", "detail": "Invalid subscription"})
+            return
+        if since is not None:
+            await self.resync(since)
+
+    async def subscribe(self, countries: Any, bounds: Any) -> None:
+        registry = await sync_to_async(get_registry)()
+        previous = self.countries
+        if countries == "*" or (countries is None and bounds is None):
+            self.countries = None
+        else:
+            codes = {str(code).upper() for code in countries or ()}
+            if bounds is not None:
+                box = [float(bounds[side]) for side in ("south", "west", "north", "east")]
+                codes.update(country.code for country in registry.within(*box))
+            self.countries = codes
+            # Countries dropped from the subscription start over with a full update.
+            self.sent = {code: fields for code, fields in self.sent.items() if code in codes}
+        await self.send_frame(
+            {"type": "subscribed", "countries": "*" if self.countries is None else sorted(self.countries)}
+        )
+        if previous is not None:
+            added = [country.code for country in registry if self.wants(country.code) and country.code not in previous]
+            if added:
+                await self.send_state(added)
+
+    async def resync(self, since: int) -> None:
+        sequence, updates = await sync_to_async(updates_since)(since)
+        if updates is not None:
+            await self.send_frame({"type": "delta", "sequence": sequence, "updates": self.deltas(updates)})
+            return
+        registry = await sync_to_async(get_registry)()
+        await self.send_state([country.code for country in registry if self.wants(country.code)], sequence)
+
+    async def send_state(self, countries: list[str], sequence: int | None = None) -> None:
+        """The latest update of each of ``countries`` that has one, recorded as sent."""
+        state = await sync_to_async(current_state)(countries)
+        if not state and sequence is None:
+            return
+        for update in state:
+            self.sent[update["country"]] = {field: value for field, value in update.items() if field != "country"}
+        frame = {"type": "state", "countries": state}
+        if sequence is not None:
+            frame["sequence"] = sequence
+        await self.send_frame(frame)
+
+    def wants(self, code: str) -> bool:
+        return self.countries is None or code in self.countries
+
+    def deltas(self, updates: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Subscribed countries' changed fields, one entry per country, recorded as sent."""
+        changes: dict[str, dict[str, Any]] = {}
+        for update in updates:
+            code = update["country"]
+            if not self.wants(code):
+                continue
+            previous = self.sent.setdefault(code, {})
+            changed = {
+                field: value for field, value in update.items() if field != "country" and previous.get(field) != value
+            }
+            if changed:
+                previous.update(changed)
+                changes.setdefault(code, {"country": code}).update(changed)
+        return list(changes.values())
+
+    async def mood_batch(self, event):
+        updates = self.deltas(event["updates"])
+        if updates:
+            await self.send_frame({"type": "delta", "sequence": event.get("sequence"), "updates": updates})
 
-    async def mood_update(self, event):
-        await self.send(text_data=json.dumps(event["payload"]))
+    async def send_frame(self, frame: dict[str, Any]) -> None:
+        if self.format == "msgpack":
+            await self.send(bytes_data=msgpack.packb(frame))
+        else:
+            await self.send(text_data=json.dumps(frame, ensure_ascii=False, separators=(",", ":")))
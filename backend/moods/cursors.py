@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import logging
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+from moods.scoring import MoodAccumulator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class TopicCursor:
+    """Where the last fetch of a topic stopped, and the aggregate of what it had seen."""
+
+    cursor: Any = None
+    state: MoodAccumulator = dataclasses.field(default_factory=MoodAccumulator)
+
+
+def _key(country_code: str, topic: str) -> str:
+    digest = hashlib.blake2b(topic.encode(), digest_size=12).hexdigest()
+    return f"ingest:{country_code}:{digest}"
+
+
+def load_cursors(country_code: str, topics: list[str]) -> dict[str, TopicCursor]:
+    """Stored cursors for ``topics``; missing, expired or unreadable entries start fresh."""
+    keys = {topic: _key(country_code, topic) for topic in topics}
+    try:
+        found = cache.get_many(list(keys.values()))
+    except Exception as exc:
+        logger.warning("Cursor store read failed, fetching %s from scratch: %s", country_code, exc)
+        found = {}
+    cursors = {}
+    for topic, key in keys.items():
+        entry = found.get(key)
+        if entry is None:
+            cursors[topic] = TopicCursor()
+            continue
+        cursors[topic] = TopicCursor(cursor=entry["cursor"], state=MoodAccumulator.from_dict(entry["state"]))
+    return cursors
+
+
+def store_cursors(country_code: str, cursors: dict[str, TopicCursor]) -> None:
+    entries = {
+        _key(country_code, topic): {"cursor": entry.cursor, "state": entry.state.to_dict()}
+        for topic, entry in cursors.items()
+        if entry.cursor is not None
+    }
+    if not entries:
+        return
+    try:
+        cache.set_many(entries, settings.CURSOR_TTL)
+    except Exception as exc:
+        logger.warning("Cursor store write failed for %s: %s", country_code, exc)
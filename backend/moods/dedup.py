@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import re
+from itertools import chain
+from typing import Sequence
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+_NOISE_RE = re.compile(r"https?://\S+|@\w+")
+_FEATURE_RE = re.compile(r"[a-z0-9']+")
+_STOP_FEATURES = {"rt"}
+# Each fingerprint is compared with at most this many neighbours per band, bounding the
+# work when a window is full of texts that are similar but not duplicates.
+_NEIGHBOURS = 16
+# Counts share a 16-bit lane per bit, so a text may contribute at most this many features.
+_MAX_FEATURES = 4096
+_SPREAD = np.array([sum(((value >> bit) & 1) << (16 * bit) for bit in range(4)) for value in range(16)], dtype=np.uint64)
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _features(text: str) -> list[str]:
+    text = text.lower()
+    if "@" in text or "://" in text:
+        text = _NOISE_RE.sub(" ", text)
+    features = _FEATURE_RE.findall(text)
+    if "rt" in features:
+        features = [feature for feature in features if feature not in _STOP_FEATURES]
+    return features[:_MAX_FEATURES]
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return _POPCOUNT[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def simhash_batch(texts: Sequence[str]) -> np.ndarray:
+    """64-bit SimHash per text; links, mentions and ``RT`` markers are ignored.
+
+    Features are hashed with the builtin ``hash``, so fingerprints are only comparable
+    within one process, which is all a per-window filter needs.
+    """
+    features = [_features(text) for text in texts]
+    lengths = np.fromiter(map(len, features), dtype=np.intp, count=len(features))
+    fingerprints = np.zeros(len(texts), dtype=np.uint64)
+    present = np.flatnonzero(lengths)
+    if not len(present):
+        return fingerprints
+    hashes = np.fromiter(map(hash, chain.from_iterable(features)), dtype=np.int64).view(np.uint64)
+    starts = np.concatenate([[0], np.cumsum(lengths[present])[:-1]])
+    threshold = lengths[present].astype(np.uint64)
+    packed = np.zeros(len(present), dtype=np.uint64)
+
+    # A text's fingerprint bit is set when most of its features set it. Spreading each
+    # 4-bit nibble of a hash over four 16-bit lanes lets one reduceat count four bits at
+    # once, so 16 passes cover all 64 bits.
+    for nibble in range(FINGERPRINT_BITS // 4):
+        lanes = _SPREAD[(hashes >> np.uint64(4 * nibble)) & np.uint64(0xF)]
+        sums = np.add.reduceat(lanes, starts)
+        for lane in range(4):
+            ones = (sums >> np.uint64(16 * lane)) & np.uint64(0xFFFF)
+            bit = np.uint64(4 * nibble + lane)
+            packed |= (2 * ones > threshold).astype(np.uint64) << bit
+    fingerprints[present] = packed
+    return fingerprints
+
+
+class NearDuplicateFilter:
+    """Per-window SimHash filter that keeps the first of every near-duplicate group.
+
+    ``similarity`` is the fraction of matching fingerprint bits required to call two
+    texts duplicates. Candidates are found by splitting fingerprints into
+    ``max_distance + 1`` bands: by the pigeonhole principle any pair within
+    ``max_distance`` bits agrees exactly on at least one band, so sorting by each band
+    brings every such pair within a few places of each other.
+    """
+
+    def __init__(self, similarity: float = 0.95) -> None:
+        if not 0 < similarity <= 1:
+            raise ValueError("similarity must be in (0, 1]")
+        self.max_distance = int(round((1 - similarity) * FINGERPRINT_BITS, 6))
+        bands = self.max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [
+            (np.uint64(index * width), np.uint64((1 << width) - 1), (index + 1) * width % FINGERPRINT_BITS)
+            for index in range(bands)
+        ]
+        self._seen = np.zeros(0, dtype=np.uint64)
+        self.kept = 0
+        self.collapsed = 0
+
+    def filter(self, texts: Sequence[str]) -> list[int]:
+        """Indices of ``texts`` that are not near-duplicates of anything seen this window.
+
+        Texts without any word features (emoji-only, bare links) are always kept.
+        """
+        fresh = simhash_batch(texts)
+        candidates = np.flatnonzero(fresh)
+        fingerprints = np.concatenate([self._seen, fresh[candidates]])
+        offset = len(self._seen)
+        duplicate = np.zeros(len(fingerprints), dtype=bool)
+
+        for shift, mask, rotation in self._bands:
+            # Sorting on the fingerprint rotated so this band is most significant groups
+            # a bucket together, with exact copies adjacent inside it.
+            rotated = fingerprints
+            if rotation:
+                rotated = (fingerprints >> np.uint64(rotation)) | (fingerprints << np.uint64(FINGERPRINT_BITS - rotation))
+            order = np.argsort(rotated, kind="stable")
+            keys = ((fingerprints >> shift) & mask)[order]
+            for lag in range(1, min(_NEIGHBOURS, len(order) - 1) + 1):
+                same = keys[lag:] == keys[:-lag]
+                if not same.any():
+                    break
+                first, second = order[:-lag][same], order[lag:][same]
+                close = _popcount(fingerprints[first] ^ fingerprints[second]) <= self.max_distance
+                # Arrival order decides which text of a pair survives.
+                duplicate[np.maximum(first, second)[close]] = True
+
+        kept_candidates = ~duplicate[offset:]
+        self._seen = np.concatenate([self._seen, fresh[candidates[kept_candidates]]])
+        kept = np.ones(len(fresh), dtype=bool)
+        kept[candidates[~kept_candidates]] = False
+        collapsed = int(len(fresh) - kept.sum())
+        self.kept += len(fresh) - collapsed
+        self.collapsed += collapsed
+        return np.flatnonzero(kept).tolist()
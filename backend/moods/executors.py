@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Sequence
+
+from django.conf import settings
+
+from moods import scoring
+from moods.lexicon import Lexicon
+from moods.metrics import SCORED_TEXTS
+from moods.score_cache import ScoreCache
+from moods.scoring import BatchScores, score_batch
+
+logger = logging.getLogger(__name__)
+
+MODES = ("inline", "thread", "process")
+
+_pools: dict[str, tuple[Executor, str]] = {}
+_pools_lock = threading.Lock()
+
+
+def resolve_mode(n_texts: int, mode: str | None = None) -> str:
+    """Pick the executor for a window: explicit mode, else ``SCORING_EXECUTOR`` ("auto" by size).
+
+    Daemonic processes, such as Celery's default prefork pool children, cannot start a
+    process pool, so they use the thread pool instead.
+    """
+    mode = mode or settings.SCORING_EXECUTOR
+    if mode == "auto":
+        mode = "process" if n_texts >= settings.SCORING_PARALLEL_THRESHOLD else "inline"
+    elif mode not in MODES:
+        raise ValueError(f"Unknown scoring executor {mode!r}; expected one of {MODES} or 'auto'")
+    if mode == "process" and multiprocessing.current_process().daemon:
+        return "thread"
+    return mode
+
+
+def score_window(texts: Sequence[str], cache: ScoreCache | None = None, mode: str | None = None) -> BatchScores:
+    """Score a window on the configured executor; results match the inline ``score_batch``."""
+    mode = resolve_mode(len(texts), mode)
+    SCORED_TEXTS.labels(mode=mode).inc(len(texts))
+    compute = score_batch if mode == "inline" else partial(_score_chunked, mode)
+    if cache is not None:
+        return cache.resolve(texts, compute)
+    return compute(texts)
+
+
+def _score_chunked(mode: str, texts: Sequence[str]) -> BatchScores:
+    chunk_size = settings.SCORING_CHUNK_SIZE
+    if len(texts) <= chunk_size:
+        return score_batch(texts)
+    chunks = [texts[start : start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    try:
+        results = list(_get_pool(mode).map(score_batch, chunks))
+    except Exception as exc:
+        logger.warning("Scoring %s pool failed, scoring inline: %s", mode, exc)
+        _discard_pool(mode)
+        return score_batch(texts)
+    return BatchScores.concat(results)
+
+
+def _init_worker(lexicon: Lexicon) -> None:
+    scoring.set_lexicon(lexicon)
+
+
+def _get_pool(mode: str) -> Executor:
+    lexicon = scoring.LEXICON
+    with _pools_lock:
+        pool, version = _pools.get(mode, (None, None))
+        if pool is not None and version == lexicon.version:
+            return pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        workers = settings.SCORING_WORKERS or os.cpu_count() or 1
+        if mode == "process":
+            # Spawned workers only import moods.scoring, which is Django-free, and receive
+            # the active lexicon so they score exactly like this process.
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(lexicon,),
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scoring")
+        _pools[mode] = (pool, lexicon.version)
+        return pool
+
+
+def _discard_pool(mode: str) -> None:
+    with _pools_lock:
+        pool, _ = _pools.pop(mode, (None, None))
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    for mode in list(_pools):
+        _discard_pool(mode)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Mapping
+
+import numpy as np
+
+_PHRASE_END = ""
+
+
+class Lexicon:
+    """Compiled term table: one lookup per token covers polarity and every emotion.
+
+    Single-word terms live in a flat ``token -> id`` dict; multi-word phrases live in
+    a token-level trie matched greedily (longest phrase wins), so the cost of a lookup
+    depends on the text and the longest phrase, never on the number of terms.
+    Id ``0`` is reserved for "no match".
+    """
+
+    def __init__(self, emotions: Iterable[str], terms: Mapping[str, tuple[float, Iterable[str]]], name: str = "builtin") -> None:
+        self.emotions = tuple(emotions)
+        columns = {emotion: column for column, emotion in enumerate(self.emotions)}
+
+        self.vocab: dict[str, int] = {}
+        self.phrases: dict[str, dict] = {}
+        size = len(terms) + 1
+        self.polarity = np.zeros(size)
+        self.masks = np.zeros(size, dtype=np.uint32)
+        digest = hashlib.sha1()
+
+        for term_id, term in enumerate(sorted(terms), start=1):
+            weight, term_emotions = terms[term]
+            term_emotions = sorted(set(term_emotions))
+            unknown = [emotion for emotion in term_emotions if emotion not in columns]
+            if unknown:
+                raise ValueError(f"Unknown emotions for lexicon term {term!r}: {unknown}")
+            self.polarity[term_id] = weight
+            for emotion in term_emotions:
+                self.masks[term_id] |= 1 << columns[emotion]
+            digest.update(json.dumps([term, weight, term_emotions]).encode())
+
+            words = term.split()
+            if len(words) == 1:
+                self.vocab[words[0]] = term_id
+                continue
+            node = self.phrases
+            for word in words:
+                node = node.setdefault(word, {})
+            node[_PHRASE_END] = term_id
+
+        self.positive = np.maximum(self.polarity, 0.0)
+        self.negative = np.maximum(-self.polarity, 0.0)
+        self.emotion_matrix = ((self.masks[:, None] >> np.arange(len(self.emotions), dtype=np.uint32)) & 1).astype(float)
+        # Plain-list copies keep the single-text path free of NumPy scalar overhead.
+        self._positive = self.positive.tolist()
+        self._negative = self.negative.tolist()
+        self._emotion_columns = [tuple(np.flatnonzero(row).tolist()) for row in self.emotion_matrix]
+        self.version = f"{name}:{digest.hexdigest()[:12]}"
+
+    def __len__(self) -> int:
+        return len(self.polarity) - 1
+
+    @classmethod
+    def from_sets(
+        cls,
+        positive: Iterable[str],
+        negative: Iterable[str],
+        emotion_keywords: Mapping[str, Iterable[str]],
+        name: str = "builtin",
+    ) -> Lexicon:
+        terms: dict[str, tuple[float, list[str]]] = {}
+        for word in positive:
+            terms[word] = (1.0, [])
+        for word in negative:
+            weight, emotions = terms.get(word, (0.0, []))
+            terms[word] = (weight - 1.0, emotions)
+        for emotion, words in emotion_keywords.items():
+            for word in words:
+                weight, emotions = terms.get(word, (0.0, []))
+                terms[word] = (weight, emotions + [emotion])
+        return cls(emotion_keywords, terms, name=name)
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> Lexicon:
+        """Load a versioned JSON lexicon.
+
+        The file holds ``{"version": ..., "emotions": [...], "terms": {term: {"polarity": w,
+        "emotions": [...]}}}``; terms containing spaces are matched as phrases.
+        """
+        with Path(path).open() as handle:
+            data = json.load(handle)
+        terms = {
+            " ".join(term.lower().split()): (float(entry.get("polarity", 0.0)), entry.get("emotions", []))
+            for term, entry in data["terms"].items()
+        }
+        return cls(data["emotions"], terms, name=str(data.get("version", Path(path).stem)))
+
+    def match(self, tokens: list[str]) -> list[int]:
+        """Ids of the terms found in ``tokens``, in order; unmatched tokens are dropped."""
+        vocab = self.vocab
+        if not self.phrases:
+            return [term_id for term_id in map(vocab.get, tokens) if term_id]
+
+        phrases = self.phrases
+        ids: list[int] = []
+        position = 0
+        length = len(tokens)
+        while position < length:
+            node = phrases.get(tokens[position])
+            if node is not None:
+                best = None
+                cursor = position + 1
+                while node is not None:
+                    if _PHRASE_END in node:
+                        best = (node[_PHRASE_END], cursor)
+                    if cursor >= length:
+                        break
+                    node = node.get(tokens[cursor])
+                    cursor += 1
+                if best is not None:
+                    ids.append(best[0])
+                    position = best[1]
+                    continue
+            term_id = vocab.get(tokens[position])
+            if term_id:
+                ids.append(term_id)
+            position += 1
+        return ids
+
+    def score_ids(self, ids: list[int]) -> tuple[float, float, list[float]]:
+        """Positive weight, negative weight and per-emotion hit counts for matched ids."""
+        positive = self._positive
+        negative = self._negative
+        columns = self._emotion_columns
+        pos = neg = 0.0
+        counts = [0.0] * len(self.emotions)
+        for term_id in ids:
+            pos += positive[term_id]
+            neg += negative[term_id]
+            for column in columns[term_id]:
+                counts[column] += 1
+        return pos, neg, counts
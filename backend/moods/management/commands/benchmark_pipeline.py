@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from moods.benchmarks import DEFAULT_COUNTRIES, DEFAULT_SIZES, compare_to_baseline, run_benchmarks, write_results
+
+
+def _int_list(value: str) -> tuple[int, ...]:
+    return tuple(int(item) for item in value.split(",") if item.strip())
+
+
+class Command(BaseCommand):
+    help = "Benchmark scoring and refresh hot paths offline and compare against a stored baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=_int_list, default=DEFAULT_SIZES, help="Comma-separated post counts")
+        parser.add_argument("--countries", type=_int_list, default=DEFAULT_COUNTRIES, help="Comma-separated country counts")
+        parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+        parser.add_argument("--baseline", help="Baseline JSON produced by a previous --output run")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before failing")
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(options["sizes"], options["countries"], log=self.stdout.write)
+        if options["output"]:
+            write_results(results, options["output"])
+        if options["baseline"]:
+            regressions = compare_to_baseline(results, options["baseline"], options["tolerance"])
+            if regressions:
+                raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,85 @@
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from moods.models import Country
+from moods.registry import invalidate as invalidate_countries
+from moods.replay import RecordingProvider
+from moods.services import refresh_all, refresh_all_async
+from moods.synthetic import SyntheticProvider, WorkloadShape
+
+
+class Command(BaseCommand):
+    help = "Create synthetic countries and drive a refresh cycle (or a replay recording) from SyntheticProvider"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--countries", type=int, default=1000, help="Synthetic countries or regions to create")
+        parser.add_argument("--prefix", default="SYN", help="Code prefix marking synthetic countries")
+        parser.add_argument("--topics", type=int, default=10, help="Trending topics per country")
+        parser.add_argument("--posts-per-topic", type=int, default=50)
+        parser.add_argument("--duplicate-rate", type=float, default=0.15)
+        parser.add_argument("--shared-topic-rate", type=float, default=0.5, help="Share of trends common to many countries")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--refresh", action="store_true", help="Run refresh_all over the synthetic countries")
+        parser.add_argument("--async", dest="use_async", action="store_true", help="Refresh with refresh_all_async")
+        parser.add_argument("--record", help="Also write the workload as a replay recording to this path")
+        parser.add_argument("--clear", action="store_true", help="Delete the synthetic countries and their snapshots")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["clear"]:
+            deleted = Country.objects.filter(code__startswith=prefix).delete()[1].get(Country._meta.label, 0)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} synthetic countries"))
+            return
+
+        codes = [f"{prefix}{index:05d}" for index in range(options["countries"])]
+        existing = set(Country.objects.filter(code__in=codes).values_list("code", flat=True))
+        rng = random.Random(f"{options['seed']}:countries")
+        Country.objects.bulk_create(
+            Country(
+                code=code,
+                name=f"Synthetic {code}",
+                has_trends=True,
+                centroid_lat=rng.uniform(-55, 70),
+                centroid_lng=rng.uniform(-180, 180),
+            )
+            for code in codes
+            if code not in existing
+        )
+        invalidate_countries()
+        self.stdout.write(f"{len(codes)} synthetic countries ({len(codes) - len(existing)} new)")
+
+        shape = WorkloadShape(
+            topics_per_country=options["topics"],
+            posts_per_topic=options["posts_per_topic"],
+            duplicate_rate=options["duplicate_rate"],
+            shared_topic_rate=options["shared_topic_rate"],
+        )
+        provider = SyntheticProvider(seed=options["seed"], shape=shape)
+
+        if options["record"]:
+            recorder = RecordingProvider(provider, options["record"])
+            for code in codes:
+                for trend in recorder.get_trends(code):
+                    recorder.sample_posts(code, trend.topic, shape.posts_per_topic)
+            self.stdout.write(f"Recorded the workload to {options['record']}")
+
+        if options["refresh"]:
+            with override_settings(TOP_COUNTRIES=codes):
+                started = time.perf_counter()
+                if options["use_async"]:
+                    snapshots = async_to_sync(refresh_all_async)(provider=provider)
+                else:
+                    snapshots = refresh_all(provider=provider)
+                elapsed = time.perf_counter() - started
+            scored = sum(snapshot.n_items for snapshot in snapshots)
+            duplicates = sum(snapshot.n_duplicates for snapshot in snapshots)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Refreshed {len(snapshots)} countries in {elapsed:.1f}s: {scored} posts scored "
+                    f"({scored / elapsed:.0f}/s), {duplicates} near-duplicates collapsed"
+                )
+            )
@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from moods.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild 1h/6h/24h/7d rollups from stored snapshot aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Backfill rollups covering this many past days")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - datetime.timedelta(days=options["days"])
+        written = refresh_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollups"))
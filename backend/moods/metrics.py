@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import socket
+import time
+from typing import Iterator
+
+from celery.signals import task_postrun
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    push_to_gateway,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "moodclock_stage_seconds",
+    "Time spent in each refresh pipeline stage.",
+    ["stage", "country", "provider"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+POSTS = Counter(
+    "moodclock_posts_total",
+    "Posts seen by refresh_country, by outcome (fetched, duplicate, scored).",
+    ["country", "provider", "outcome"],
+)
+PROVIDER_RESPONSES = Counter(
+    "moodclock_provider_responses_total",
+    "Upstream API responses by status code ('error' for transport failures, 'deferred' when held back by the rate-limit "
+    "budget, 'open' when failed fast by an open circuit).",
+    ["provider", "endpoint", "country", "status"],
+)
+PROVIDER_RATE_LIMITED = Counter(
+    "moodclock_provider_rate_limited_total",
+    "Upstream API responses with status 429.",
+    ["provider", "endpoint", "country"],
+)
+RESPONSE_CACHE = Counter(
+    "moodclock_response_cache_total",
+    "Provider GETs by response cache outcome (hit, miss, revalidated, coalesced, stale).",
+    ["provider", "endpoint", "outcome"],
+)
+CIRCUIT_EVENTS = Counter(
+    "moodclock_circuit_events_total",
+    "Circuit breaker transitions (opened, closed) and hedged requests, per provider endpoint.",
+    ["provider", "endpoint", "event"],
+)
+TOPIC_FETCHES = Counter(
+    "moodclock_topic_fetches_total",
+    "Topic fetches in refresh cycles, by outcome (fetched, or shared from another country's fetch).",
+    ["provider", "outcome"],
+)
+SCORED_TEXTS = Counter("moodclock_scored_texts_total", "Texts scored, by executor mode.", ["mode"])
+
+
+def provider_label(provider) -> str:
+    return getattr(provider, "name", type(provider).__name__.lower())
+
+
+@contextlib.contextmanager
+def timed(stage: str, country: str = "", provider: str = "") -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage, country=country, provider=provider).observe(time.perf_counter() - start)
+
+
+def observe_response(provider: str, endpoint: str, country: str, status: int | str) -> None:
+    PROVIDER_RESPONSES.labels(provider=provider, endpoint=endpoint, country=country, status=str(status)).inc()
+    if status == 429:
+        PROVIDER_RATE_LIMITED.labels(provider=provider, endpoint=endpoint, country=country).inc()
+
+
+def registry() -> CollectorRegistry:
+    """Registry to expose: every process's samples in multiprocess mode, else this one's."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def render() -> bytes:
+    return generate_latest(registry())
+
+
+@task_postrun.connect
+def push_worker_metrics(**kwargs) -> None:
+    """In push mode, Celery workers send their samples to a Pushgateway after each task."""
+    if not settings.METRICS_PUSHGATEWAY_URL:
+        return
+    try:
+        push_to_gateway(
+            settings.METRICS_PUSHGATEWAY_URL,
+            job="moodclock-worker",
+            registry=registry(),
+            grouping_key={"instance": f"{socket.gethostname()}:{os.getpid()}"},
+        )
+    except Exception as exc:
+        logger.warning("Pushing metrics to %s failed: %s", settings.METRICS_PUSHGATEWAY_URL, exc)
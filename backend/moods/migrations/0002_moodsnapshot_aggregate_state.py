@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moods", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moodsnapshot",
+            name="aggregate_state",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
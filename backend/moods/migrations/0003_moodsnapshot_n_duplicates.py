@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moods", "0002_moodsnapshot_aggregate_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moodsnapshot",
+            name="n_duplicates",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moods", "0003_moodsnapshot_n_duplicates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MoodRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("window_start", models.DateTimeField()),
+                ("window_minutes", models.PositiveIntegerField()),
+                ("mood_score", models.FloatField()),
+                ("energy", models.FloatField()),
+                ("emoji", models.CharField(max_length=4)),
+                ("label", models.CharField(max_length=64)),
+                (
+                    "confidence",
+                    models.CharField(
+                        choices=[("LOW", "Low"), ("MED", "Medium"), ("HIGH", "High")],
+                        max_length=4,
+                    ),
+                ),
+                ("n_items", models.PositiveIntegerField()),
+                ("n_snapshots", models.PositiveIntegerField()),
+                ("emotion_probs", models.JSONField(default=dict)),
+                ("aggregate_state", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "country",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="rollups", to="moods.country"),
+                ),
+            ],
+            options={
+                "ordering": ["-window_start"],
+                "unique_together": {("country", "window_start", "window_minutes")},
+            },
+        ),
+    ]
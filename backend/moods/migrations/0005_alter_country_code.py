@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("moods", "0004_moodrollup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="country",
+            name="code",
+            field=models.CharField(max_length=16, unique=True),
+        ),
+    ]
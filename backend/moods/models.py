@@ -4,7 +4,8 @@ from django.db import models
 
 
 class Country(models.Model):
-    code = models.CharField(max_length=2, unique=True)
+    # ISO 3166-1 alpha-2 for countries; longer codes for regions and synthetic workloads.
+    code = models.CharField(max_length=16, unique=True)
     name = models.CharField(max_length=128)
     has_trends = models.BooleanField(default=False)
     woeid = models.IntegerField(null=True, blank=True)
@@ -30,7 +31,9 @@ class MoodSnapshot(models.Model):
     label = models.CharField(max_length=64)
     confidence = models.CharField(max_length=4, choices=Confidence.choices)
     n_items = models.PositiveIntegerField()
+    n_duplicates = models.PositiveIntegerField(default=0)
     emotion_probs = models.JSONField(default=dict)
+    aggregate_state = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -41,6 +44,31 @@ class MoodSnapshot(models.Model):
         return f"{self.country.code} {self.window_start.isoformat()}"
 
 
+class MoodRollup(models.Model):
+    """A longer window merged from stored snapshot aggregates (see ``moods.rollups``)."""
+
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name="rollups")
+    window_start = models.DateTimeField()
+    window_minutes = models.PositiveIntegerField()
+    mood_score = models.FloatField()
+    energy = models.FloatField()
+    emoji = models.CharField(max_length=4)
+    label = models.CharField(max_length=64)
+    confidence = models.CharField(max_length=4, choices=MoodSnapshot.Confidence.choices)
+    n_items = models.PositiveIntegerField()
+    n_snapshots = models.PositiveIntegerField()
+    emotion_probs = models.JSONField(default=dict)
+    aggregate_state = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("country", "window_start", "window_minutes")
+        ordering = ["-window_start"]
+
+    def __str__(self) -> str:
+        return f"{self.country.code} {self.window_minutes}m {self.window_start.isoformat()}"
+
+
 class MoodDriver(models.Model):
     snapshot = models.ForeignKey(MoodSnapshot, on_delete=models.CASCADE, related_name="drivers")
     topic = models.CharField(max_length=128)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import dataclasses
+import datetime
+from typing import Any
+
+from django.db import transaction
+
+from moods.metrics import timed
+from moods.models import Country, MoodDriver, MoodSnapshot, TextSample
+from moods.signals import broadcast_snapshots
+
+SNAPSHOT_FIELDS = (
+    "mood_score",
+    "energy",
+    "emoji",
+    "label",
+    "confidence",
+    "n_items",
+    "n_duplicates",
+    "emotion_probs",
+    "aggregate_state",
+)
+DRIVER_FIELDS = ("topic", "weight", "sentiment_avg", "emotion_probs", "n_items", "rank")
+SAMPLE_FIELDS = ("source", "text")
+
+
+@dataclasses.dataclass
+class SnapshotRecord:
+    """Everything one country refresh writes, computed before touching the database."""
+
+    country: Country
+    window_start: datetime.datetime
+    window_minutes: int
+    values: dict[str, Any]
+    drivers: list[dict[str, Any]]
+    samples: list[tuple[str, str]]
+
+
+def save_snapshots(records: list[SnapshotRecord], broadcast: bool = True) -> list[MoodSnapshot]:
+    """Upsert snapshots with their drivers and samples in one transaction.
+
+    Snapshots are upserted on their natural key with a single ``bulk_create``. Drivers
+    are matched by rank and samples by position: unchanged rows are left alone, changed
+    ones go through ``bulk_update``, and only surplus rows are deleted. The cost is a
+    handful of queries whatever the number of countries. Bulk writes skip ``post_save``,
+    so the saved snapshots are broadcast explicitly, in one frame after the commit,
+    unless ``broadcast`` is off because the caller batches broadcasts itself.
+    """
+    if not records:
+        return []
+    snapshots = [
+        MoodSnapshot(
+            country=record.country,
+            window_start=record.window_start,
+            window_minutes=record.window_minutes,
+            **record.values,
+        )
+        for record in records
+    ]
+    country = records[0].country.code if len(records) == 1 else "all"
+    with timed("persist", country), transaction.atomic():
+        MoodSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=["country", "window_start", "window_minutes"],
+            update_fields=list(SNAPSHOT_FIELDS),
+        )
+        if any(snapshot.pk is None for snapshot in snapshots):
+            _load_snapshot_ids(snapshots)
+
+        driver_rows = [
+            [MoodDriver(snapshot=snapshot, rank=rank, **driver) for rank, driver in enumerate(record.drivers, start=1)]
+            for snapshot, record in zip(snapshots, records)
+        ]
+        sample_rows = [
+            [TextSample(snapshot=snapshot, source=source, text=text) for source, text in record.samples]
+            for snapshot, record in zip(snapshots, records)
+        ]
+        _sync_children(MoodDriver, snapshots, driver_rows, DRIVER_FIELDS, order_by=("rank", "id"))
+        _sync_children(TextSample, snapshots, sample_rows, SAMPLE_FIELDS, order_by=("id",))
+
+    if broadcast:
+        broadcast_snapshots(snapshots)
+    return snapshots
+
+
+def _load_snapshot_ids(snapshots: list[MoodSnapshot]) -> None:
+    """Backends that cannot return ids from an upsert get them in one extra query."""
+    windows = {(snapshot.window_start, snapshot.window_minutes) for snapshot in snapshots}
+    rows = MoodSnapshot.objects.filter(
+        country__in={snapshot.country_id for snapshot in snapshots},
+        window_start__in={window_start for window_start, _ in windows},
+        window_minutes__in={window_minutes for _, window_minutes in windows},
+    ).values_list("country_id", "window_start", "window_minutes", "id")
+    ids = {row[:3]: row[3] for row in rows}
+    for snapshot in snapshots:
+        snapshot.pk = ids[(snapshot.country_id, snapshot.window_start, snapshot.window_minutes)]
+
+
+def _sync_children(model, snapshots, wanted_rows, fields, order_by) -> None:
+    existing: dict[int, list] = {snapshot.pk: [] for snapshot in snapshots}
+    for row in model.objects.filter(snapshot__in=snapshots).order_by("snapshot_id", *order_by):
+        existing[row.snapshot_id].append(row)
+
+    to_create, to_update, to_delete = [], [], []
+    for snapshot, wanted in zip(snapshots, wanted_rows):
+        current = existing[snapshot.pk]
+        for old, new in zip(current, wanted):
+            if any(getattr(old, field) != getattr(new, field) for field in fields):
+                for field in fields:
+                    setattr(old, field, getattr(new, field))
+                to_update.append(old)
+        to_create.extend(wanted[len(current) :])
+        to_delete.extend(row.pk for row in current[len(wanted) :])
+
+    if to_delete:
+        model.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, list(fields))
+    if to_create:
+        model.objects.bulk_create(to_create)
@@ -3,11 +3,19 @@ from __future__ import annotations
 import dataclasses
 import logging
 import random
+import time
 from typing import Protocol
 
 import requests
 from django.conf import settings
 
+from moods.concurrency import fetch_ordered, limited
+from moods.metrics import observe_response
+from moods.ratelimit import RequestDeferred, acquire, record
+from moods.resilience import CircuitOpen, before_request, hedged, is_open, record_outcome, release_probe, timeout_for
+from moods.response_cache import cached_request
+from moods.transport import forget_token, get_session, get_token
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,6 +25,110 @@ class TrendTopic:
     weight: float
 
 
+def _observed_request(method: str, url: str, labels: tuple[str, str, str], **kwargs) -> requests.Response:
+    """Request through the shared response cache, sent by ``_send`` on a miss."""
+    return cached_request(method, url, labels, _send, **kwargs)
+
+
+def _send(method: str, url: str, labels: tuple[str, str, str], **kwargs) -> requests.Response:
+    """Request on the provider's pooled session, counting the status under (provider, endpoint, country).
+
+    The request raises ``CircuitOpen`` while the endpoint's circuit is open, and is then
+    charged to the rate-limit budget, raising ``RequestDeferred`` without being sent when
+    the budget is spent. Both are ``RequestDeferred``, which providers treat as no data.
+    """
+    provider, endpoint = labels[0], labels[1]
+    try:
+        probe = before_request(provider, endpoint)
+    except CircuitOpen:
+        observe_response(*labels, "open")
+        raise
+    if not acquire(*labels):
+        if probe:
+            release_probe(provider, endpoint)
+        observe_response(*labels, "deferred")
+        raise RequestDeferred(f"{provider} {endpoint} budget spent for {labels[2]}")
+    if "timeout" in kwargs:
+        kwargs["timeout"] = timeout_for(provider, endpoint, kwargs["timeout"])
+    session = get_session(provider)
+    started = time.monotonic()
+    try:
+        response = hedged(labels, lambda: session.request(method, url, **kwargs))
+    except requests.RequestException:
+        observe_response(*labels, "error")
+        record_outcome(provider, endpoint, ok=False, probe=probe)
+        raise
+    observe_response(*labels, response.status_code)
+    record_outcome(provider, endpoint, ok=response.status_code < 500, latency=time.monotonic() - started, probe=probe)
+    record(provider, endpoint, response.status_code, response.headers)
+    return response
+
+
+def country_woeid(country: str) -> int | None:
+    try:
+        from moods.registry import get_registry
+
+        info = get_registry().get(country)
+    except Exception:
+        return None
+    return info.woeid if info else None
+
+
+# Response parsing is shared by the sync providers here and the async ones in
+# moods.async_providers.
+
+
+def parse_x_trends(data: dict, by_woeid: bool) -> list[TrendTopic]:
+    key = "name" if by_woeid else "text"
+    return [TrendTopic(topic=item.get(key, ""), weight=1.0) for item in data.get("data", []) if item.get(key)]
+
+
+def parse_x_posts(data: dict) -> tuple[list[str], str | None]:
+    posts = [item.get("text", "").strip() for item in data.get("data", []) if item.get("text")]
+    return posts, data.get("meta", {}).get("newest_id")
+
+
+def parse_reddit_trends(data: dict) -> list[TrendTopic]:
+    titles = (item.get("data", {}).get("title") for item in data.get("data", {}).get("children", []))
+    return [TrendTopic(topic=title, weight=1.0) for title in titles if title]
+
+
+def parse_reddit_posts(data: dict) -> tuple[list[str], str | None]:
+    """Title and body of each post, and the fullname of the newest one."""
+    children = data.get("data", {}).get("children", [])
+    texts = []
+    for item in children:
+        post = item.get("data", {})
+        combined = f"{post.get('title') or ''} {post.get('selftext') or ''}".strip()
+        if combined:
+            texts.append(combined)
+    newest = children[0].get("data", {}).get("name") if children else None
+    return texts, newest
+
+
+def merge_source_trends(x_trends: list[TrendTopic], reddit_trends: list[TrendTopic]) -> list[TrendTopic]:
+    topics = {trend.topic: trend for trend in x_trends + reddit_trends}
+    x_topic_set = {trend.topic for trend in x_trends}
+    return [
+        TrendTopic(
+            topic=topic,
+            weight=settings.SOURCE_WEIGHT_X if topic in x_topic_set else settings.SOURCE_WEIGHT_REDDIT,
+        )
+        for topic in topics
+    ]
+
+
+def source_limits(limit: int, x_open: bool = False, reddit_open: bool = False) -> tuple[int, int]:
+    """Split a post budget between X and Reddit by ``SOURCE_WEIGHT_X``.
+
+    While one source's search circuit is open, the other gets the whole budget.
+    """
+    if x_open != reddit_open:
+        return (0, limit) if x_open else (limit, 0)
+    x_limit = int(limit * settings.SOURCE_WEIGHT_X)
+    return x_limit, max(limit - x_limit, 1)
+
+
 class TrendProvider(Protocol):
     def get_trends(self, country: str) -> list[TrendTopic]:
         raise NotImplementedError
@@ -26,6 +138,9 @@ class TrendProvider(Protocol):
 
 
 class XProvider:
+    name = "x"
+    # Post searches are not filtered by country, so countries can share them (moods.topics).
+    global_search = True
     BASE_URL = "https://api.x.com/2"
 
     def __init__(self, bearer_token: str) -> None:
@@ -34,29 +149,28 @@ class XProvider:
     def _headers(self) -> dict[str, str]:
         return {"Authorization": f"Bearer {self.bearer_token}"}
 
+    @limited
     def get_trends(self, country: str) -> list[TrendTopic]:
         if not self.bearer_token:
             return []
-        woeid = None
-        try:
-            from moods.models import Country
-
-            woeid = Country.objects.filter(code=country.upper()).values_list("woeid", flat=True).first()
-        except Exception:
-            woeid = None
+        woeid = country_woeid(country)
         try:
             if woeid:
-                response = requests.get(
+                response = _observed_request(
+                    "GET",
                     f"{self.BASE_URL}/trends/by/woeid/{woeid}",
                     headers=self._headers(),
                     timeout=10,
+                    labels=(self.name, "trends", country),
                 )
             else:
-                response = requests.get(
+                response = _observed_request(
+                    "GET",
                     f"{self.BASE_URL}/tweets/search/recent",
                     headers=self._headers(),
                     params={"query": country, "max_results": 10},
                     timeout=10,
+                    labels=(self.name, "trends", country),
                 )
             if response.status_code == 429:
                 logger.warning("X rate limit hit for trends")
@@ -64,44 +178,55 @@ class XProvider:
             if response.status_code >= 400:
                 logger.warning("X trends error: %s", response.text)
                 return []
-            data = response.json()
-            if woeid:
-                topics = data.get("data", [])
-                return [TrendTopic(topic=item.get("name", ""), weight=1.0) for item in topics if item.get("name")]
-            return [TrendTopic(topic=item.get("text", ""), weight=1.0) for item in data.get("data", []) if item.get("text")]
+            return parse_x_trends(response.json(), by_woeid=bool(woeid))
+        except RequestDeferred:
+            return []
         except requests.RequestException as exc:
             logger.exception("X trends request failed: %s", exc)
             return []
 
     def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        posts, _ = self.sample_new_posts(country, topic, limit, cursor=None)
+        return posts
+
+    @limited
+    def sample_new_posts(self, country: str, topic: str, limit: int, cursor: str | None) -> tuple[list[str], str | None]:
+        """Posts newer than ``cursor`` (a tweet id) and the newest id seen, for the next call."""
         if not self.bearer_token:
-            return []
+            return [], cursor
         params = {
             "query": f"{topic} lang:en -is:retweet",
             "max_results": min(limit, 100),
         }
+        if cursor:
+            params["since_id"] = cursor
         try:
-            response = requests.get(
+            response = _observed_request(
+                "GET",
                 f"{self.BASE_URL}/tweets/search/recent",
                 headers=self._headers(),
                 params=params,
                 timeout=10,
+                labels=(self.name, "search", country),
             )
             if response.status_code == 429:
                 logger.warning("X rate limit hit for search")
-                return []
+                return [], cursor
             if response.status_code >= 400:
                 logger.warning("X search error: %s", response.text)
-                return []
-            data = response.json()
-            items = data.get("data", [])
-            return [item.get("text", "").strip() for item in items if item.get("text")]
+                return [], cursor
+            posts, newest = parse_x_posts(response.json())
+            return posts, newest or cursor
+        except RequestDeferred:
+            return [], cursor
         except requests.RequestException as exc:
             logger.exception("X search request failed: %s", exc)
-            return []
+            return [], cursor
 
 
 class RedditProvider:
+    name = "reddit"
+    global_search = True
     BASE_URL = "https://oauth.reddit.com"
     TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
 
@@ -113,15 +238,23 @@ class RedditProvider:
     def _get_token(self) -> str | None:
         if not self.client_id or not self.client_secret:
             return None
+        return get_token(self.name, self.client_id, self._fetch_token)
+
+    def _fetch_token(self) -> tuple[str, int] | None:
         try:
             auth = requests.auth.HTTPBasicAuth(self.client_id, self.client_secret)
             data = {"grant_type": "client_credentials"}
             headers = {"User-Agent": self.user_agent}
-            response = requests.post(self.TOKEN_URL, auth=auth, data=data, headers=headers, timeout=10)
+            response = _observed_request(
+                "POST", self.TOKEN_URL, auth=auth, data=data, headers=headers, timeout=10, labels=(self.name, "token", "")
+            )
             if response.status_code >= 400:
                 logger.warning("Reddit token error: %s", response.text)
                 return None
-            return response.json().get("access_token")
+            payload = response.json()
+            if not payload.get("access_token"):
+                return None
+            return payload["access_token"], int(payload.get("expires_in", 3600))
         except requests.RequestException as exc:
             logger.exception("Reddit token request failed: %s", exc)
             return None
@@ -129,6 +262,7 @@ class RedditProvider:
     def _headers(self, token: str) -> dict[str, str]:
         return {"Authorization": f"Bearer {token}", "User-Agent": self.user_agent}
 
+    @limited
     def get_trends(self, country: str) -> list[TrendTopic]:
         token = self._get_token()
         if not token:
@@ -137,81 +271,114 @@ class RedditProvider:
         topics: list[TrendTopic] = []
         for subreddit in subreddits:
             try:
-                response = requests.get(
+                response = _observed_request(
+                    "GET",
                     f"{self.BASE_URL}/r/{subreddit}/hot",
                     headers=self._headers(token),
                     params={"limit": 5},
                     timeout=10,
+                    labels=(self.name, "hot", country),
                 )
+                if response.status_code == 401:
+                    forget_token(self.name, self.client_id)
                 if response.status_code >= 400:
                     continue
-                children = response.json().get("data", {}).get("children", [])
-                for item in children:
-                    title = item.get("data", {}).get("title")
-                    if title:
-                        topics.append(TrendTopic(topic=title, weight=1.0))
-            except requests.RequestException:
+                topics.extend(parse_reddit_trends(response.json()))
+            except (requests.RequestException, RequestDeferred):
                 continue
         return topics
 
+    @limited
     def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        posts, _ = self._search(country, topic, limit, {"sort": "hot"})
+        return posts
+
+    @limited
+    def sample_new_posts(self, country: str, topic: str, limit: int, cursor: str | None) -> tuple[list[str], str | None]:
+        """Posts newer than ``cursor`` (a post fullname) and the newest fullname seen."""
+        params = {"sort": "new"}
+        if cursor:
+            params["before"] = cursor
+        posts, newest = self._search(country, topic, limit, params)
+        return posts, newest or cursor
+
+    def _search(self, country: str, topic: str, limit: int, params: dict[str, str]) -> tuple[list[str], str | None]:
         token = self._get_token()
         if not token:
-            return []
+            return [], None
         try:
-            response = requests.get(
+            response = _observed_request(
+                "GET",
                 f"{self.BASE_URL}/search",
                 headers=self._headers(token),
-                params={"q": topic, "limit": min(limit, 100), "sort": "hot"},
+                params={"q": topic, "limit": min(limit, 100), **params},
                 timeout=10,
+                labels=(self.name, "search", country),
             )
+            if response.status_code == 401:
+                forget_token(self.name, self.client_id)
             if response.status_code >= 400:
-                return []
-            children = response.json().get("data", {}).get("children", [])
-            texts = []
-            for item in children:
-                data = item.get("data", {})
-                title = data.get("title") or ""
-                selftext = data.get("selftext") or ""
-                combined = f"{title} {selftext}".strip()
-                if combined:
-                    texts.append(combined)
-            return texts
-        except requests.RequestException:
-            return []
+                return [], None
+            return parse_reddit_posts(response.json())
+        except (requests.RequestException, RequestDeferred):
+            return [], None
 
 
 class CompositeProvider:
+    name = "composite"
+    global_search = True
+
     def __init__(self, x_provider: TrendProvider, reddit_provider: TrendProvider) -> None:
         self.x_provider = x_provider
         self.reddit_provider = reddit_provider
 
     def get_trends(self, country: str) -> list[TrendTopic]:
-        x_trends = self.x_provider.get_trends(country)
-        reddit_trends = self.reddit_provider.get_trends(country)
-        topics = {trend.topic: trend for trend in x_trends + reddit_trends}
-        x_topic_set = {trend.topic for trend in x_trends}
-        merged: list[TrendTopic] = []
-        for topic in topics.values():
-            weight = settings.SOURCE_WEIGHT_X if topic.topic in x_topic_set else settings.SOURCE_WEIGHT_REDDIT
-            merged.append(TrendTopic(topic=topic.topic, weight=weight))
-        return merged
+        x_trends, reddit_trends = fetch_ordered(
+            "sources", lambda provider: provider.get_trends(country), [self.x_provider, self.reddit_provider]
+        )
+        return merge_source_trends(x_trends, reddit_trends)
+
+    def _search_sources(self, limit: int) -> list[tuple[str, TrendProvider, int]]:
+        """``(cursor key, source, limit)`` for each source to search; one with an open circuit is skipped."""
+        x_limit, reddit_limit = source_limits(
+            limit, is_open(self.x_provider.name, "search"), is_open(self.reddit_provider.name, "search")
+        )
+        sources = [("x", self.x_provider, x_limit), ("reddit", self.reddit_provider, reddit_limit)]
+        return [source for source in sources if source[2]]
 
     def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
-        x_limit = int(limit * settings.SOURCE_WEIGHT_X)
-        reddit_limit = max(limit - x_limit, 1)
-        posts = []
-        posts.extend(self.x_provider.sample_posts(country, topic, x_limit))
-        posts.extend(self.reddit_provider.sample_posts(country, topic, reddit_limit))
-        return posts
+        batches = fetch_ordered(
+            "sources",
+            lambda source: source[1].sample_posts(country, topic, source[2]),
+            self._search_sources(limit),
+        )
+        return [post for batch in batches for post in batch]
+
+    def sample_new_posts(self, country: str, topic: str, limit: int, cursor: dict | None) -> tuple[list[str], dict]:
+        cursor = cursor or {}
+        sources = self._search_sources(limit)
+        results = fetch_ordered(
+            "sources",
+            lambda source: source[1].sample_new_posts(country, topic, source[2], cursor.get(source[0])),
+            sources,
+        )
+        posts: list[str] = []
+        next_cursor = {"x": cursor.get("x"), "reddit": cursor.get("reddit")}
+        for (key, _, _), (source_posts, source_cursor) in zip(sources, results):
+            posts.extend(source_posts)
+            next_cursor[key] = source_cursor
+        return posts, next_cursor
 
 
 class MockProvider:
+    name = "mock"
+
     def __init__(self) -> None:
         self.seed = 42
 
     def get_trends(self, country: str) -> list[TrendTopic]:
-        random.seed(f"{country}-{self.seed}")
+        # A private Random per call keeps results independent of call order and threads.
+        rng = random.Random(f"{country}-{self.seed}")
         topics = [
             "economy outlook",
             "local sports",
@@ -220,11 +387,11 @@ class MockProvider:
             "tech investments",
             "public health",
         ]
-        random.shuffle(topics)
+        rng.shuffle(topics)
         return [TrendTopic(topic=topic, weight=1.0) for topic in topics[:5]]
 
     def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
-        random.seed(f"{country}-{topic}-{self.seed}")
+        rng = random.Random(f"{country}-{topic}-{self.seed}")
         base = [
             f"People are talking about {topic} in {country}.",
             f"Mixed feelings around {topic} right now.",
@@ -232,12 +399,41 @@ class MockProvider:
             f"Lots of reactions to {topic} today.",
             f"Community discussions focus on {topic} recently.",
         ]
-        random.shuffle(base)
+        rng.shuffle(base)
         return base[:limit]
 
 
 def provider_from_settings() -> TrendProvider:
     provider = settings.PROVIDER
+    if provider == "record":
+        from moods.replay import RecordingProvider
+
+        return RecordingProvider(_upstream_provider(settings.RECORD_PROVIDER), settings.REPLAY_PATH)
+    if provider == "replay":
+        from moods.replay import ReplayProvider
+
+        return ReplayProvider(
+            settings.REPLAY_PATH,
+            time_scale=settings.REPLAY_TIME_SCALE,
+            loop=settings.REPLAY_LOOP,
+            multiplier=settings.REPLAY_MULTIPLIER,
+            latency_ms=settings.REPLAY_LATENCY_MS,
+            jitter_ms=settings.REPLAY_JITTER_MS,
+            error_rate=settings.REPLAY_ERROR_RATE,
+        )
+    if provider == "synthetic":
+        from moods.synthetic import SyntheticProvider, WorkloadShape
+
+        shape = WorkloadShape(
+            topics_per_country=settings.SYNTHETIC_TOPICS,
+            posts_per_topic=settings.SYNTHETIC_POSTS_PER_TOPIC,
+            duplicate_rate=settings.SYNTHETIC_DUPLICATE_RATE,
+        )
+        return SyntheticProvider(seed=settings.SYNTHETIC_SEED, shape=shape)
+    return _upstream_provider(provider)
+
+
+def _upstream_provider(provider: str) -> TrendProvider:
     if provider == "x":
         if not settings.X_BEARER_TOKEN:
             return MockProvider()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Mapping
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Reddit meters every OAuth endpoint against one per-client quota; X meters each endpoint.
+SHARED_BUCKETS = {"reddit": "api"}
+# Token requests go to a separate host with its own (unpublished) limits.
+UNSCHEDULED_ENDPOINTS = {"token"}
+# Reset times are rounded so every response of one quota window names the same window,
+# even when the upstream reports "seconds until reset".
+RESET_GRANULARITY = 10
+
+
+class RequestDeferred(Exception):
+    """A request was held back because the quota left is reserved for other countries."""
+
+
+def _bucket_key(provider: str, endpoint: str) -> str:
+    return f"ratelimit:{provider}:{SHARED_BUCKETS.get(provider, endpoint)}"
+
+
+def parse_headers(headers: Mapping[str, str], now: float) -> tuple[int, int, int] | None:
+    """``(limit, remaining, reset_at)`` from X ``x-rate-limit-*`` or Reddit ``X-Ratelimit-*`` headers."""
+    lowered = {name.lower(): value for name, value in headers.items()}
+    try:
+        if "x-rate-limit-remaining" in lowered:
+            limit = int(lowered["x-rate-limit-limit"])
+            remaining = int(lowered["x-rate-limit-remaining"])
+            reset_at = float(lowered["x-rate-limit-reset"])
+        elif "x-ratelimit-remaining" in lowered:
+            # Reddit sends floats, and the reset as seconds from now.
+            remaining = int(float(lowered["x-ratelimit-remaining"]))
+            limit = remaining + int(float(lowered.get("x-ratelimit-used", 0)))
+            reset_at = now + float(lowered["x-ratelimit-reset"])
+        else:
+            return None
+    except (KeyError, ValueError):
+        return None
+    reset_at = int(round(reset_at / RESET_GRANULARITY) * RESET_GRANULARITY)
+    return limit, remaining, reset_at
+
+
+def record(provider: str, endpoint: str, status: int, headers: Mapping[str, str]) -> None:
+    """Refill the bucket from a response's rate-limit headers, shared through the cache."""
+    if endpoint in UNSCHEDULED_ENDPOINTS:
+        return
+    now = time.time()
+    parsed = parse_headers(headers, now)
+    if parsed is None:
+        if status != 429:
+            return
+        # Throttled without headers: stop everyone for a minute.
+        parsed = (0, 0, int(now) + 60)
+    limit, remaining, reset_at = parsed
+    key = _bucket_key(provider, endpoint)
+    ttl = max(int(reset_at - now), 1) + RESET_GRANULARITY
+    try:
+        cache.set_many({key: {"limit": max(limit, remaining), "reset": reset_at}, f"{key}:remaining": remaining}, ttl)
+    except Exception as exc:
+        logger.warning("Rate limit state write failed for %s: %s", key, exc)
+
+
+def note_volume(country: str, n_posts: int) -> None:
+    """Remember how many posts a country yielded, for ``RATE_LIMIT_SPLIT=volume``."""
+    if settings.RATE_LIMIT_SPLIT != "volume":
+        return
+    try:
+        cache.set(f"ratelimit:volume:{country}", max(n_posts, 1), settings.WINDOW_MINUTES * 60 * 4)
+    except Exception as exc:
+        logger.warning("Rate limit volume write failed for %s: %s", country, exc)
+
+
+def acquire(provider: str, endpoint: str, country: str) -> bool:
+    """Take one request from the bucket of ``(provider, endpoint)`` on behalf of ``country``.
+
+    Each quota window is split across ``TOP_COUNTRIES`` by ``COUNTRY_PRIORITY`` (or by
+    recent post volume). A country past its share may still borrow whatever quota is
+    not reserved for the others' unspent shares, so the whole quota gets used, but no
+    country can starve the rest. Unknown quotas and cache failures let requests through.
+    """
+    if not settings.RATE_LIMIT_SCHEDULING or endpoint in UNSCHEDULED_ENDPOINTS:
+        return True
+    key = _bucket_key(provider, endpoint)
+    try:
+        state = cache.get(key)
+        if not state or state["reset"] <= time.time():
+            return True
+        codes = list(dict.fromkeys([*settings.TOP_COUNTRIES, country]))
+        usage_keys = {code: f"{key}:{state['reset']}:{code}" for code in codes}
+        volume_keys = {code: f"ratelimit:volume:{code}" for code in codes}
+        found = cache.get_many([f"{key}:remaining", *usage_keys.values(), *volume_keys.values()])
+    except Exception as exc:
+        logger.warning("Rate limit state read failed for %s: %s", key, exc)
+        return True
+
+    if settings.RATE_LIMIT_SPLIT == "volume":
+        weights = {code: found.get(volume_keys[code], 1) for code in codes}
+    else:
+        weights = {code: settings.COUNTRY_PRIORITY.get(code, 1) for code in codes}
+    total = sum(weights.values()) or 1
+    used = {code: found.get(usage_keys[code], 0) for code in codes}
+    spare = found.get(f"{key}:remaining", 0) - settings.RATE_LIMIT_RESERVE
+    if spare <= 0:
+        return False
+    if used[country] >= state["limit"] * weights[country] / total:
+        reserved = sum(
+            max(state["limit"] * weights[code] / total - used[code], 0) for code in codes if code != country
+        )
+        if spare <= reserved:
+            return False
+
+    try:
+        cache.decr(f"{key}:remaining")
+        cache.add(usage_keys[country], 0, max(int(state["reset"] - time.time()), 1) + RESET_GRANULARITY)
+        cache.incr(usage_keys[country])
+    except ValueError:
+        # The window expired between the read and the write; the next response refills it.
+        pass
+    except Exception as exc:
+        logger.warning("Rate limit state write failed for %s: %s", key, exc)
+    return True
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from moods.models import Country
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "countries:version"
+
+
+@dataclasses.dataclass(frozen=True)
+class CountryInfo:
+    id: int
+    code: str
+    name: str
+    has_trends: bool
+    woeid: int | None
+    centroid_lat: float
+    centroid_lng: float
+
+    def to_model(self) -> Country:
+        """The ``Country`` row as a model instance, built without a query."""
+        return Country.from_db("default", FIELDS, [getattr(self, field) for field in FIELDS])
+
+
+FIELDS = tuple(field.name for field in dataclasses.fields(CountryInfo))
+
+
+class CountryRegistry:
+    """Read-only view of the whole ``Country`` table, in id order."""
+
+    def __init__(self, countries: Iterable[CountryInfo]) -> None:
+        countries = tuple(countries)
+        self._by_code = MappingProxyType({country.code: country for country in countries})
+        self._by_id = MappingProxyType({country.id: country for country in countries})
+
+    @classmethod
+    def load(cls) -> CountryRegistry:
+        return cls(CountryInfo(*row) for row in Country.objects.order_by("id").values_list(*FIELDS))
+
+    def __iter__(self) -> Iterator[CountryInfo]:
+        return iter(self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, code: str) -> CountryInfo | None:
+        return self._by_code.get(code.upper())
+
+    def by_id(self, country_id: int) -> CountryInfo | None:
+        return self._by_id.get(country_id)
+
+    def select(self, codes: Iterable[str]) -> list[CountryInfo]:
+        wanted = {code.upper() for code in codes}
+        return [country for country in self if country.code in wanted]
+
+    def within(self, south: float, west: float, north: float, east: float) -> list[CountryInfo]:
+        """Countries whose centroid lies in the box; ``west > east`` spans the antimeridian."""
+        found = []
+        for country in self:
+            lng = country.centroid_lng
+            in_longitude = west <= lng <= east if west <= east else lng >= west or lng <= east
+            if south <= country.centroid_lat <= north and in_longitude:
+                found.append(country)
+        return found
+
+
+_registry: CountryRegistry | None = None
+_version: str | None = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_registry() -> CountryRegistry:
+    """This process's registry, loaded on first use.
+
+    Saves and deletes in this process drop it at once. Other processes publish a new
+    version in the shared cache, checked every ``COUNTRY_REGISTRY_CHECK_SECONDS``.
+    """
+    global _registry, _version, _checked_at
+    registry = _registry
+    if registry is not None and time.monotonic() - _checked_at < settings.COUNTRY_REGISTRY_CHECK_SECONDS:
+        return registry
+    with _lock:
+        version = _shared_version()
+        if _registry is None or version != _version:
+            _registry = CountryRegistry.load()
+            _version = version
+        _checked_at = time.monotonic()
+        return _registry
+
+
+def _shared_version() -> str | None:
+    try:
+        return cache.get(VERSION_KEY)
+    except Exception as exc:
+        logger.warning("Country registry version read failed: %s", exc)
+        return _version
+
+
+def get_country(code: str) -> Country | None:
+    info = get_registry().get(code)
+    return info.to_model() if info else None
+
+
+def countries_for(codes: Iterable[str]) -> list[Country]:
+    return [info.to_model() for info in get_registry().select(codes)]
+
+
+def invalidate() -> None:
+    """Reload on next use here, and tell other processes once the change is committed."""
+    global _registry
+    with _lock:
+        _registry = None
+    transaction.on_commit(_publish_version)
+
+
+def _publish_version() -> None:
+    try:
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    except Exception as exc:
+        logger.warning("Country registry version write failed: %s", exc)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def country_changed(sender, **kwargs) -> None:
+    invalidate()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import bisect
+import dataclasses
+import fcntl
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterator
+
+import requests
+
+from moods.providers import TrendProvider, TrendTopic
+
+logger = logging.getLogger(__name__)
+
+
+# Quieter stretches than this within a recording are taken as a break between sessions.
+MAX_GAP_SECONDS = 3600
+
+
+class ReplayError(requests.RequestException):
+    """Injected by ``ReplayProvider`` in place of a real upstream failure."""
+
+
+class RecordingProvider:
+    """Pass calls through to ``provider`` and append every response to a gzipped JSONL file.
+
+    Each line holds the wall-clock time, the call and its arguments, and the result.
+    Every provider built by ``provider_from_settings`` appends to the same file, so a
+    whole session forms one timeline. Appends hold an exclusive ``flock`` on the file, so
+    threads and worker processes recording at once never interleave their gzip members.
+    """
+
+    def __init__(self, provider: TrendProvider, path: str | Path) -> None:
+        self.provider = provider
+        self.name = getattr(provider, "name", type(provider).__name__.lower())
+        self.global_search = getattr(provider, "global_search", False)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _write(self, call: str, country: str, result: Any, topic: str | None = None) -> None:
+        line = {"t": round(time.time(), 3), "call": call, "country": country, "result": result}
+        if topic is not None:
+            line["topic"] = topic
+        encoded = (json.dumps(line, ensure_ascii=False) + "\n").encode()
+        with self._lock, open(self.path, "ab") as raw:
+            fcntl.flock(raw, fcntl.LOCK_EX)
+            try:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as handle:
+                    handle.write(encoded)
+                raw.flush()
+            finally:
+                fcntl.flock(raw, fcntl.LOCK_UN)
+
+    def get_trends(self, country: str) -> list[TrendTopic]:
+        trends = self.provider.get_trends(country)
+        self._write("get_trends", country, [[trend.topic, trend.weight] for trend in trends])
+        return trends
+
+    def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        posts = self.provider.sample_posts(country, topic, limit)
+        self._write("sample_posts", country, posts, topic=topic)
+        return posts
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Incremental providers are recorded too, as plain post samples.
+        if attribute != "sample_new_posts":
+            raise AttributeError(attribute)
+        method = getattr(self.provider, attribute)
+
+        def sample_new_posts(country: str, topic: str, limit: int, cursor: Any) -> tuple[list[str], Any]:
+            posts, next_cursor = method(country, topic, limit, cursor)
+            self._write("sample_posts", country, posts, topic=topic)
+            return posts, next_cursor
+
+        return sample_new_posts
+
+
+@dataclasses.dataclass
+class Recording:
+    """A recording file indexed by country and topic; post timelines point into ``pool``."""
+
+    trends: dict[str, list[tuple[float, list[TrendTopic]]]]
+    posts: dict[tuple[str, str], list[tuple[float, int]]]
+    posts_by_topic: dict[str, list[tuple[float, int]]]
+    pool: list[list[str]]
+    duration: float
+    started: float = dataclasses.field(default_factory=time.monotonic)
+
+
+def _events(path: str) -> Iterator[dict[str, Any]]:
+    """Recorded events in file order, up to a member cut short by a recorder that died mid-write."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+    except (EOFError, gzip.BadGzipFile, zlib.error) as exc:
+        logger.warning("Replay recording %s ends in a damaged entry, ignoring the rest: %s", path, exc)
+
+
+@functools.lru_cache(maxsize=4)
+def _load(path: str, mtime: float) -> Recording:
+    trends: dict[str, list] = defaultdict(list)
+    posts: dict[tuple[str, str], list] = defaultdict(list)
+    posts_by_topic: dict[str, list] = defaultdict(list)
+    pool: list[list[str]] = []
+    first = previous = None
+    offset = last = 0.0
+    for event in _events(path):
+        if first is None:
+            first = previous = event["t"]
+        # Separate sessions appended to one file are laid end to end.
+        if not 0 <= event["t"] - previous <= MAX_GAP_SECONDS:
+            offset -= event["t"] - previous
+        previous = event["t"]
+        moment = last = max(event["t"] - first + offset, last)
+        if event["call"] == "get_trends":
+            trends[event["country"]].append((moment, [TrendTopic(topic, weight) for topic, weight in event["result"]]))
+        elif event["result"]:
+            posts[(event["country"], event["topic"])].append((moment, len(pool)))
+            posts_by_topic[event["topic"]].append((moment, len(pool)))
+            pool.append(event["result"])
+    for timeline in (*trends.values(), *posts.values(), *posts_by_topic.values()):
+        timeline.sort(key=lambda entry: entry[0])
+    logger.info("Loaded replay recording %s: %s trend and %s post responses", path, sum(map(len, trends.values())), len(pool))
+    return Recording(dict(trends), dict(posts), dict(posts_by_topic), pool, duration=last)
+
+
+def load_recording(path: str | Path) -> Recording:
+    """Parsed recording, shared by every ``ReplayProvider`` on it until the file changes."""
+    return _load(str(path), os.path.getmtime(path))
+
+
+def _stable_index(key: str, size: int) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") % size
+
+
+class ReplayProvider:
+    """Serve responses from a ``RecordingProvider`` file, with no network.
+
+    The recording's timeline advances at ``time_scale`` times real time from the first
+    load in this process, and wraps around when ``loop`` is set. Each call returns the
+    latest response recorded for it at the current replay time. Countries and topics
+    absent from the recording get a stable pick from what was recorded, so any number
+    of countries can be replayed.
+
+    ``multiplier`` returns that many distinct recorded responses per sample call to
+    amplify volume. ``latency_ms`` (plus up to ``jitter_ms``) is slept on every call,
+    and a fraction ``error_rate`` of calls raises ``ReplayError``.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        path: str | Path,
+        time_scale: float = 1.0,
+        loop: bool = True,
+        multiplier: int = 1,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.recording = load_recording(path)
+        self.time_scale = time_scale
+        self.loop = loop
+        self.multiplier = max(multiplier, 1)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        elapsed = (time.monotonic() - self.recording.started) * self.time_scale
+        duration = self.recording.duration
+        if self.loop and duration > 0:
+            return elapsed % duration
+        return elapsed
+
+    def _disturb(self, call: str) -> None:
+        with self._lock:
+            delay = self.latency_ms + self._rng.random() * self.jitter_ms
+            fail = self._rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            raise ReplayError(f"Injected {call} failure")
+
+    def _at(self, timeline: list[tuple[float, Any]], moment: float) -> int:
+        index = bisect.bisect_right(timeline, moment, key=lambda entry: entry[0]) - 1
+        return max(index, 0)
+
+    def get_trends(self, country: str) -> list[TrendTopic]:
+        self._disturb("get_trends")
+        trends = self.recording.trends
+        if not trends:
+            return []
+        timeline = trends.get(country) or trends[sorted(trends)[_stable_index(country, len(trends))]]
+        return list(timeline[self._at(timeline, self._now())][1])
+
+    def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        self._disturb("sample_posts")
+        recording = self.recording
+        timeline = recording.posts.get((country, topic)) or recording.posts_by_topic.get(topic)
+        if timeline:
+            first = timeline[self._at(timeline, self._now())][1]
+        elif recording.pool:
+            first = _stable_index(f"{country}:{topic}", len(recording.pool))
+        else:
+            return []
+        samples = []
+        for offset in range(min(self.multiplier, len(recording.pool))):
+            samples.extend(recording.pool[(first + offset) % len(recording.pool)][:limit])
+        return samples
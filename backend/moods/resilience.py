@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from moods.metrics import CIRCUIT_EVENTS
+from moods.ratelimit import RequestDeferred, acquire
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Each process keeps this many recent latencies per endpoint for the percentiles, and
+# uses them only once it has MIN_SAMPLES.
+LATENCY_SAMPLES = 200
+MIN_SAMPLES = 20
+TIMEOUT_PERCENTILE = 0.99
+TIMEOUT_MULTIPLIER = 3
+HEDGE_PERCENTILE = 0.95
+# Failures further apart than this do not add up to opening a circuit.
+FAILURE_WINDOW = 60
+# Each failed half-open probe doubles the cooldown, up to this many seconds.
+MAX_COOLDOWN = 600
+# A probe claim expires on its own if its holder dies mid-request.
+PROBE_TIMEOUT = 30
+
+_latencies: dict[tuple[str, str], deque[float]] = {}
+# Endpoints this process has seen fail since their last success; only these clear the
+# shared failure count on success, which keeps healthy requests to one cache read.
+_failing: set[tuple[str, str]] = set()
+_lock = threading.Lock()
+_hedge_pool: ThreadPoolExecutor | None = None
+
+
+class CircuitOpen(RequestDeferred):
+    """The endpoint's circuit is open, so the request failed fast without being sent."""
+
+
+def _key(provider: str, endpoint: str) -> str:
+    return f"circuit:{provider}:{endpoint}"
+
+
+def _state(provider: str, endpoint: str) -> dict[str, float] | None:
+    try:
+        return cache.get(_key(provider, endpoint))
+    except Exception as exc:
+        logger.warning("Circuit state read failed: %s", exc)
+        return None
+
+
+def is_open(provider: str, endpoint: str) -> bool:
+    """Whether requests to the endpoint currently fail fast (open and cooling down)."""
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return False
+    state = _state(provider, endpoint)
+    return bool(state) and state["until"] > time.time()
+
+
+def before_request(provider: str, endpoint: str) -> bool:
+    """Raise ``CircuitOpen`` unless the request may be sent; returns whether it is the probe.
+
+    A circuit is closed until ``CIRCUIT_FAILURE_THRESHOLD`` failures in a row, counted
+    across all workers, open it for ``CIRCUIT_COOLDOWN`` seconds. After the cooldown it
+    is half-open: one request, in any worker, is let through as a probe and closes the
+    circuit on success or reopens it for twice as long on failure.
+    """
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return False
+    state = _state(provider, endpoint)
+    if not state:
+        return False
+    if state["until"] > time.time():
+        raise CircuitOpen(f"{provider} {endpoint} circuit is open")
+    try:
+        probe = cache.add(f"{_key(provider, endpoint)}:probe", 1, PROBE_TIMEOUT)
+    except Exception as exc:
+        logger.warning("Circuit probe claim failed: %s", exc)
+        probe = True
+    if not probe:
+        raise CircuitOpen(f"{provider} {endpoint} circuit is half-open with a probe in flight")
+    return True
+
+
+def release_probe(provider: str, endpoint: str) -> None:
+    """Give up a probe claim without sending, so another worker can probe straight away."""
+    try:
+        cache.delete(f"{_key(provider, endpoint)}:probe")
+    except Exception as exc:
+        logger.warning("Circuit probe release failed: %s", exc)
+
+
+def record_outcome(provider: str, endpoint: str, ok: bool, latency: float | None = None, probe: bool = False) -> None:
+    """Count a sent request towards the circuit; ``ok`` is False for transport errors and 5xx."""
+    endpoint_key = (provider, endpoint)
+    if ok and latency is not None:
+        with _lock:
+            _latencies.setdefault(endpoint_key, deque(maxlen=LATENCY_SAMPLES)).append(latency)
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return
+    key = _key(provider, endpoint)
+    try:
+        if ok:
+            if probe:
+                cache.delete_many([key, f"{key}:probe", f"{key}:failures"])
+                CIRCUIT_EVENTS.labels(provider=provider, endpoint=endpoint, event="closed").inc()
+                logger.info("Circuit for %s %s closed", provider, endpoint)
+            elif endpoint_key in _failing:
+                cache.delete(f"{key}:failures")
+            _failing.discard(endpoint_key)
+            return
+        _failing.add(endpoint_key)
+        if probe:
+            previous = cache.get(key) or {}
+            _open(provider, endpoint, min(previous.get("cooldown", settings.CIRCUIT_COOLDOWN) * 2, MAX_COOLDOWN))
+            cache.delete(f"{key}:probe")
+            return
+        cache.add(f"{key}:failures", 0, FAILURE_WINDOW)
+        failures = cache.incr(f"{key}:failures")
+        if failures >= settings.CIRCUIT_FAILURE_THRESHOLD and not cache.get(key):
+            _open(provider, endpoint, settings.CIRCUIT_COOLDOWN)
+    except ValueError:
+        # The failure count expired between add and incr; the next failure starts a new one.
+        pass
+    except Exception as exc:
+        logger.warning("Circuit state write failed: %s", exc)
+
+
+def _open(provider: str, endpoint: str, cooldown: float) -> None:
+    cache.set(_key(provider, endpoint), {"until": time.time() + cooldown, "cooldown": cooldown}, None)
+    CIRCUIT_EVENTS.labels(provider=provider, endpoint=endpoint, event="opened").inc()
+    logger.warning("Circuit for %s %s opened for %ss", provider, endpoint, cooldown)
+
+
+def latency_percentile(provider: str, endpoint: str, quantile: float) -> float | None:
+    """This process's recent latency at ``quantile``, or ``None`` with too few samples."""
+    with _lock:
+        samples = sorted(_latencies.get((provider, endpoint), ()))
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return samples[min(int(quantile * len(samples)), len(samples) - 1)]
+
+
+def timeout_for(provider: str, endpoint: str, timeout: Any) -> Any:
+    """``timeout`` tightened to a multiple of the endpoint's p99, never below ``ADAPTIVE_TIMEOUT_MIN``."""
+    if not settings.ADAPTIVE_TIMEOUTS or not isinstance(timeout, (int, float)):
+        return timeout
+    observed = latency_percentile(provider, endpoint, TIMEOUT_PERCENTILE)
+    if observed is None:
+        return timeout
+    return min(timeout, max(observed * TIMEOUT_MULTIPLIER, settings.ADAPTIVE_TIMEOUT_MIN))
+
+
+def _hedge_delay(labels: tuple[str, str, str]) -> float | None:
+    if labels[1] not in settings.HEDGE_ENDPOINTS:
+        return None
+    return latency_percentile(labels[0], labels[1], HEDGE_PERCENTILE)
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=max(settings.FETCH_WORKERS, 2) * 2, thread_name_prefix="hedge")
+        return _hedge_pool
+
+
+def _succeeded(result: Any) -> bool:
+    """Whether a finished request's response can win the hedge; 5xx responses cannot."""
+    return getattr(result, "status_code", 200) < 500
+
+
+def hedged(labels: tuple[str, str, str], call: Callable[[], T]) -> T:
+    """``call()``, repeated once if it is still running after the endpoint's p95 latency.
+
+    Only endpoints in ``HEDGE_ENDPOINTS`` are hedged, and only when the rate-limit budget
+    has room for the second request. The first successful result wins, so a fast 5xx
+    waits for the other request; when neither succeeds, a response is preferred over an
+    exception. The slower request still finishes in the background, since ``requests``
+    cannot cancel it.
+    """
+    delay = _hedge_delay(labels)
+    if delay is None:
+        return call()
+    pool = _get_hedge_pool()
+    first = pool.submit(call)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    if not acquire(*labels):
+        return first.result()
+    CIRCUIT_EVENTS.labels(provider=labels[0], endpoint=labels[1], event="hedged").inc()
+    pending = {first, pool.submit(call)}
+    fallback = None
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if _succeeded(future.result()):
+                    return future.result()
+                fallback = fallback or future
+        if not pending:
+            return (fallback or done.pop()).result()
+
+
+async def ahedged(labels: tuple[str, str, str], call: Callable[[], Awaitable[T]]) -> T:
+    """Async ``hedged``, picking the winner the same way; the slower request is cancelled."""
+    delay = _hedge_delay(labels)
+    if delay is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not await asyncio.to_thread(acquire, *labels):
+        return await first
+    CIRCUIT_EVENTS.labels(provider=labels[0], endpoint=labels[1], event="hedged").inc()
+    pending = {first, asyncio.ensure_future(call())}
+    fallback = None
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if _succeeded(task.result()):
+                        return task.result()
+                    fallback = fallback or task
+            if not pending:
+                return (fallback or done.pop()).result()
+    finally:
+        for task in pending:
+            task.cancel()
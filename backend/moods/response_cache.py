@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Mapping
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from moods.metrics import RESPONSE_CACHE
+from moods.ratelimit import RequestDeferred
+
+logger = logging.getLogger(__name__)
+
+# Entries outlive their TTL by this factor so an expired one can still be revalidated
+# with its ETag, or served stale when the rate-limit budget is spent.
+STALE_FACTOR = 4
+# A single-flight claim expires on its own if its holder dies mid-request.
+CLAIM_TIMEOUT = 30
+KEPT_HEADERS = ("etag", "last-modified", "content-type")
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    """The parts of a response the providers read, rebuilt from a cache entry."""
+
+    status_code: int
+    text: str
+    headers: dict[str, str]
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+def _ttl(method: str, endpoint: str) -> int:
+    if method != "GET" or not settings.RESPONSE_CACHE_ENABLED:
+        return 0
+    return settings.RESPONSE_CACHE_TTLS.get(endpoint, 0)
+
+
+def response_key(labels: tuple[str, str, str], url: str, params: Mapping[str, Any] | None) -> str:
+    """Cache key for one GET; the same endpoint and parameters share it across countries and workers."""
+    query = urlencode(sorted((params or {}).items()))
+    digest = hashlib.blake2b(f"{url}?{query}".encode(), digest_size=16).hexdigest()
+    return f"response:{labels[0]}:{labels[1]}:{digest}"
+
+
+def _entry(response, ttl: int) -> dict[str, Any]:
+    headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+    return {"text": response.text, "headers": headers, "expires": time.time() + ttl}
+
+
+def _conditional(entry: dict[str, Any] | None) -> dict[str, str]:
+    if not entry:
+        return {}
+    headers = {}
+    if "etag" in entry["headers"]:
+        headers["If-None-Match"] = entry["headers"]["etag"]
+    if "last-modified" in entry["headers"]:
+        headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+    return headers
+
+
+def _fresh(entry: dict[str, Any] | None) -> bool:
+    return bool(entry) and entry["expires"] > time.time()
+
+
+def _read(key: str) -> dict[str, Any] | None:
+    try:
+        return cache.get(key)
+    except Exception as exc:
+        logger.warning("Response cache read failed: %s", exc)
+        return None
+
+
+def _write(key: str, entry: dict[str, Any], ttl: int) -> None:
+    try:
+        cache.set(key, entry, ttl * STALE_FACTOR)
+    except Exception as exc:
+        logger.warning("Response cache write failed: %s", exc)
+
+
+def _claim(key: str) -> bool:
+    try:
+        return cache.add(f"{key}:claim", 1, CLAIM_TIMEOUT)
+    except Exception as exc:
+        logger.warning("Response cache claim failed: %s", exc)
+        return True
+
+
+def _release(key: str) -> None:
+    try:
+        cache.delete(f"{key}:claim")
+    except Exception as exc:
+        logger.warning("Response cache release failed: %s", exc)
+
+
+def _served(labels: tuple[str, str, str], outcome: str, entry: dict[str, Any]) -> CachedResponse:
+    RESPONSE_CACHE.labels(provider=labels[0], endpoint=labels[1], outcome=outcome).inc()
+    return CachedResponse(status_code=200, text=entry["text"], headers=dict(entry["headers"]))
+
+
+def _completed(labels, key: str, ttl: int, entry: dict[str, Any] | None, response):
+    """Store or refresh the entry from ``response``; returns what the caller should see."""
+    if response.status_code == 304 and entry:
+        entry = {**entry, "expires": time.time() + ttl}
+        _write(key, entry, ttl)
+        return _served(labels, "revalidated", entry)
+    RESPONSE_CACHE.labels(provider=labels[0], endpoint=labels[1], outcome="miss").inc()
+    if response.status_code == 200:
+        _write(key, _entry(response, ttl), ttl)
+    return response
+
+
+def cached_request(
+    method: str,
+    url: str,
+    labels: tuple[str, str, str],
+    send: Callable[..., Any],
+    params: Mapping[str, Any] | None = None,
+    headers: Mapping[str, str] | None = None,
+    **kwargs,
+):
+    """``send(method, url, labels, ...)`` behind the shared response cache.
+
+    Fresh entries are returned without a request. Otherwise one caller claims the key
+    and revalidates with ``If-None-Match``/``If-Modified-Since`` where the entry has
+    them, while concurrent callers for the same key (in any worker) wait up to
+    ``RESPONSE_CACHE_WAIT`` seconds for its result. An expired entry is served when the
+    rate-limit budget defers the request.
+    """
+    ttl = _ttl(method, labels[1])
+    if not ttl:
+        return send(method, url, labels, params=params, headers=headers, **kwargs)
+    key = response_key(labels, url, params)
+    entry = _read(key)
+    if _fresh(entry):
+        return _served(labels, "hit", entry)
+
+    claimed = _claim(key)
+    if not claimed:
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_WAIT
+        delay = 0.02
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            waited = _read(key)
+            if _fresh(waited):
+                return _served(labels, "coalesced", waited)
+    try:
+        response = send(method, url, labels, params=params, headers={**(headers or {}), **_conditional(entry)}, **kwargs)
+    except RequestDeferred:
+        if entry:
+            return _served(labels, "stale", entry)
+        raise
+    finally:
+        if claimed:
+            _release(key)
+    return _completed(labels, key, ttl, entry, response)
+
+
+async def acached_request(
+    method: str,
+    url: str,
+    labels: tuple[str, str, str],
+    send: Callable[..., Awaitable[Any]],
+    params: Mapping[str, Any] | None = None,
+    headers: Mapping[str, str] | None = None,
+    **kwargs,
+):
+    """Async ``cached_request``; cache calls run in worker threads and waiting yields the loop."""
+    ttl = _ttl(method, labels[1])
+    if not ttl:
+        return await send(method, url, labels, params=params, headers=headers, **kwargs)
+    key = response_key(labels, url, params)
+    entry = await asyncio.to_thread(_read, key)
+    if _fresh(entry):
+        return _served(labels, "hit", entry)
+
+    claimed = await asyncio.to_thread(_claim, key)
+    if not claimed:
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_WAIT
+        delay = 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            waited = await asyncio.to_thread(_read, key)
+            if _fresh(waited):
+                return _served(labels, "coalesced", waited)
+    try:
+        response = await send(
+            method, url, labels, params=params, headers={**(headers or {}), **_conditional(entry)}, **kwargs
+        )
+    except RequestDeferred:
+        if entry:
+            return _served(labels, "stale", entry)
+        raise
+    finally:
+        if claimed:
+            await asyncio.to_thread(_release, key)
+    return await asyncio.to_thread(_completed, labels, key, ttl, entry, response)
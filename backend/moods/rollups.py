@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.utils import timezone
+
+from moods.models import MoodRollup, MoodSnapshot
+from moods.registry import get_registry
+from moods.scoring import EMOTIONS, MoodAccumulator
+from moods.services import summarize_accumulator
+
+# Each resolution is built from the one before it (the first from raw snapshots), so a
+# rollup merges at most a few dozen rows no matter how long its window is.
+RESOLUTIONS = (60, 360, 1440, 10080)
+
+ROLLUP_FIELDS = (
+    "mood_score",
+    "energy",
+    "emoji",
+    "label",
+    "confidence",
+    "n_items",
+    "n_snapshots",
+    "emotion_probs",
+    "aggregate_state",
+)
+
+
+def bucket_start(moment: datetime.datetime, minutes: int) -> datetime.datetime:
+    """Start of the UTC-epoch-aligned ``minutes`` bucket containing ``moment``."""
+    seconds = minutes * 60
+    timestamp = int(moment.timestamp())
+    return datetime.datetime.fromtimestamp(timestamp - timestamp % seconds, tz=datetime.timezone.utc)
+
+
+def _accumulator(state: dict, n_items: int, mood_score: float, energy: float, emotion_probs: dict) -> MoodAccumulator:
+    if state:
+        return MoodAccumulator.from_dict(state)
+    # Rows written before aggregate_state existed: rebuild what the summary allows,
+    # without the second moment.
+    return MoodAccumulator(
+        count=n_items,
+        polarity_mean=mood_score,
+        energy_sum=energy * n_items,
+        emotion_sums=[emotion_probs.get(emotion, 0.0) * n_items for emotion in EMOTIONS],
+    )
+
+
+def refresh_rollups(
+    now: datetime.datetime | None = None,
+    since: datetime.datetime | None = None,
+    resolutions: tuple[int, ...] = RESOLUTIONS,
+) -> int:
+    """Recompute rollups from stored aggregates, without provider calls or rescoring.
+
+    By default only the current and previous bucket of each resolution are rebuilt,
+    which is all a refresh cycle can have changed; pass ``since`` to backfill. Returns
+    the number of rollup rows written.
+    """
+    now = now or timezone.now()
+    has_trends = {info.id: info.has_trends for info in get_registry()}
+    source, source_minutes = MoodSnapshot, settings.WINDOW_MINUTES
+    written = 0
+
+    for minutes in resolutions:
+        start = bucket_start(since or now - datetime.timedelta(minutes=minutes), minutes)
+        # Snapshots count as one each; a rollup stands for the snapshots it merged.
+        covered = Value(1) if source is MoodSnapshot else F("n_snapshots")
+        rows = (
+            source.objects.filter(window_minutes=source_minutes, window_start__gte=start, window_start__lte=now)
+            .annotate(covered=covered)
+            .values_list(
+                "country_id", "window_start", "covered", "aggregate_state", "n_items", "mood_score", "energy", "emotion_probs"
+            )
+        )
+
+        buckets: dict[tuple[int, datetime.datetime], MoodAccumulator] = defaultdict(MoodAccumulator)
+        counts: dict[tuple[int, datetime.datetime], int] = defaultdict(int)
+        for country_id, window_start, count, *summary in rows:
+            key = (country_id, bucket_start(window_start, minutes))
+            buckets[key].merge(_accumulator(*summary))
+            counts[key] += count
+
+        rollups = [
+            MoodRollup(
+                country_id=country_id,
+                window_start=window_start,
+                window_minutes=minutes,
+                n_snapshots=counts[(country_id, window_start)],
+                **summarize_accumulator(accumulator, has_trends.get(country_id, False)),
+            )
+            for (country_id, window_start), accumulator in buckets.items()
+        ]
+        if rollups:
+            with transaction.atomic():
+                MoodRollup.objects.bulk_create(
+                    rollups,
+                    update_conflicts=True,
+                    unique_fields=["country", "window_start", "window_minutes"],
+                    update_fields=list(ROLLUP_FIELDS) + ["updated_at"],
+                )
+        written += len(rollups)
+        source, source_minutes = MoodRollup, minutes
+    return written
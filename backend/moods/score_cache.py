@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterator, Sequence
+
+import numpy as np
+from django.conf import settings
+
+from moods import scoring
+from moods.scoring import BatchScores
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreCache:
+    """Bounded LRU of per-text scores with an optional shared (Redis) tier.
+
+    Keys are a BLAKE2 digest of the whitespace-normalized text; scores do not depend
+    on whitespace, so reflowed copies of a post share an entry. Every key is scoped to
+    the active lexicon version, and the local tier empties itself when that version
+    changes, so a lexicon swap never serves stale scores.
+    """
+
+    def __init__(self, max_entries: int = 100_000, shared=None, shared_ttl: int = 86_400) -> None:
+        self.max_entries = max_entries
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, ...]] = OrderedDict()
+        self._version: str | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.blake2b(" ".join(text.split()).encode(), digest_size=16).hexdigest()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "shared_hits": self.shared_hits, "misses": self.misses, "size": len(self._entries)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def resolve(self, texts: Sequence[str], compute: Callable[[list[str]], BatchScores]) -> BatchScores:
+        """Scores for ``texts``, calling ``compute`` only for texts not cached anywhere."""
+        version = scoring.LEXICON.version
+        keys = [self.key(text) for text in texts]
+        rows: dict[str, tuple[float, ...]] = {}
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            for key in keys:
+                row = self._entries.get(key)
+                if row is not None:
+                    self._entries.move_to_end(key)
+                    rows[key] = row
+
+        pending = list(dict.fromkeys(key for key in keys if key not in rows))
+        if pending and self.shared is not None:
+            found = self._shared_get(version, pending)
+            rows.update(found)
+            self._store(found)
+            self.shared_hits += sum(1 for key in keys if key in found)
+            pending = [key for key in pending if key not in found]
+
+        self.hits += sum(1 for key in keys if key in rows)
+        if pending:
+            missing = set(pending)
+            texts_by_key = {key: text for key, text in zip(keys, texts) if key in missing}
+            batch = compute([texts_by_key[key] for key in pending])
+            table = np.column_stack([batch.polarity, batch.energy, batch.emotions])
+            computed = {key: tuple(row) for key, row in zip(pending, table.tolist())}
+            rows.update(computed)
+            self._store(computed)
+            if self.shared is not None:
+                self._shared_set(version, computed)
+            self.misses += sum(1 for key in keys if key in missing)
+
+        if not keys:
+            return BatchScores.empty()
+        table = np.array([rows[key] for key in keys], dtype=float)
+        return BatchScores(polarity=table[:, 0], energy=table[:, 1], emotions=table[:, 2:])
+
+    def _store(self, rows: dict[str, tuple[float, ...]]) -> None:
+        with self._lock:
+            self._entries.update(rows)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _shared_get(self, version: str, keys: list[str]) -> dict[str, tuple[float, ...]]:
+        try:
+            found = self.shared.get_many([f"score:{version}:{key}" for key in keys])
+        except Exception as exc:
+            logger.warning("Shared score cache read failed: %s", exc)
+            return {}
+        prefix = len(f"score:{version}:")
+        return {key[prefix:]: tuple(row) for key, row in found.items()}
+
+    def _shared_set(self, version: str, rows: dict[str, tuple[float, ...]]) -> None:
+        try:
+            self.shared.set_many({f"score:{version}:{key}": row for key, row in rows.items()}, self.shared_ttl)
+        except Exception as exc:
+            logger.warning("Shared score cache write failed: %s", exc)
+
+
+_score_cache: ScoreCache | None = None
+
+
+def get_score_cache() -> ScoreCache | None:
+    """Process-wide cache configured from settings, or ``None`` when disabled."""
+    global _score_cache
+    if not settings.SCORE_CACHE_SIZE:
+        return None
+    if _score_cache is None:
+        shared = None
+        if settings.SCORE_CACHE_SHARED:
+            from django.core.cache import cache
+
+            shared = cache
+        _score_cache = ScoreCache(settings.SCORE_CACHE_SIZE, shared=shared, shared_ttl=settings.SCORE_CACHE_TTL)
+    return _score_cache
+
+
+@contextlib.contextmanager
+def local_score_cache() -> Iterator[ScoreCache | None]:
+    """Swap in a fresh process-only cache, without the shared tier, until the block exits.
+
+    For benchmarks, which clear it between runs; the shared tier cannot be cleared
+    without emptying scores other processes rely on.
+    """
+    global _score_cache
+    previous = _score_cache
+    _score_cache = ScoreCache(settings.SCORE_CACHE_SIZE) if settings.SCORE_CACHE_SIZE else None
+    try:
+        yield _score_cache
+    finally:
+        _score_cache = previous
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
-import math
 import re
-from dataclasses import dataclass
-from typing import Iterable
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+import numpy as np
+
+from moods.lexicon import Lexicon
+
+if TYPE_CHECKING:
+    from moods.score_cache import ScoreCache
 
 POSITIVE_WORDS = {"good", "great", "love", "happy", "joy", "win", "relief", "hope", "peace"}
 NEGATIVE_WORDS = {"bad", "sad", "angry", "fear", "loss", "hate", "crisis", "panic", "pain"}
@@ -15,6 +22,10 @@ EMOTION_KEYWORDS = {
     "sadness": {"sad", "loss", "grief", "mourning"},
     "fear": {"fear", "panic", "worry", "alert"},
 }
+EMOTIONS = tuple(EMOTION_KEYWORDS)
+ENERGY_EMOJI = "😀😐😡😢😨"
+
+_TOKEN_RE = re.compile(r"[a-zA-Z']+")
 
 
 @dataclass
@@ -31,49 +42,259 @@ class AggregatedScore:
     emotions: dict[str, float]
 
 
+@dataclass
+class BatchScores:
+    """Columnar scores for a window of texts, one row per text."""
+
+    polarity: np.ndarray
+    energy: np.ndarray
+    emotions: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.polarity)
+
+    def item(self, index: int) -> ScoredItem:
+        return ScoredItem(
+            polarity=float(self.polarity[index]),
+            energy=float(self.energy[index]),
+            emotions=dict(zip(EMOTIONS, self.emotions[index].tolist())),
+        )
+
+    def take(self, indices) -> BatchScores:
+        return BatchScores(
+            polarity=self.polarity[indices],
+            energy=self.energy[indices],
+            emotions=self.emotions[indices],
+        )
+
+    @classmethod
+    def empty(cls) -> BatchScores:
+        return cls(polarity=np.zeros(0), energy=np.zeros(0), emotions=np.zeros((0, len(EMOTIONS))))
+
+    @classmethod
+    def concat(cls, batches: Sequence[BatchScores]) -> BatchScores:
+        if not batches:
+            return cls.empty()
+        return cls(
+            polarity=np.concatenate([batch.polarity for batch in batches]),
+            energy=np.concatenate([batch.energy for batch in batches]),
+            emotions=np.concatenate([batch.emotions for batch in batches]),
+        )
+
+
+LEXICON = Lexicon.from_sets(POSITIVE_WORDS, NEGATIVE_WORDS, EMOTION_KEYWORDS)
+
+
+def set_lexicon(lexicon: Lexicon) -> None:
+    """Swap the process-wide lexicon, e.g. for one loaded from ``settings.LEXICON_PATH``."""
+    global LEXICON
+    if lexicon.emotions != EMOTIONS:
+        raise ValueError(f"Lexicon emotions {lexicon.emotions} do not match {EMOTIONS}")
+    LEXICON = lexicon
+
+
 def _tokenize(text: str) -> list[str]:
-    return re.findall(r"[a-zA-Z']+", text.lower())
+    return _TOKEN_RE.findall(text.lower())
 
 
-def score_text(text: str) -> ScoredItem:
-    tokens = _tokenize(text)
-    pos = sum(1 for token in tokens if token in POSITIVE_WORDS)
-    neg = sum(1 for token in tokens if token in NEGATIVE_WORDS)
+def score_text(text: str, cache: ScoreCache | None = None) -> ScoredItem:
+    if cache is not None:
+        return cache.resolve([text], _score_batch).item(0)
+    pos, neg, counts = LEXICON.score_ids(LEXICON.match(_tokenize(text)))
     total = max(pos + neg, 1)
     polarity = max(min((pos - neg) / total, 1.0), -1.0)
 
     exclamations = text.count("!")
     question = text.count("?")
-    caps = sum(1 for ch in text if ch.isupper())
-    emoji_density = sum(1 for ch in text if ch in "😀😐😡😢😨")
+    caps = sum(map(str.isupper, text))
+    emoji_density = sum(text.count(symbol) for symbol in ENERGY_EMOJI)
     energy = min((exclamations + question + caps / 10 + emoji_density) / 5, 1.0)
 
-    emotions: dict[str, float] = {key: 0.0 for key in EMOTION_KEYWORDS}
-    for emotion, keywords in EMOTION_KEYWORDS.items():
-        emotions[emotion] = sum(1 for token in tokens if token in keywords)
-
-    total_emotions = sum(emotions.values()) or 1.0
-    normalized = {key: value / total_emotions for key, value in emotions.items()}
+    total_emotions = sum(counts) or 1.0
+    normalized = {key: value / total_emotions for key, value in zip(EMOTIONS, counts)}
 
     return ScoredItem(polarity=polarity, energy=energy, emotions=normalized)
 
 
-def aggregate_scores(items: Iterable[ScoredItem]) -> AggregatedScore:
-    items_list = list(items)
-    if not items_list:
-        return AggregatedScore(mood_score=0.0, energy=0.0, emotions={key: 0.2 for key in EMOTION_KEYWORDS})
+def score_batch(texts: Sequence[str], cache: ScoreCache | None = None) -> BatchScores:
+    """Score a whole window at once, returning columnar arrays in input order."""
+    if cache is not None:
+        return cache.resolve(texts, _score_batch)
+    return _score_batch(texts)
+
+
+def _score_batch(texts: Sequence[str]) -> BatchScores:
+    n = len(texts)
+    if not n:
+        return BatchScores.empty()
+
+    lexicon = LEXICON
+    id_lists = [lexicon.match(_tokenize(text)) for text in texts]
+    lengths = np.fromiter(map(len, id_lists), dtype=np.intp, count=n)
+    ids = np.fromiter(chain.from_iterable(id_lists), dtype=np.intp, count=int(lengths.sum()))
+    docs = np.repeat(np.arange(n), lengths)
+
+    pos = np.bincount(docs, weights=lexicon.positive[ids], minlength=n)
+    neg = np.bincount(docs, weights=lexicon.negative[ids], minlength=n)
+    polarity = np.clip((pos - neg) / np.maximum(pos + neg, 1), -1.0, 1.0)
+
+    punctuation = np.fromiter((text.count("!") + text.count("?") for text in texts), dtype=float, count=n)
+    caps = np.fromiter((sum(map(str.isupper, text)) for text in texts), dtype=float, count=n)
+    emoji_density = np.fromiter(
+        (sum(text.count(symbol) for symbol in ENERGY_EMOJI) for text in texts), dtype=float, count=n
+    )
+    energy = np.minimum((punctuation + caps / 10 + emoji_density) / 5, 1.0)
+
+    emotions = np.empty((n, len(EMOTIONS)))
+    for column in range(len(EMOTIONS)):
+        emotions[:, column] = np.bincount(docs, weights=lexicon.emotion_matrix[ids, column], minlength=n)
+    totals = emotions.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    emotions /= totals
+
+    return BatchScores(polarity=polarity, energy=energy, emotions=emotions)
+
+
+def aggregate_scores(items: Iterable[ScoredItem] | BatchScores) -> AggregatedScore:
+    accumulator = MoodAccumulator()
+    if isinstance(items, BatchScores):
+        accumulator.add_batch(items)
+    else:
+        for item in items:
+            accumulator.add(item)
+    return accumulator.result()
+
+
+@dataclass
+class MoodAccumulator:
+    """Streaming mood moments: Welford mean/M2 for polarity plus energy and emotion sums.
+
+    Items are folded in one at a time (or a batch at a time) and accumulators for
+    different shards or windows combine with :meth:`merge`, so nothing needs to be
+    rescored or kept in memory to produce an aggregate.
+    """
+
+    count: int = 0
+    polarity_mean: float = 0.0
+    polarity_m2: float = 0.0
+    energy_sum: float = 0.0
+    emotion_sums: list[float] = field(default_factory=lambda: [0.0] * len(EMOTIONS))
+
+    def add(self, item: ScoredItem) -> None:
+        self.count += 1
+        delta = item.polarity - self.polarity_mean
+        self.polarity_mean += delta / self.count
+        self.polarity_m2 += delta * (item.polarity - self.polarity_mean)
+        self.energy_sum += item.energy
+        for column, emotion in enumerate(EMOTIONS):
+            self.emotion_sums[column] += item.emotions.get(emotion, 0.0)
+
+    def add_batch(self, batch: BatchScores) -> None:
+        self.merge(MoodAccumulator.from_batch(batch))
+
+    def merge(self, other: MoodAccumulator) -> MoodAccumulator:
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.polarity_mean - self.polarity_mean
+        self.polarity_mean += delta * other.count / count
+        self.polarity_m2 += other.polarity_m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.energy_sum += other.energy_sum
+        self.emotion_sums = [left + right for left, right in zip(self.emotion_sums, other.emotion_sums)]
+        return self
+
+    def scaled(self, factor: float) -> MoodAccumulator:
+        """A copy standing for ``factor`` of these items, with the same means and mix."""
+        count = int(round(self.count * factor))
+        if not count:
+            return MoodAccumulator()
+        ratio = count / self.count
+        return MoodAccumulator(
+            count=count,
+            polarity_mean=self.polarity_mean,
+            polarity_m2=self.polarity_m2 * ratio,
+            energy_sum=self.energy_sum * ratio,
+            emotion_sums=[value * ratio for value in self.emotion_sums],
+        )
+
+    @classmethod
+    def from_batch(cls, batch: BatchScores) -> MoodAccumulator:
+        if not len(batch):
+            return cls()
+        mean = float(batch.polarity.mean())
+        return cls(
+            count=len(batch),
+            polarity_mean=mean,
+            polarity_m2=float(((batch.polarity - mean) ** 2).sum()),
+            energy_sum=float(batch.energy.sum()),
+            emotion_sums=batch.emotions.sum(axis=0).tolist(),
+        )
+
+    @classmethod
+    def from_groups(cls, batch: BatchScores, groups: np.ndarray, n_groups: int) -> list[MoodAccumulator]:
+        """One accumulator per group id in ``groups`` (row-aligned with ``batch``)."""
+        counts = np.bincount(groups, minlength=n_groups)
+        means = np.bincount(groups, weights=batch.polarity, minlength=n_groups) / np.maximum(counts, 1)
+        m2 = np.bincount(groups, weights=(batch.polarity - means[groups]) ** 2, minlength=n_groups)
+        energy = np.bincount(groups, weights=batch.energy, minlength=n_groups)
+        emotions = np.stack(
+            [np.bincount(groups, weights=batch.emotions[:, column], minlength=n_groups) for column in range(len(EMOTIONS))],
+            axis=1,
+        )
+        return [
+            cls(
+                count=int(counts[index]),
+                polarity_mean=float(means[index]),
+                polarity_m2=float(m2[index]),
+                energy_sum=float(energy[index]),
+                emotion_sums=emotions[index].tolist(),
+            )
+            for index in range(n_groups)
+        ]
+
+    @property
+    def mood_score(self) -> float:
+        return max(min(self.polarity_mean, 1.0), -1.0)
+
+    @property
+    def energy(self) -> float:
+        return self.energy_sum / self.count if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        return self.polarity_m2 / self.count if self.count else 0.0
+
+    @property
+    def emotions(self) -> dict[str, float]:
+        total = sum(self.emotion_sums)
+        if not total:
+            return {key: 1 / len(EMOTIONS) for key in EMOTIONS}
+        return {key: value / total for key, value in zip(EMOTIONS, self.emotion_sums)}
 
-    mood_score = sum(item.polarity for item in items_list) / len(items_list)
-    energy = sum(item.energy for item in items_list) / len(items_list)
+    def result(self) -> AggregatedScore:
+        return AggregatedScore(mood_score=self.mood_score, energy=self.energy, emotions=self.emotions)
 
-    emotions = {key: 0.0 for key in EMOTION_KEYWORDS}
-    for item in items_list:
-        for key, value in item.emotions.items():
-            emotions[key] += value
-    total = sum(emotions.values()) or 1.0
-    emotions = {key: value / total for key, value in emotions.items()}
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "polarity_mean": self.polarity_mean,
+            "polarity_m2": self.polarity_m2,
+            "energy_sum": self.energy_sum,
+            "emotion_sums": dict(zip(EMOTIONS, self.emotion_sums)),
+        }
 
-    return AggregatedScore(mood_score=max(min(mood_score, 1.0), -1.0), energy=energy, emotions=emotions)
+    @classmethod
+    def from_dict(cls, data: dict) -> MoodAccumulator:
+        if not data:
+            return cls()
+        return cls(
+            count=data["count"],
+            polarity_mean=data["polarity_mean"],
+            polarity_m2=data["polarity_m2"],
+            energy_sum=data["energy_sum"],
+            emotion_sums=[data["emotion_sums"].get(key, 0.0) for key in EMOTIONS],
+        )
 
 
 def select_emoji_label(emotions: dict[str, float]) -> tuple[str, str]:
@@ -95,9 +316,14 @@ def confidence_from_samples(n_items: int, variance: float) -> str:
     return "LOW"
 
 
-def variance(values: Iterable[float]) -> float:
-    values_list = list(values)
-    if not values_list:
-        return 0.0
-    mean = sum(values_list) / len(values_list)
-    return sum((value - mean) ** 2 for value in values_list) / len(values_list)
+def variance(values: Iterable[float] | np.ndarray) -> float:
+    if isinstance(values, np.ndarray):
+        return float(values.var()) if values.size else 0.0
+    count = 0
+    mean = m2 = 0.0
+    for value in values:
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+    return m2 / count if count else 0.0
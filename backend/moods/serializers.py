@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from moods.models import Country, MoodDriver, MoodSnapshot, TextSample
+from moods.models import Country, MoodDriver, MoodRollup, MoodSnapshot, TextSample
 
 
 class MoodSnapshotSerializer(serializers.ModelSerializer):
@@ -15,6 +15,24 @@ class MoodSnapshotSerializer(serializers.ModelSerializer):
             "label",
             "confidence",
             "n_items",
+            "n_duplicates",
+            "emotion_probs",
+        ]
+
+
+class MoodRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MoodRollup
+        fields = [
+            "window_start",
+            "window_minutes",
+            "mood_score",
+            "energy",
+            "emoji",
+            "label",
+            "confidence",
+            "n_items",
+            "n_snapshots",
             "emotion_probs",
         ]
 
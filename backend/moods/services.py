@@ -1,123 +1,411 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 import logging
-from collections import defaultdict
+import time
+from functools import partial
+from typing import Any
 
+import numpy as np
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import transaction
 from django.utils import timezone
 
-from moods.models import Country, MoodDriver, MoodSnapshot, TextSample
+from moods.async_providers import AsyncTrendProvider, as_async, async_provider_from_settings
+from moods.concurrency import fetch_ordered
+from moods.cursors import TopicCursor, load_cursors, store_cursors
+from moods.dedup import NearDuplicateFilter
+from moods.executors import score_window
+from moods.metrics import POSTS, provider_label, timed
+from moods.models import Country, MoodSnapshot
+from moods.persistence import SnapshotRecord, save_snapshots
 from moods.providers import TrendProvider, TrendTopic, provider_from_settings
-from moods.scoring import aggregate_scores, confidence_from_samples, score_text, select_emoji_label, variance
+from moods.ratelimit import note_volume
+from moods.registry import countries_for
+from moods.score_cache import get_score_cache
+from moods.scoring import BatchScores, MoodAccumulator, confidence_from_samples, select_emoji_label
+from moods.topics import TopicFetch, TopicRegistry, normalize_topic
 
 logger = logging.getLogger(__name__)
 
 
+class DeadlineExceeded(Exception):
+    """The refresh cycle's deadline passed before this country's work was done."""
+
+
+def _check_deadline(deadline: float | None, stage: str) -> None:
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded(f"cycle deadline passed before {stage}")
+
+
 def _window_start(window_minutes: int) -> datetime.datetime:
     now = timezone.now()
     minutes = (now.minute // window_minutes) * window_minutes
     return now.replace(minute=minutes, second=0, microsecond=0)
 
 
-def refresh_country(country: Country, provider: TrendProvider | None = None, window_minutes: int | None = None) -> MoodSnapshot | None:
+def summarize_accumulator(
+    accumulator: MoodAccumulator, has_trends: bool, window: MoodAccumulator | None = None
+) -> dict[str, Any]:
+    """Snapshot fields derived from an aggregate; shared by refreshes and rollups.
+
+    ``window`` is the part of ``accumulator`` fetched in this window when earlier windows
+    were carried forward into it: the mood comes from ``accumulator``, while ``n_items``,
+    the confidence and the stored aggregate count only this window's posts.
+    """
+    counted = accumulator if window is None else window
+    emotion_probs = accumulator.emotions
+    emoji, label = select_emoji_label(emotion_probs)
+    confidence = confidence_from_samples(counted.count, accumulator.variance)
+    if not has_trends and confidence == "HIGH":
+        confidence = "MED"
+    if not has_trends and confidence == "MED":
+        confidence = "LOW"
+    return {
+        "mood_score": accumulator.mood_score,
+        "energy": accumulator.energy,
+        "emoji": emoji,
+        "label": label,
+        "confidence": confidence,
+        "n_items": counted.count,
+        "emotion_probs": emotion_probs,
+        "aggregate_state": counted.to_dict(),
+    }
+
+
+def _sample_topic(provider: TrendProvider, country_code: str, topic: str) -> list[str]:
+    try:
+        with timed("sample_posts", country_code, provider_label(provider)):
+            return provider.sample_posts(country_code, topic, limit=20)
+    except Exception as exc:
+        logger.exception("Provider sample_posts failed: %s", exc)
+        return []
+
+
+def _sample_new_topic(provider: TrendProvider, country_code: str, topic_cursor: tuple[str, Any]) -> tuple[list[str], Any]:
+    topic, cursor = topic_cursor
+    try:
+        with timed("sample_posts", country_code, provider_label(provider)):
+            return provider.sample_new_posts(country_code, topic, limit=20, cursor=cursor)
+    except Exception as exc:
+        logger.exception("Provider sample_new_posts failed: %s", exc)
+        return [], cursor
+
+
+def _topic_ids(trends: list[TrendTopic]) -> dict[str, int]:
+    """Index of each distinct topic; spellings that normalize alike keep only the first."""
+    if not trends:
+        trends = [TrendTopic(topic="general mood", weight=1.0)]
+    topic_ids: dict[str, int] = {}
+    seen: set[str] = set()
+    for trend in trends:
+        normalized = normalize_topic(trend.topic)
+        if normalized not in seen:
+            seen.add(normalized)
+            topic_ids[trend.topic] = len(topic_ids)
+    return topic_ids
+
+
+def build_snapshot(
+    country: Country,
+    provider: TrendProvider | None = None,
+    window_minutes: int | None = None,
+    topics: TopicRegistry | None = None,
+    deadline: float | None = None,
+) -> SnapshotRecord | None:
+    """Fetch, deduplicate and score one country's window without writing anything.
+
+    ``topics`` is the cycle's ``TopicRegistry`` when several countries are refreshed
+    together; by default the country gets one of its own. Past ``deadline`` (a UNIX
+    timestamp) the fetched posts are not scored and ``DeadlineExceeded`` is raised.
+    """
     provider = provider or provider_from_settings()
+    topics = topics or TopicRegistry(provider)
     window_minutes = window_minutes or settings.WINDOW_MINUTES
     window_start = _window_start(window_minutes)
+    label = provider_label(provider)
 
     try:
-        trends = provider.get_trends(country.code)
+        with timed("get_trends", country.code, label):
+            trends = provider.get_trends(country.code)
     except Exception as exc:
         logger.exception("Provider get_trends failed: %s", exc)
         return None
+    topic_ids = _topic_ids(trends)
 
-    if not trends:
-        trends = [TrendTopic(topic="general mood", weight=1.0)]
+    # Providers that support cursors only return posts newer than the last fetch; the
+    # topic aggregates from earlier windows are carried forward and merged with them.
+    incremental = settings.INCREMENTAL_INGESTION and hasattr(provider, "sample_new_posts")
+    cursors = load_cursors(country.code, list(topic_ids)) if incremental else None
 
-    scored_items = []
-    driver_map: dict[str, list[float]] = defaultdict(list)
-    driver_emotions: dict[str, list[dict[str, float]]] = defaultdict(list)
-    text_samples: list[tuple[str, str]] = []
+    def fetch(topic: str) -> TopicFetch:
+        if incremental:
+            cursor = cursors[topic].cursor
+            load = partial(_sample_new_topic, provider, country.code, (topic, cursor))
+            return topics.fetch(country.code, topic, cursor, load)
+        return topics.fetch(country.code, topic, None, lambda: (_sample_topic(provider, country.code, topic), None))
 
-    for trend in trends:
-        try:
-            posts = provider.sample_posts(country.code, trend.topic, limit=20)
-        except Exception as exc:
-            logger.exception("Provider sample_posts failed: %s", exc)
-            posts = []
-        for post in posts:
-            scored = score_text(post)
-            scored_items.append(scored)
-            driver_map[trend.topic].append(scored.polarity)
-            driver_emotions[trend.topic].append(scored.emotions)
-            if len(text_samples) < 5:
-                source = "x" if settings.PROVIDER in {"x", "composite"} else "reddit"
-                text_samples.append((source, post[:240]))
-
-    aggregated = aggregate_scores(scored_items)
-    emoji, label = select_emoji_label(aggregated.emotions)
-    var = variance([item.polarity for item in scored_items])
-    confidence = confidence_from_samples(len(scored_items), var)
-    if not country.has_trends and confidence == "HIGH":
-        confidence = "MED"
-    if not country.has_trends and confidence == "MED":
-        confidence = "LOW"
+    with timed("fetch", country.code, label):
+        fetched = fetch_ordered("topics", fetch, topic_ids)
+    _check_deadline(deadline, "scoring")
+    return _assemble_snapshot(country, window_start, window_minutes, label, topic_ids, fetched, cursors)
+
+
+def _assemble_snapshot(
+    country: Country,
+    window_start: datetime.datetime,
+    window_minutes: int,
+    label: str,
+    topic_ids: dict[str, int],
+    fetched: list[TopicFetch],
+    cursors: dict[str, TopicCursor] | None,
+) -> SnapshotRecord:
+    """Score and aggregate the fetched topics, in ``topic_ids`` order.
+
+    ``cursors`` is ``None`` unless the fetch was incremental, in which case they are
+    advanced and stored.
+    """
+    posts: list[str] = []
+    post_topics: list[int] = []
+    for topic_index, topic_fetch in enumerate(fetched):
+        posts.extend(topic_fetch.posts)
+        post_topics.extend([topic_index] * len(topic_fetch.posts))
+    # Near-duplicates within a topic were collapsed when it was fetched, before anyone
+    # scored it; copies across this country's topics are dropped here, after scoring,
+    # since each topic's scores are shared with other countries.
+    n_duplicates = sum(topic_fetch.n_duplicates for topic_fetch in fetched)
+    n_fetched = len(posts) + n_duplicates
+    kept = None
+    if settings.DEDUP_ENABLED and posts:
+        dedup = NearDuplicateFilter(settings.DEDUP_SIMILARITY)
+        with timed("dedup", country.code, label):
+            kept = dedup.filter(posts)
+        if dedup.collapsed:
+            n_duplicates += dedup.collapsed
+            posts = [posts[index] for index in kept]
+            post_topics = [post_topics[index] for index in kept]
+        else:
+            kept = None
+    POSTS.labels(country=country.code, provider=label, outcome="fetched").inc(n_fetched)
+    POSTS.labels(country=country.code, provider=label, outcome="duplicate").inc(n_duplicates)
+    note_volume(country.code, n_fetched)
+    if n_duplicates:
+        logger.info("Collapsed %s near-duplicate posts of %s for %s", n_duplicates, n_fetched, country.code)
+
+    source = "x" if settings.PROVIDER in {"x", "composite"} else "reddit"
+    text_samples = [(source, post[:240]) for post in posts[:5]]
+
+    with timed("scoring", country.code, label):
+        scores = _topic_scores(fetched)
+        if kept is not None:
+            scores = scores.take(np.asarray(kept, dtype=np.intp))
+    POSTS.labels(country=country.code, provider=label, outcome="scored").inc(len(posts))
+    topic_accumulators = MoodAccumulator.from_groups(scores, np.asarray(post_topics, dtype=np.intp), len(topic_ids))
+    # Counts and the aggregate stored for rollups cover only this window's posts; with
+    # the carried-forward share, a bucket of windows would count each post again in
+    # every later one, and a feed gone quiet would keep its confidence.
+    window_accumulator = MoodAccumulator()
+    for topic_accumulator in topic_accumulators:
+        window_accumulator.merge(topic_accumulator)
+    window_counts = [topic_accumulator.count for topic_accumulator in topic_accumulators]
+    if cursors is not None:
+        for topic, topic_accumulator, topic_fetch in zip(topic_ids, topic_accumulators, fetched):
+            previous = cursors[topic]
+            if previous.cursor is not None:
+                topic_accumulator.merge(previous.state.scaled(settings.CARRY_FORWARD_WEIGHT))
+            cursors[topic] = TopicCursor(cursor=topic_fetch.cursor, state=topic_accumulator)
+        store_cursors(country.code, cursors)
+    accumulator = MoodAccumulator()
+    for topic_accumulator in topic_accumulators:
+        accumulator.merge(topic_accumulator)
+
+    driver_items = sorted(
+        (item for item in zip(topic_ids, topic_accumulators, window_counts) if item[1].count),
+        key=lambda item: item[1].count,
+        reverse=True,
+    )[:8]
+
+    return SnapshotRecord(
+        country=country,
+        window_start=window_start,
+        window_minutes=window_minutes,
+        values={
+            **summarize_accumulator(accumulator, country.has_trends, window=window_accumulator),
+            "n_duplicates": n_duplicates,
+        },
+        drivers=[
+            {
+                "topic": topic,
+                "weight": topic_accumulator.count,
+                "sentiment_avg": topic_accumulator.polarity_mean,
+                "emotion_probs": topic_accumulator.emotions,
+                "n_items": window_count,
+            }
+            for topic, topic_accumulator, window_count in driver_items
+        ],
+        samples=text_samples,
+    )
 
-    with transaction.atomic():
-        snapshot, _ = MoodSnapshot.objects.update_or_create(
-            country=country,
-            window_start=window_start,
-            window_minutes=window_minutes,
-            defaults={
-                "mood_score": aggregated.mood_score,
-                "energy": aggregated.energy,
-                "emoji": emoji,
-                "label": label,
-                "confidence": confidence,
-                "n_items": len(scored_items),
-                "emotion_probs": aggregated.emotions,
-            },
-        )
-        snapshot.drivers.all().delete()
-        snapshot.samples.all().delete()
-
-        driver_items = sorted(driver_map.items(), key=lambda item: len(item[1]), reverse=True)[:8]
-        for rank, (topic, polarities) in enumerate(driver_items, start=1):
-            emotion_avg = _average_emotions(driver_emotions[topic])
-            MoodDriver.objects.create(
-                snapshot=snapshot,
-                topic=topic,
-                weight=len(polarities),
-                sentiment_avg=sum(polarities) / max(len(polarities), 1),
-                emotion_probs=emotion_avg,
-                n_items=len(polarities),
-                rank=rank,
-            )
 
-        for source, text in text_samples:
-            TextSample.objects.create(snapshot=snapshot, source=source, text=text)
+def _topic_scores(fetched: list[TopicFetch]) -> BatchScores:
+    """Scores of every fetched post.
 
-    return snapshot
+    Topics no other country has claimed are scored here in one batch; topics another
+    country is scoring concurrently are waited for.
+    """
+    claimed = [topic_fetch for topic_fetch in fetched if topic_fetch.claim_scoring()]
+    try:
+        if claimed:
+            batch = score_window([post for topic_fetch in claimed for post in topic_fetch.posts], cache=get_score_cache())
+            start = 0
+            for topic_fetch in claimed:
+                topic_fetch.scores = batch.take(slice(start, start + len(topic_fetch.posts)))
+                start += len(topic_fetch.posts)
+    finally:
+        for topic_fetch in claimed:
+            topic_fetch.scoring_done()
+    return BatchScores.concat(
+        [topic_fetch.wait_scores() or score_window(topic_fetch.posts, cache=get_score_cache()) for topic_fetch in fetched]
+    )
+
+
+def _score_posts(posts: list[str]) -> BatchScores:
+    return score_window(posts, cache=get_score_cache())
 
 
-def _average_emotions(emotions_list: list[dict[str, float]]) -> dict[str, float]:
-    if not emotions_list:
-        return {"joy": 0.2, "neutral": 0.2, "anger": 0.2, "sadness": 0.2, "fear": 0.2}
-    totals: dict[str, float] = defaultdict(float)
-    for emotions in emotions_list:
-        for key, value in emotions.items():
-            totals[key] += value
-    total = sum(totals.values()) or 1.0
-    return {key: value / total for key, value in totals.items()}
+def refresh_country(
+    country: Country,
+    provider: TrendProvider | None = None,
+    window_minutes: int | None = None,
+    broadcast: bool = True,
+    deadline: float | None = None,
+    cycle: str | None = None,
+) -> MoodSnapshot | None:
+    """Refresh and save one country.
+
+    Tasks of one ``refresh_all_moods`` chord pass the same ``cycle`` id, so topics they
+    share are fetched and scored by one of them (see ``TopicRegistry``).
+    """
+    provider = provider or provider_from_settings()
+    topics = TopicRegistry(provider, cycle=cycle, score=_score_posts) if cycle else None
+    record = build_snapshot(country, provider=provider, window_minutes=window_minutes, topics=topics, deadline=deadline)
+    if record is None:
+        return None
+    _check_deadline(deadline, "persist")
+    return save_snapshots([record], broadcast=broadcast)[0]
 
 
 def refresh_all(provider: TrendProvider | None = None, window_minutes: int | None = None) -> list[MoodSnapshot]:
+    """Refresh every ``TOP_COUNTRIES`` country and commit the whole cycle in one batch.
+
+    Topics trending in several countries are fetched and scored once for all of them.
+    """
     provider = provider or provider_from_settings()
     window_minutes = window_minutes or settings.WINDOW_MINUTES
-    snapshots = []
-    for country in Country.objects.filter(code__in=settings.TOP_COUNTRIES):
-        snapshot = refresh_country(country, provider=provider, window_minutes=window_minutes)
-        if snapshot:
-            snapshots.append(snapshot)
-    return snapshots
+    topics = TopicRegistry(provider)
+    records = []
+    for country in countries_for(settings.TOP_COUNTRIES):
+        record = build_snapshot(country, provider=provider, window_minutes=window_minutes, topics=topics)
+        if record:
+            records.append(record)
+    return save_snapshots(records)
+
+
+async def _sample_topic_async(provider: AsyncTrendProvider, country_code: str, topic: str) -> tuple[list[str], None]:
+    try:
+        with timed("sample_posts", country_code, provider_label(provider)):
+            return await provider.sample_posts(country_code, topic, limit=20), None
+    except Exception as exc:
+        logger.exception("Provider sample_posts failed: %s", exc)
+        return [], None
+
+
+async def _sample_new_topic_async(
+    provider: AsyncTrendProvider, country_code: str, topic: str, cursor: Any
+) -> tuple[list[str], Any]:
+    try:
+        with timed("sample_posts", country_code, provider_label(provider)):
+            return await provider.sample_new_posts(country_code, topic, limit=20, cursor=cursor)
+    except Exception as exc:
+        logger.exception("Provider sample_new_posts failed: %s", exc)
+        return [], cursor
+
+
+async def build_snapshot_async(
+    country: Country,
+    provider: AsyncTrendProvider,
+    window_minutes: int | None = None,
+    topics: TopicRegistry | None = None,
+) -> SnapshotRecord | None:
+    """``build_snapshot`` with every topic request in flight at once on the running loop.
+
+    Scoring and the cache reads and writes run in worker threads, so the loop keeps
+    serving other countries' requests meanwhile.
+    """
+    topics = topics or TopicRegistry(provider)
+    window_minutes = window_minutes or settings.WINDOW_MINUTES
+    window_start = _window_start(window_minutes)
+    label = provider_label(provider)
+
+    try:
+        with timed("get_trends", country.code, label):
+            trends = await provider.get_trends(country.code)
+    except Exception as exc:
+        logger.exception("Provider get_trends failed: %s", exc)
+        return None
+    topic_ids = _topic_ids(trends)
+
+    incremental = settings.INCREMENTAL_INGESTION and hasattr(provider, "sample_new_posts")
+    cursors = await asyncio.to_thread(load_cursors, country.code, list(topic_ids)) if incremental else None
+    with timed("fetch", country.code, label):
+        if incremental:
+            calls = (
+                topics.afetch(
+                    country.code,
+                    topic,
+                    cursors[topic].cursor,
+                    partial(_sample_new_topic_async, provider, country.code, topic, cursors[topic].cursor),
+                )
+                for topic in topic_ids
+            )
+        else:
+            calls = (
+                topics.afetch(country.code, topic, None, partial(_sample_topic_async, provider, country.code, topic))
+                for topic in topic_ids
+            )
+        fetched = list(await asyncio.gather(*calls))
+    return await asyncio.to_thread(
+        _assemble_snapshot, country, window_start, window_minutes, label, topic_ids, fetched, cursors
+    )
+
+
+async def refresh_country_async(
+    country: Country, provider: TrendProvider | AsyncTrendProvider | None = None, window_minutes: int | None = None
+) -> MoodSnapshot | None:
+    provider = as_async(provider or async_provider_from_settings())
+    record = await build_snapshot_async(country, provider, window_minutes)
+    if record is None:
+        return None
+    return (await sync_to_async(save_snapshots)([record]))[0]
+
+
+async def refresh_all_async(
+    provider: TrendProvider | AsyncTrendProvider | None = None, window_minutes: int | None = None
+) -> list[MoodSnapshot]:
+    """``refresh_all`` on one event loop, ``ASYNC_COUNTRY_CONCURRENCY`` countries at a time.
+
+    Sync providers are accepted and run through ``AsyncProviderAdapter``. Sync callers can
+    use ``async_to_sync(refresh_all_async)``.
+    """
+    provider = as_async(provider or async_provider_from_settings())
+    countries = await sync_to_async(countries_for)(settings.TOP_COUNTRIES)
+    limit = asyncio.Semaphore(max(settings.ASYNC_COUNTRY_CONCURRENCY, 1))
+    topics = TopicRegistry(provider)
+
+    async def build(country: Country) -> SnapshotRecord | None:
+        async with limit:
+            return await build_snapshot_async(country, provider, window_minutes, topics)
+
+    records = await asyncio.gather(*(build(country) for country in countries))
+    return await sync_to_async(save_snapshots)([record for record in records if record])
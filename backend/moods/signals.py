@@ -1,26 +1,171 @@
 from __future__ import annotations
 
+import atexit
+import logging
+import threading
+from functools import partial
+from typing import Any
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from moods.metrics import timed
 from moods.models import MoodSnapshot
 
+logger = logging.getLogger(__name__)
+
+GROUP = "mood_updates"
+SEQUENCE_KEY = "broadcast:sequence"
+# Replay frames and per-country state outlive any realistic reconnect gap.
+BUFFER_TTL = 86_400
+
+# Updates waiting out BROADCAST_DEBOUNCE, latest per country.
+_pending: dict[str, dict[str, Any]] = {}
+_timer: threading.Timer | None = None
+_lock = threading.Lock()
+
+
+def _country_code(snapshot: MoodSnapshot) -> str:
+    if MoodSnapshot.country.is_cached(snapshot):
+        return snapshot.country.code
+    from moods.registry import get_registry
+
+    info = get_registry().by_id(snapshot.country_id)
+    return info.code if info else snapshot.country.code
+
+
+def snapshot_update(snapshot: MoodSnapshot) -> dict[str, Any]:
+    """The fields websocket clients get for a snapshot."""
+    return {
+        "country": _country_code(snapshot),
+        "emoji": snapshot.emoji,
+        "mood_score": snapshot.mood_score,
+        "energy": snapshot.energy,
+    }
+
+
+def broadcast_snapshots(snapshots: list[MoodSnapshot]) -> None:
+    """Broadcast snapshots in one frame once the current transaction commits.
+
+    Nothing is sent if it rolls back. Bulk writes call this since they skip post_save.
+    """
+    updates = [snapshot_update(snapshot) for snapshot in snapshots]
+    if updates:
+        transaction.on_commit(partial(broadcast_updates, updates))
+
+
+def broadcast_updates(updates: list[dict[str, Any]]) -> None:
+    """Send ``updates`` to websocket clients as a single batch frame.
+
+    With ``BROADCAST_DEBOUNCE`` set, updates are held that many seconds and merged
+    with any that follow, keeping the latest per country, so a burst of commits
+    becomes one frame.
+    """
+    if not updates:
+        return
+    if settings.BROADCAST_DEBOUNCE <= 0:
+        _send(updates)
+        return
+    global _timer
+    with _lock:
+        for update in updates:
+            _pending[update["country"]] = update
+        if _timer is None:
+            _timer = threading.Timer(settings.BROADCAST_DEBOUNCE, flush_broadcasts)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush_broadcasts() -> None:
+    """Send the debounced updates now."""
+    global _timer
+    with _lock:
+        updates = list(_pending.values())
+        _pending.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    if updates:
+        _send(updates)
+
+
+atexit.register(flush_broadcasts)
+
+
+def _send(updates: list[dict[str, Any]]) -> None:
+    country = updates[0]["country"] if len(updates) == 1 else "all"
+    try:
+        with timed("broadcast", country):
+            sequence = _log(updates)
+            async_to_sync(get_channel_layer().group_send)(
+                GROUP, {"type": "mood.batch", "sequence": sequence, "updates": updates}
+            )
+    except Exception as exc:
+        # Runs after the commit; the snapshots are saved either way.
+        logger.warning("Broadcast of %s updates failed: %s", len(updates), exc)
+
+
+def _frame_key(sequence: int) -> str:
+    return f"broadcast:frame:{sequence % settings.BROADCAST_BUFFER}"
+
+
+def _state_key(country: str) -> str:
+    return f"broadcast:state:{country}"
+
+
+def _log(updates: list[dict[str, Any]]) -> int | None:
+    """Number the batch, keep it in the replay ring buffer and record each country's latest state."""
+    try:
+        cache.add(SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(SEQUENCE_KEY)
+        entries = {_state_key(update["country"]): update for update in updates}
+        entries[_frame_key(sequence)] = {"sequence": sequence, "updates": updates}
+        cache.set_many(entries, BUFFER_TTL)
+    except Exception as exc:
+        logger.warning("Broadcast log write failed, reconnecting clients will get full state: %s", exc)
+        return None
+    return sequence
+
+
+def updates_since(sequence: int) -> tuple[int, list[dict[str, Any]] | None]:
+    """The current sequence and every update published after ``sequence``, oldest first.
+
+    The updates are ``None`` when some of them have already left the
+    ``BROADCAST_BUFFER``-frame ring buffer, or the sequence is not one of ours.
+    """
+    try:
+        current = cache.get(SEQUENCE_KEY) or 0
+        if sequence > current or current - sequence > settings.BROADCAST_BUFFER:
+            return current, None
+        wanted = range(sequence + 1, current + 1)
+        frames = cache.get_many([_frame_key(number) for number in wanted])
+    except Exception as exc:
+        logger.warning("Broadcast log read failed: %s", exc)
+        return 0, None
+    updates = []
+    for number in wanted:
+        frame = frames.get(_frame_key(number))
+        if frame is None or frame["sequence"] != number:
+            return current, None
+        updates.extend(frame["updates"])
+    return current, updates
+
+
+def current_state(countries: list[str]) -> list[dict[str, Any]]:
+    """The latest broadcast update of each country, read from the cache rather than the database."""
+    try:
+        found = cache.get_many([_state_key(country) for country in countries])
+    except Exception as exc:
+        logger.warning("Broadcast state read failed: %s", exc)
+        return []
+    return [found[_state_key(country)] for country in countries if _state_key(country) in found]
+
 
 @receiver(post_save, sender=MoodSnapshot)
 def broadcast_mood_update(sender, instance: MoodSnapshot, created: bool, **kwargs):
-    channel_layer = get_channel_layer()
-    payload = {
-        "country": instance.country.code,
-        "emoji": instance.emoji,
-        "mood_score": instance.mood_score,
-        "energy": instance.energy,
-    }
-    async_to_sync(channel_layer.group_send)(
-        "mood_updates",
-        {
-            "type": "mood.update",
-            "payload": payload,
-        },
-    )
+    broadcast_snapshots([instance])
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import itertools
+import math
+import random
+
+from moods.providers import TrendTopic
+from moods.scoring import EMOTION_KEYWORDS, ENERGY_EMOJI, NEGATIVE_WORDS, POSITIVE_WORDS
+
+_SYLLABLES = "ka lo mi ra te su ven dor pa li ne ro ma ti sel gan bri to".split()
+_FILLER = (
+    "the a of to in and is for on with today people city market team game vote new time year "
+    "this that just now so but not what about from after more they we you it all still"
+).split()
+_EMOJI = list(ENERGY_EMOJI) + ["🔥", "👏", "🙏", "😂", "💔", "🎉"]
+
+
+@dataclasses.dataclass(frozen=True)
+class WorkloadShape:
+    """Volume and text statistics of a synthetic window.
+
+    Post lengths follow a log-normal around ``mean_words``, and words are drawn from a
+    Zipf-weighted vocabulary in which the sentiment lexicon makes up ``lexicon_share``
+    of the draws. ``shared_topic_rate`` of each country's trends come from one global
+    pool, the way world news trends in many countries at once.
+    """
+
+    topics_per_country: int = 10
+    posts_per_topic: int = 50
+    topic_pool: int = 500
+    shared_topic_rate: float = 0.5
+    mean_words: float = 18.0
+    vocabulary_size: int = 5000
+    lexicon_share: float = 0.08
+    duplicate_rate: float = 0.15
+    emoji_rate: float = 0.2
+    caps_rate: float = 0.08
+    hashtag_rate: float = 0.15
+
+
+@functools.lru_cache(maxsize=8)
+def _vocabulary(size: int) -> tuple[list[str], list[float], list[str], list[float]]:
+    """Zipf cumulative weights for filler plus invented words, and for lexicon words."""
+    rng = random.Random(f"vocabulary:{size}")
+    invented = set()
+    while len(invented) < max(size - len(_FILLER), 0):
+        invented.add("".join(rng.choices(_SYLLABLES, k=rng.randint(1, 4))))
+    words = _FILLER + sorted(invented)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    lexicon = sorted(POSITIVE_WORDS | NEGATIVE_WORDS | set().union(*EMOTION_KEYWORDS.values()))
+    lexicon_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(lexicon) + 1)))
+    return words, weights, lexicon, lexicon_weights
+
+
+def generate_posts(rng: random.Random, count: int, shape: WorkloadShape = WorkloadShape()) -> list[str]:
+    """``count`` posts drawn from ``rng`` only, so equal seeds give equal posts."""
+    words, weights, lexicon, lexicon_weights = _vocabulary(shape.vocabulary_size)
+    sigma = 0.6
+    mu = math.log(shape.mean_words) - sigma**2 / 2
+    posts: list[str] = []
+    for _ in range(count):
+        if posts and rng.random() < shape.duplicate_rate:
+            original = posts[rng.randrange(len(posts))]
+            posts.append(rng.choice((original, f"RT @user{rng.randrange(10_000)}: {original}", f"{original} 💯")))
+            continue
+        length = min(max(int(rng.lognormvariate(mu, sigma)), 3), 60)
+        n_lexicon = min(int(length * shape.lexicon_share + rng.random()), length)
+        text = rng.choices(words, cum_weights=weights, k=length - n_lexicon)
+        for word in rng.choices(lexicon, cum_weights=lexicon_weights, k=n_lexicon):
+            text.insert(rng.randrange(len(text) + 1), word)
+        if rng.random() < shape.caps_rate:
+            if rng.random() < 0.3:
+                text = [word.upper() for word in text]
+            else:
+                index = rng.randrange(len(text))
+                text[index] = text[index].upper()
+        if rng.random() < shape.hashtag_rate:
+            text.append("#" + rng.choice(words))
+        post = " ".join(text)
+        if rng.random() < shape.emoji_rate:
+            post += " " + "".join(rng.choices(_EMOJI, k=rng.randint(1, 3)))
+        posts.append(post)
+    return posts
+
+
+class SyntheticProvider:
+    """Seeded, network-free provider producing windows of any size.
+
+    Every call builds its own ``random.Random`` from the seed and its arguments, so
+    results depend only on them: not on call order, threads or the global random state.
+    Posts depend on the topic alone, since the real searches are not filtered by country.
+    ``limit`` is ignored; each topic yields ``shape.posts_per_topic`` posts.
+    """
+
+    name = "synthetic"
+    global_search = True
+
+    def __init__(self, seed: int = 0, shape: WorkloadShape = WorkloadShape()) -> None:
+        self.seed = seed
+        self.shape = shape
+
+    @functools.cached_property
+    def topics(self) -> list[str]:
+        words, _, _, _ = _vocabulary(self.shape.vocabulary_size)
+        rng = random.Random(f"{self.seed}:topics")
+        pool: dict[str, None] = {}
+        # Topic names skip the filler words, which read as stop words.
+        candidates = words[len(_FILLER) :]
+        while len(pool) < self.shape.topic_pool:
+            pool[" ".join(rng.choices(candidates, k=rng.randint(1, 3)))] = None
+        return list(pool)
+
+    def get_trends(self, country: str) -> list[TrendTopic]:
+        rng = random.Random(f"{self.seed}:{country}:trends")
+        count = self.shape.topics_per_country
+        n_shared = sum(rng.random() < self.shape.shared_topic_rate for _ in range(count))
+        topics = rng.sample(self.topics, min(n_shared, len(self.topics)))
+        topics += [f"{country.lower()} {name}" for name in rng.sample(self.topics, min(count - len(topics), len(self.topics)))]
+        return [TrendTopic(topic=topic, weight=1.0) for topic in topics]
+
+    def sample_posts(self, country: str, topic: str, limit: int) -> list[str]:
+        rng = random.Random(f"{self.seed}:{topic}")
+        return generate_posts(rng, self.shape.posts_per_topic, self.shape)
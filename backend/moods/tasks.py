@@ -1,18 +1,132 @@
 from __future__ import annotations
 
-from celery import shared_task
+import datetime
+import logging
+import time
 
-from moods.models import Country
-from moods.services import refresh_all, refresh_country
+from celery import chord, group, shared_task
+from celery.result import AsyncResult
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+
+from moods.registry import get_country, get_registry
+from moods.rollups import refresh_rollups
+from moods.services import DeadlineExceeded, refresh_country
+from moods.signals import broadcast_updates, snapshot_update
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_country_mood(
+    country_code: str,
+    window_minutes: int,
+    deadline: float | None = None,
+    batched: bool = False,
+    cycle: str | None = None,
+) -> dict:
+    """Refresh one country; past ``deadline`` (a UNIX timestamp) the work is skipped as stale.
+
+    The deadline is checked before the fetch, the scoring and the write, so a task that
+    starts late does not run a whole cycle budget past it.
+
+    The snapshot is broadcast once it commits. ``batched`` tasks, run inside the
+    ``refresh_all_moods`` chord, return the update for the cycle's batch frame instead;
+    their shared ``cycle`` id lets them fetch and score each common topic once.
+    """
+    if deadline is not None and time.time() >= deadline:
+        logger.warning("Skipping %s refresh, cycle deadline passed before it started", country_code)
+        return {"country": country_code, "status": "stale"}
+    country = get_country(country_code)
+    if country is None:
+        return {"country": country_code, "status": "failed"}
+    try:
+        snapshot = refresh_country(
+            country, window_minutes=window_minutes, broadcast=not batched, deadline=deadline, cycle=cycle
+        )
+    except (DeadlineExceeded, SoftTimeLimitExceeded):
+        logger.warning("Refresh of %s cancelled at the cycle deadline", country_code)
+        return {"country": country_code, "status": "stale"}
+    except Exception as exc:
+        # A failed country must not fail the chord and drop every other result.
+        logger.exception("Refresh of %s failed: %s", country_code, exc)
+        return {"country": country_code, "status": "failed"}
+    if snapshot is None:
+        return {"country": country_code, "status": "failed"}
+    if not batched:
+        return {"country": country_code, "status": "ok"}
+    return {"country": country_code, "status": "ok", "update": snapshot_update(snapshot)}
 
 
 @shared_task
-def refresh_country_mood(country_code: str, window_minutes: int) -> None:
-    country = Country.objects.get(code=country_code)
-    refresh_country(country, window_minutes=window_minutes)
+def collect_refresh_results(results: list[dict], started_at: float) -> dict:
+    summary: dict[str, list[str]] = {"ok": [], "stale": [], "failed": []}
+    for result in results:
+        summary.setdefault(result["status"], []).append(result["country"])
+    broadcast_updates([result["update"] for result in results if result.get("update")])
+    duration = time.time() - started_at
+    logger.info(
+        "Refresh cycle finished in %.1fs: %s ok, %s stale, %s failed",
+        duration,
+        len(summary["ok"]),
+        len(summary["stale"]),
+        len(summary["failed"]),
+    )
+    if summary["stale"]:
+        logger.warning("Stale countries this cycle: %s", ", ".join(summary["stale"]))
+    refresh_mood_rollups.delay()
+    return {"duration": duration, **summary}
+
+
+@shared_task
+def refresh_cycle_failed(request, exc, traceback, tasks: list[list[str]], started_at: float) -> dict:
+    """Chord error callback, mostly for country tasks that expired in the queue.
+
+    ``tasks`` pairs each header task id with its country. Countries whose task finished
+    are collected, and broadcast, as usual; the rest are reported stale.
+    """
+    logger.warning("Refresh cycle did not finish cleanly, some countries are stale: %s", exc)
+    results = []
+    for task_id, country_code in tasks:
+        result = AsyncResult(task_id)
+        if result.successful() and isinstance(result.result, dict):
+            results.append(result.result)
+        else:
+            results.append({"country": country_code, "status": "stale"})
+    return collect_refresh_results(results, started_at)
 
 
 @shared_task
 def refresh_all_moods() -> int:
-    snapshots = refresh_all()
-    return len(snapshots)
+    """Fan out one ``refresh_country_mood`` per country and collect them in a chord callback.
+
+    Every country task shares the cycle deadline (``REFRESH_DEADLINE_SECONDS`` from now):
+    tasks still queued when it passes expire, running ones stop as stale at their next
+    stage, and a soft time limit of the same budget interrupts any stage that hangs.
+    Topics trending in several countries are fetched and scored once for the cycle.
+    """
+    codes = [info.code for info in get_registry().select(settings.TOP_COUNTRIES)]
+    if not codes:
+        return 0
+    budget = settings.REFRESH_DEADLINE_SECONDS
+    started_at = time.time()
+    deadline = started_at + budget
+    expires = datetime.datetime.fromtimestamp(deadline, tz=datetime.timezone.utc)
+    cycle = f"{started_at:.6f}"
+    tasks = [
+        refresh_country_mood.s(code, settings.WINDOW_MINUTES, deadline, batched=True, cycle=cycle).set(
+            soft_time_limit=budget, expires=expires
+        )
+        for code in codes
+    ]
+    # Celery fails the chord when a header task expires, so the callback would not run;
+    # the error callback looks the finished tasks up by id instead.
+    task_ids = [[task.freeze().id, code] for task, code in zip(tasks, codes)]
+    callback = collect_refresh_results.s(started_at).on_error(refresh_cycle_failed.s(task_ids, started_at))
+    chord(group(tasks))(callback)
+    return len(codes)
+
+
+@shared_task
+def refresh_mood_rollups() -> int:
+    return refresh_rollups()
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from moods.dedup import NearDuplicateFilter
+from moods.metrics import TOPIC_FETCHES, provider_label, timed
+from moods.scoring import BatchScores
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_topic(topic: str) -> str:
+    """Key shared by spellings of one trend: case, width, leading ``#`` and spacing are ignored."""
+    text = unicodedata.normalize("NFKC", topic).casefold()
+    return " ".join(word.lstrip("#") for word in text.split())
+
+
+@dataclasses.dataclass
+class TopicFetch:
+    """One topic's posts for the cycle, and their scores once a country has scored them.
+
+    ``posts`` are the ones left after near-duplicate filtering; ``n_duplicates`` were dropped.
+    """
+
+    posts: list[str]
+    cursor: Any = None
+    scores: BatchScores | None = None
+    n_duplicates: int = 0
+    _claimed: bool = dataclasses.field(default=False, repr=False)
+    _scored: threading.Event = dataclasses.field(default_factory=threading.Event, repr=False, compare=False)
+
+    def claim_scoring(self) -> bool:
+        """True for the one caller that should score these posts; the others ``wait_scores``."""
+        with _claim_lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def scoring_done(self) -> None:
+        self._scored.set()
+
+    def wait_scores(self) -> BatchScores | None:
+        """The scores, once the claimant is done; ``None`` if its scoring failed."""
+        self._scored.wait()
+        return self.scores
+
+    def set_scores(self, scores: BatchScores) -> None:
+        """Scores computed before the fetch was handed out; no country scores it again."""
+        self.scores = scores
+        self._claimed = True
+        self._scored.set()
+
+
+_claim_lock = threading.Lock()
+
+
+def _cursor_key(cursor: Any) -> str:
+    return json.dumps(cursor, sort_keys=True, default=str)
+
+
+def _read(key: str) -> dict[str, Any] | None:
+    try:
+        return cache.get(key)
+    except Exception as exc:
+        logger.warning("Topic cache read failed: %s", exc)
+        return None
+
+
+def _write(key: str, entry: dict[str, Any]) -> None:
+    try:
+        cache.set(key, entry, settings.REFRESH_DEADLINE_SECONDS)
+    except Exception as exc:
+        logger.warning("Topic cache write failed: %s", exc)
+
+
+def _claim(key: str) -> bool:
+    try:
+        return cache.add(f"{key}:claim", 1, int(settings.TOPIC_SHARING_WAIT) + 1)
+    except Exception as exc:
+        logger.warning("Topic cache claim failed: %s", exc)
+        return True
+
+
+def _release(key: str) -> None:
+    try:
+        cache.delete(f"{key}:claim")
+    except Exception as exc:
+        logger.warning("Topic cache release failed: %s", exc)
+
+
+def _from_entry(entry: dict[str, Any]) -> TopicFetch:
+    topic_fetch = TopicFetch(entry["posts"], entry["cursor"], n_duplicates=entry["n_duplicates"])
+    topic_fetch.set_scores(entry["scores"])
+    return topic_fetch
+
+
+class TopicRegistry:
+    """Fetches made during one refresh cycle, shared by every country trending the same topic.
+
+    X and Reddit searches are not filtered by country, so for providers marked
+    ``global_search`` each normalized topic (and cursor, when ingesting incrementally) is
+    fetched once and its ``TopicFetch``, scores included, is handed to every country that
+    asks for it. Other providers' fetches stay per country. Concurrent requests for a
+    topic wait for the one in flight, on threads (``fetch``) or on the event loop (``afetch``).
+    With ``DEDUP_ENABLED`` the fetching caller also collapses near-duplicates, so only
+    the kept posts are ever scored.
+
+    When the countries of a cycle are refreshed by separate Celery tasks, each builds its
+    own registry with the same ``cycle`` id and a ``score`` function. Shared topics then
+    go through the Django cache as well: one task claims the topic, fetches and scores it
+    and stores the result under the cycle, and the others wait up to ``TOPIC_SHARING_WAIT``
+    seconds for it instead of fetching again. Those fetches are keyed by topic alone, so
+    every country gets the claimant's cursor and their cursors agree from the next cycle on.
+
+    Build a new registry for every cycle; it never expires entries.
+    """
+
+    def __init__(
+        self,
+        provider,
+        shared: bool | None = None,
+        cycle: str | None = None,
+        score: Callable[[list[str]], BatchScores] | None = None,
+    ) -> None:
+        self.label = provider_label(provider)
+        if shared is None:
+            shared = settings.TOPIC_SHARING and getattr(provider, "global_search", False)
+        self.shared = shared
+        self.cycle = cycle if shared and score is not None else None
+        self._score = score
+        self._futures: dict[tuple, Future] = {}
+        self._tasks: dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, country_code: str, topic: str, cursor: Any) -> tuple:
+        if self.cycle is not None:
+            return (normalize_topic(topic),)
+        key = (normalize_topic(topic), _cursor_key(cursor))
+        return key if self.shared else (country_code, *key)
+
+    def _prepare(self, country_code: str, posts: list[str], cursor: Any) -> TopicFetch:
+        if not settings.DEDUP_ENABLED or not posts:
+            return TopicFetch(posts, cursor)
+        dedup = NearDuplicateFilter(settings.DEDUP_SIMILARITY)
+        with timed("dedup", country_code, self.label):
+            kept = dedup.filter(posts)
+        return TopicFetch([posts[index] for index in kept], cursor, n_duplicates=dedup.collapsed)
+
+    def fetch(
+        self, country_code: str, topic: str, cursor: Any, load: Callable[[], tuple[list[str], Any]]
+    ) -> TopicFetch:
+        """The cycle's ``TopicFetch`` for ``topic``, calling ``load()`` if nobody has yet."""
+        key = self._key(country_code, topic, cursor)
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if not owner:
+            TOPIC_FETCHES.labels(provider=self.label, outcome="shared").inc()
+            return future.result()
+        try:
+            if self.cycle is None:
+                posts, next_cursor = load()
+                topic_fetch, outcome = self._prepare(country_code, posts, next_cursor), "fetched"
+            else:
+                topic_fetch, outcome = self._fetch_for_cycle(country_code, key, load)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        TOPIC_FETCHES.labels(provider=self.label, outcome=outcome).inc()
+        future.set_result(topic_fetch)
+        return future.result()
+
+    def _fetch_for_cycle(
+        self, country_code: str, key: tuple, load: Callable[[], tuple[list[str], Any]]
+    ) -> tuple[TopicFetch, str]:
+        """The topic from the cycle's cache entry, or fetched, scored and stored for the other tasks."""
+        digest = hashlib.blake2b(json.dumps(key).encode(), digest_size=16).hexdigest()
+        cache_key = f"topics:{self.label}:{self.cycle}:{digest}"
+        entry = _read(cache_key)
+        if entry is not None:
+            return _from_entry(entry), "shared"
+        claimed = _claim(cache_key)
+        if not claimed:
+            deadline = time.monotonic() + settings.TOPIC_SHARING_WAIT
+            delay = 0.02
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+                entry = _read(cache_key)
+                if entry is not None:
+                    return _from_entry(entry), "shared"
+        try:
+            posts, next_cursor = load()
+            topic_fetch = self._prepare(country_code, posts, next_cursor)
+            topic_fetch.set_scores(self._score(topic_fetch.posts) if topic_fetch.posts else BatchScores.empty())
+            _write(
+                cache_key,
+                {
+                    "posts": topic_fetch.posts,
+                    "cursor": topic_fetch.cursor,
+                    "n_duplicates": topic_fetch.n_duplicates,
+                    "scores": topic_fetch.scores,
+                },
+            )
+        finally:
+            if claimed:
+                _release(cache_key)
+        return topic_fetch, "fetched"
+
+    async def afetch(
+        self, country_code: str, topic: str, cursor: Any, load: Callable[[], Awaitable[tuple[list[str], Any]]]
+    ) -> TopicFetch:
+        """``fetch`` for the event loop; ``load`` returns a coroutine."""
+        key = self._key(country_code, topic, cursor)
+        task = self._tasks.get(key)
+        owner = task is None
+        if owner:
+
+            async def run() -> TopicFetch:
+                posts, next_cursor = await load()
+                return await asyncio.to_thread(self._prepare, country_code, posts, next_cursor)
+
+            task = self._tasks[key] = asyncio.ensure_future(run())
+        TOPIC_FETCHES.labels(provider=self.label, outcome="fetched" if owner else "shared").inc()
+        # Shielded so one country being cancelled does not cancel the fetch for the others.
+        return await asyncio.shield(task)
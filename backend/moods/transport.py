@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Tokens are treated as expired this many seconds early, so a request never goes out
+# with a token that lapses in flight.
+TOKEN_EXPIRY_MARGIN = 60
+
+_sessions: dict[str, tuple[int, requests.Session]] = {}
+_tokens: dict[str, tuple[str, float]] = {}
+_lock = threading.Lock()
+_token_lock = threading.Lock()
+# Async clients and token locks belong to the event loop that created them.
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]] = (
+    weakref.WeakKeyDictionary()
+)
+_async_token_locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Lock]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_session(name: str) -> requests.Session:
+    """Keep-alive session for one upstream, with a sized pool and retries on 5xx.
+
+    Sessions are per process (recreated after a fork, e.g. in Celery prefork children).
+    429 is deliberately not retried here; rate limits are the caller's to handle.
+    """
+    pid = os.getpid()
+    with _lock:
+        owner, session = _sessions.get(name, (None, None))
+        if session is not None and owner == pid:
+            return session
+        retry = Retry(
+            total=settings.HTTP_RETRIES,
+            backoff_factor=settings.HTTP_BACKOFF,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.HTTP_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[name] = (pid, session)
+        return session
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+    """Keep-alive async client for one upstream on the running event loop.
+
+    Up to ``ASYNC_CONCURRENCY`` connections may be open at once, ``HTTP_POOL_SIZE`` of
+    them kept alive. The transport retries failed connects ``HTTP_RETRIES`` times; unlike
+    the sync session it does not retry 5xx responses.
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=settings.ASYNC_CONCURRENCY, max_keepalive_connections=settings.HTTP_POOL_SIZE
+        )
+        client = httpx.AsyncClient(
+            limits=limits, transport=httpx.AsyncHTTPTransport(limits=limits, retries=settings.HTTP_RETRIES)
+        )
+        clients[name] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's clients; call before a short-lived loop ends."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def get_token(provider: str, identity: str, fetch: Callable[[], tuple[str, int] | None]) -> str | None:
+    """Bearer token for ``identity``, fetched only when no unexpired copy exists.
+
+    Tokens live in a per-process memo backed by the shared Django cache, so every
+    worker and task reuses one token until ``expires_in`` (minus a margin) runs out.
+    ``fetch`` returns ``(token, expires_in)`` or ``None`` on failure.
+    """
+    key = _token_key(provider, identity)
+    token = _memo_token(key)
+    if token:
+        return token
+    with _token_lock:
+        token = _memo_token(key)
+        if token:
+            return token
+        try:
+            shared = cache.get(key)
+        except Exception as exc:
+            logger.warning("Token cache read failed: %s", exc)
+            shared = None
+        if shared:
+            token, expires_at = shared
+            if expires_at > time.time():
+                _tokens[key] = (token, expires_at)
+                return token
+        fetched = fetch()
+        if not fetched:
+            return None
+        token, expires_in = fetched
+        ttl = max(int(expires_in) - TOKEN_EXPIRY_MARGIN, 0)
+        expires_at = time.time() + ttl
+        _tokens[key] = (token, expires_at)
+        if ttl:
+            try:
+                cache.set(key, (token, expires_at), ttl)
+            except Exception as exc:
+                logger.warning("Token cache write failed: %s", exc)
+        return token
+
+
+async def aget_token(provider: str, identity: str, fetch: Callable[[], Awaitable[tuple[str, int] | None]]) -> str | None:
+    """Async ``get_token``: same memo and cache entries, ``fetch`` is a coroutine function.
+
+    Concurrent callers on one loop wait for a single fetch instead of each starting one.
+    """
+    key = _token_key(provider, identity)
+    token = _memo_token(key)
+    if token:
+        return token
+    locks = _async_token_locks.setdefault(asyncio.get_running_loop(), {})
+    async with locks.setdefault(key, asyncio.Lock()):
+        token = _memo_token(key)
+        if token:
+            return token
+        try:
+            shared = await cache.aget(key)
+        except Exception as exc:
+            logger.warning("Token cache read failed: %s", exc)
+            shared = None
+        if shared:
+            token, expires_at = shared
+            if expires_at > time.time():
+                _tokens[key] = (token, expires_at)
+                return token
+        fetched = await fetch()
+        if not fetched:
+            return None
+        token, expires_in = fetched
+        ttl = max(int(expires_in) - TOKEN_EXPIRY_MARGIN, 0)
+        expires_at = time.time() + ttl
+        _tokens[key] = (token, expires_at)
+        if ttl:
+            try:
+                await cache.aset(key, (token, expires_at), ttl)
+            except Exception as exc:
+                logger.warning("Token cache write failed: %s", exc)
+        return token
+
+
+def _token_key(provider: str, identity: str) -> str:
+    return f"oauth:{provider}:{hashlib.blake2b(identity.encode(), digest_size=8).hexdigest()}"
+
+
+def _memo_token(key: str) -> str | None:
+    token, expires_at = _tokens.get(key, (None, 0.0))
+    return token if expires_at > time.time() else None
+
+
+def forget_token(provider: str, identity: str) -> None:
+    """Drop a token the upstream rejected, so the next call fetches a fresh one."""
+    key = _token_key(provider, identity)
+    _tokens.pop(key, None)
+    try:
+        cache.delete(key)
+    except Exception as exc:
+        logger.warning("Token cache delete failed: %s", exc)
+
+
+async def aforget_token(provider: str, identity: str) -> None:
+    key = _token_key(provider, identity)
+    _tokens.pop(key, None)
+    try:
+        await cache.adelete(key)
+    except Exception as exc:
+        logger.warning("Token cache delete failed: %s", exc)
@@ -6,4 +6,5 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("country/<str:code>/panel/", views.country_panel, name="country-panel"),
     path("healthz", views.healthz, name="healthz"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
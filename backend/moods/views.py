@@ -1,9 +1,11 @@
 from django.conf import settings
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import render
 from django.utils import timezone
 
+from moods import metrics
 from moods.models import Country, MoodSnapshot
+from moods.registry import get_country
 
 
 def index(request: HttpRequest) -> HttpResponse:
@@ -11,7 +13,9 @@ def index(request: HttpRequest) -> HttpResponse:
 
 
 def country_panel(request: HttpRequest, code: str) -> HttpResponse:
-    country = get_object_or_404(Country, code=code.upper())
+    country = get_country(code)
+    if country is None:
+        raise Http404("No such country")
     snapshot = country.snapshots.first()
     drivers = snapshot.drivers.all() if snapshot else []
     samples = snapshot.samples.all() if snapshot else []
@@ -37,3 +41,7 @@ def healthz(request: HttpRequest) -> JsonResponse:
     except Exception:
         redis_ok = False
     return JsonResponse({"db": db_ok, "redis": redis_ok})
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE_LATEST)
@@ -1,6 +1,8 @@
 let moodMap;
 let countryMarkers = {};
 let selectedCountry = null;
+let moodSocket = null;
+let lastSequence = null;
 
 function initMap() {
     moodMap = new google.maps.Map(document.getElementById("map"), {
@@ -26,6 +28,10 @@ function initMap() {
         moodMap.data.revertStyle(event.feature);
     });
 
+    // Only countries in view are streamed; the subscription follows the viewport, and
+    // countries panned into view arrive with their latest values in a "state" frame.
+    moodMap.addListener("idle", () => subscribeToViewport());
+
     moodMap.data.addListener("click", (event) => {
         const code = event.feature.getProperty("code") || event.feature.getProperty("id") || event.feature.getId();
         if (code) {
@@ -55,7 +61,11 @@ function initMap() {
 }
 
 function selectCountry(code) {
+    const changed = selectedCountry !== code;
     selectedCountry = code;
+    if (changed) {
+        subscribeToViewport();
+    }
     const url = `/country/${code}/panel/`;
     if (window.htmx) {
         htmx.ajax("GET", url, "#panel");
@@ -68,18 +78,50 @@ function selectCountry(code) {
     }
 }
 
+function subscribeToViewport(since) {
+    const bounds = moodMap.getBounds();
+    if (!bounds || !moodSocket || moodSocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+    const northEast = bounds.getNorthEast();
+    const southWest = bounds.getSouthWest();
+    moodSocket.send(
+        JSON.stringify({
+            type: "subscribe",
+            bounds: { south: southWest.lat(), west: southWest.lng(), north: northEast.lat(), east: northEast.lng() },
+            countries: selectedCountry ? [selectedCountry] : [],
+            // After a reconnect the server replays what was missed since this frame.
+            since: since,
+        })
+    );
+}
+
+function applyMoodUpdate(update) {
+    // Updates carry only the fields that changed since the last frame.
+    const marker = countryMarkers[update.country];
+    if (marker && update.emoji) {
+        marker.setLabel({ text: update.emoji, fontSize: "18px" });
+    }
+    if (selectedCountry && update.country === selectedCountry) {
+        selectCountry(selectedCountry);
+    }
+}
+
 function connectMoodSocket() {
     const protocol = window.location.protocol === "https:" ? "wss" : "ws";
     const socket = new WebSocket(`${protocol}://${window.location.host}/ws/moods/`);
+    moodSocket = socket;
 
+    socket.onopen = () => subscribeToViewport(lastSequence);
     socket.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        if (data.country && countryMarkers[data.country]) {
-            const marker = countryMarkers[data.country];
-            marker.setLabel({ text: data.emoji || "😐", fontSize: "18px" });
+        if (data.type === "delta") {
+            data.updates.forEach(applyMoodUpdate);
+        } else if (data.type === "state") {
+            data.countries.forEach(applyMoodUpdate);
         }
-        if (selectedCountry && data.country === selectedCountry) {
-            selectCountry(selectedCountry);
+        if (data.sequence != null) {
+            lastSequence = Math.max(lastSequence || 0, data.sequence);
         }
     };
 
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from moods import async_providers, transport
+from moods.async_providers import AsyncMockProvider, AsyncRedditProvider, AsyncXProvider, SyncProviderAdapter
+from moods.models import Country
+from moods.providers import MockProvider
+from moods.services import refresh_all, refresh_all_async, refresh_country
+
+
+@pytest.fixture
+def countries(db, settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    settings.TOP_COUNTRIES = ["US", "GB", "DE"]
+    return [
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0.0, centroid_lng=0.0)
+        for code in settings.TOP_COUNTRIES
+    ]
+
+
+def _mock_client(monkeypatch, handler):
+    clients = {}
+
+    def get_async_client(name):
+        return clients.setdefault(name, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    monkeypatch.setattr(async_providers, "get_async_client", get_async_client)
+
+
+def test_async_refresh_matches_sync_refresh(countries):
+    expected = {snapshot.country.code: snapshot.mood_score for snapshot in refresh_all(provider=MockProvider())}
+    snapshots = async_to_sync(refresh_all_async)(provider=AsyncMockProvider(), window_minutes=15)
+    assert {snapshot.country.code: snapshot.mood_score for snapshot in snapshots} == expected
+    assert all(snapshot.n_items == 25 for snapshot in snapshots)
+
+
+def test_sync_adapter_serves_existing_callers(countries):
+    provider = SyncProviderAdapter(AsyncMockProvider())
+    assert provider.get_trends("US") == MockProvider().get_trends("US")
+    assert not hasattr(provider, "sample_new_posts")
+    snapshot = refresh_country(countries[0], provider=provider, window_minutes=15)
+    assert snapshot.n_items == 25
+
+
+def test_x_requests_run_concurrently_on_one_loop(monkeypatch, settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.ASYNC_CONCURRENCY = 500
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return httpx.Response(200, json={"data": [{"text": "hello"}], "meta": {"newest_id": "7"}})
+
+    _mock_client(monkeypatch, handler)
+    provider = AsyncXProvider("token")
+
+    async def fan_out():
+        return await asyncio.gather(*(provider.sample_new_posts("US", f"topic {i}", 20, None) for i in range(300)))
+
+    started = time.perf_counter()
+    results = asyncio.run(fan_out())
+    assert time.perf_counter() - started < 2
+    assert peak == 300
+    assert results[0] == (["hello"], "7")
+
+
+def test_reddit_token_is_fetched_once_for_concurrent_calls(monkeypatch, settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    transport._tokens.clear()
+    token_calls = []
+
+    async def handler(request):
+        if request.url.path.endswith("access_token"):
+            token_calls.append(1)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"access_token": "abc", "expires_in": 3600})
+        assert request.headers["Authorization"] == "Bearer abc"
+        children = [{"data": {"title": "Title", "selftext": "body", "name": "t3_new"}}]
+        return httpx.Response(200, json={"data": {"children": children}})
+
+    _mock_client(monkeypatch, handler)
+    provider = AsyncRedditProvider("client", "secret", "agent")
+
+    async def fan_out():
+        return await asyncio.gather(*(provider.sample_new_posts("US", "topic", 10, "t3_old") for _ in range(20)))
+
+    results = asyncio.run(fan_out())
+    transport._tokens.clear()
+    cache.clear()
+    assert len(token_calls) == 1
+    assert results[0] == (["Title body"], "t3_new")
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from moods.benchmarks import compare_to_baseline, run_benchmarks, write_results
+
+
+@pytest.mark.django_db
+def test_benchmarks_run_and_compare_to_baseline(tmp_path):
+    results = run_benchmarks(sizes=(50,), countries=(3,), log=lambda line: None)
+    assert {result.key for result in results} == {
+        "score_text:50",
+        "aggregate_scores:50",
+        "variance:50",
+        "refresh_country:50",
+        "refresh_all:3",
+    }
+    path = tmp_path / "baseline.json"
+    write_results(results, path)
+    assert compare_to_baseline(results, path, tolerance=0.0) == []
+
+    payload = json.loads(path.read_text())
+    for entry in payload["results"]:
+        entry["throughput"] *= 10
+        entry["queries"] = 0
+    path.write_text(json.dumps(payload))
+    regressions = compare_to_baseline(results, path, tolerance=0.25)
+    assert any("refresh_country:50 throughput" in line for line in regressions)
+    assert any("refresh_all:3 queries" in line for line in regressions)
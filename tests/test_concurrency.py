@@ -0,0 +1,60 @@
+import threading
+import time
+
+from moods.concurrency import fetch_ordered, limited
+from moods.providers import CompositeProvider, MockProvider
+
+
+def test_fetch_ordered_runs_concurrently_and_keeps_input_order(settings):
+    settings.FETCH_WORKERS = 8
+
+    def slow_echo(item):
+        time.sleep(0.05 * (4 - item))
+        return item
+
+    start = time.perf_counter()
+    assert fetch_ordered("topics", slow_echo, range(4)) == [0, 1, 2, 3]
+    assert time.perf_counter() - start < 0.35
+
+
+class CountingSource:
+    name = "counting"
+
+    def __init__(self, label):
+        self.label = label
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @limited
+    def sample_posts(self, country, topic, limit):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return [f"{self.label} {topic}"] * limit
+
+
+def test_provider_limit_caps_in_flight_requests(settings):
+    settings.FETCH_WORKERS = 8
+    settings.PROVIDER_CONCURRENCY = {"counting": 2}
+    source = CountingSource("x")
+    results = fetch_ordered("topics", lambda topic: source.sample_posts("US", topic, 1), [str(i) for i in range(6)])
+    assert results == [[f"x {i}"] for i in range(6)]
+    assert source.peak == 2
+
+
+def test_composite_sources_merge_in_fixed_order(settings):
+    settings.FETCH_WORKERS = 8
+    provider = CompositeProvider(CountingSource("x"), CountingSource("reddit"))
+    assert provider.sample_posts("US", "news", 10) == ["x news"] * 6 + ["reddit news"] * 4
+
+
+def test_mock_provider_is_deterministic_across_threads(settings):
+    settings.FETCH_WORKERS = 8
+    provider = MockProvider()
+    topics = [trend.topic for trend in provider.get_trends("US")]
+    serial = [provider.sample_posts("US", topic, 5) for topic in topics]
+    assert fetch_ordered("topics", lambda topic: provider.sample_posts("US", topic, 5), topics) == serial
@@ -0,0 +1,24 @@
+import pytest
+
+from moods.dedup import NearDuplicateFilter, simhash_batch
+
+HEADLINE = "Markets rally as inflation cools faster than expected across the region today"
+
+
+def test_simhash_ignores_links_mentions_and_retweet_markers():
+    plain, retweet, other = simhash_batch([HEADLINE, f"RT @wire: {HEADLINE} https://t.co/xyz", "Storm warning issued"])
+    assert plain == retweet
+    assert plain != other
+
+
+def test_filter_keeps_first_copy_and_carries_state_across_batches():
+    dedup = NearDuplicateFilter(similarity=0.95)
+    assert dedup.filter([HEADLINE, "Storm warning issued for the coast tonight"]) == [0, 1]
+    assert dedup.filter([f"RT @wire: {HEADLINE}", "Local team wins the cup final", "😀", "😀"]) == [1, 2, 3]
+    assert dedup.kept == 5
+    assert dedup.collapsed == 1
+
+
+def test_filter_rejects_invalid_similarity():
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(similarity=0)
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from moods.executors import resolve_mode, score_window
+from moods.scoring import score_batch
+
+TEXTS = [f"{word} post {index}!" for index in range(60) for word in ("good", "sad LOSS", "angry protest", "update")]
+
+
+def test_resolve_mode_switches_on_threshold(settings):
+    settings.SCORING_EXECUTOR = "auto"
+    settings.SCORING_PARALLEL_THRESHOLD = 100
+    assert resolve_mode(99) == "inline"
+    assert resolve_mode(100) == "process"
+    assert resolve_mode(100, "thread") == "thread"
+    with pytest.raises(ValueError):
+        resolve_mode(1, "gpu")
+
+
+def test_daemonic_workers_score_on_threads(settings, monkeypatch):
+    settings.SCORING_EXECUTOR = "auto"
+    settings.SCORING_PARALLEL_THRESHOLD = 100
+    settings.SCORING_CHUNK_SIZE = 50
+    # Celery's prefork children are daemonic and may not start child processes.
+    monkeypatch.setattr("moods.executors.multiprocessing.current_process", lambda: SimpleNamespace(daemon=True))
+    assert resolve_mode(100) == "thread"
+    assert resolve_mode(100, "process") == "thread"
+    assert np.array_equal(score_window(TEXTS).polarity, score_batch(TEXTS).polarity)
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_pooled_scoring_matches_inline(settings, mode):
+    settings.SCORING_CHUNK_SIZE = 50
+    settings.SCORING_WORKERS = 2
+    expected = score_batch(TEXTS)
+    result = score_window(TEXTS, mode=mode)
+    assert np.array_equal(result.polarity, expected.polarity)
+    assert np.array_equal(result.energy, expected.energy)
+    assert np.array_equal(result.emotions, expected.emotions)
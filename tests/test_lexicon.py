@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from moods.lexicon import Lexicon
+
+
+def test_lexicon_matches_phrases_before_words():
+    lexicon = Lexicon(
+        ["joy", "fear"],
+        {
+            "good": (1.0, ["joy"]),
+            "not good": (-1.0, ["fear"]),
+            "alert": (0.0, ["fear"]),
+        },
+    )
+    ids = lexicon.match("this is not good but good alert not".split())
+    assert [lexicon.polarity[term_id] for term_id in ids] == [-1.0, 1.0, 0.0]
+    pos, neg, counts = lexicon.score_ids(ids)
+    assert (pos, neg) == (1.0, 1.0)
+    assert counts == [1.0, 2.0]
+
+
+def test_lexicon_from_file_is_versioned(tmp_path):
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({"version": "v2", "emotions": ["joy"], "terms": {"Great  Win": {"polarity": 2, "emotions": ["joy"]}}}))
+    lexicon = Lexicon.from_file(path)
+    assert lexicon.version.startswith("v2:")
+    assert lexicon.match(["great", "win"]) == [1]
+    with pytest.raises(ValueError):
+        Lexicon(["joy"], {"sad": (-1.0, ["sadness"])})
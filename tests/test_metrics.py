@@ -0,0 +1,34 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from moods.metrics import observe_response
+from moods.models import Country
+from moods.providers import MockProvider
+from moods.services import refresh_country
+
+
+@pytest.mark.django_db
+def test_refresh_records_stage_timings_and_post_counts(client, settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    country = Country.objects.create(code="FR", name="France", has_trends=True, centroid_lat=0, centroid_lng=0)
+    labels = {"country": "FR", "provider": "mock"}
+    scored_before = REGISTRY.get_sample_value("moodclock_posts_total", {**labels, "outcome": "scored"}) or 0
+
+    refresh_country(country, provider=MockProvider(), window_minutes=15)
+
+    assert REGISTRY.get_sample_value("moodclock_posts_total", {**labels, "outcome": "scored"}) == scored_before + 25
+    for stage in ("get_trends", "sample_posts", "scoring"):
+        assert REGISTRY.get_sample_value("moodclock_stage_seconds_count", {**labels, "stage": stage}) >= 1
+    assert REGISTRY.get_sample_value("moodclock_stage_seconds_count", {"stage": "persist", "country": "FR", "provider": ""}) >= 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert b'moodclock_stage_seconds_bucket{country="FR"' in response.content
+
+
+def test_observe_response_counts_rate_limits():
+    labels = {"provider": "x", "endpoint": "search", "country": "DE"}
+    observe_response("x", "search", "DE", 429)
+    observe_response("x", "search", "DE", 200)
+    assert REGISTRY.get_sample_value("moodclock_provider_rate_limited_total", labels) == 1
+    assert REGISTRY.get_sample_value("moodclock_provider_responses_total", {**labels, "status": "200"}) == 1
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from django.core.cache import cache
+
+from moods import ratelimit
+from moods.providers import XProvider
+
+
+@pytest.fixture
+def quota(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.TOP_COUNTRIES = ["US", "GB"]
+    settings.RATE_LIMIT_RESERVE = 0
+    settings.COUNTRY_PRIORITY = {}
+    cache.clear()
+    yield
+    cache.clear()
+
+
+RESET = int(time.time()) // 10 * 10 + 900
+
+
+def _x_headers(remaining, limit=10):
+    return {"x-rate-limit-limit": str(limit), "x-rate-limit-remaining": str(remaining), "x-rate-limit-reset": str(RESET)}
+
+
+def test_unknown_quota_lets_requests_through(quota):
+    assert all(ratelimit.acquire("x", "search", "US") for _ in range(50))
+
+
+def test_quota_is_split_between_countries_and_fully_used(quota):
+    ratelimit.record("x", "search", 200, _x_headers(10))
+    granted = sum(ratelimit.acquire("x", "search", "US") for _ in range(10))
+    assert granted == 5
+    assert sum(ratelimit.acquire("x", "search", "GB") for _ in range(10)) == 5
+    # Buckets are per endpoint on X; Reddit shares one per client.
+    assert ratelimit.acquire("x", "trends", "US")
+
+
+def test_priority_and_borrowing(quota, settings):
+    settings.COUNTRY_PRIORITY = {"US": 3}
+    ratelimit.record("x", "search", 200, _x_headers(8, limit=8))
+    assert sum(ratelimit.acquire("x", "search", "US") for _ in range(10)) == 6
+    assert sum(ratelimit.acquire("x", "search", "GB") for _ in range(10)) == 2
+
+    # Past its share a country may only borrow quota the others' shares don't need.
+    cache.clear()
+    settings.COUNTRY_PRIORITY = {}
+    ratelimit.record("x", "search", 200, _x_headers(8, limit=8))
+    assert sum(ratelimit.acquire("x", "search", "US") for _ in range(10)) == 4
+    ratelimit.record("x", "search", 200, _x_headers(6, limit=8))
+    assert sum(ratelimit.acquire("x", "search", "US") for _ in range(10)) == 2
+    assert sum(ratelimit.acquire("x", "search", "GB") for _ in range(10)) == 4
+
+
+def test_reddit_headers_share_one_bucket(quota):
+    ratelimit.record("reddit", "search", 200, {"X-Ratelimit-Used": "598", "X-Ratelimit-Remaining": "2.0", "X-Ratelimit-Reset": "120"})
+    assert ratelimit.acquire("reddit", "hot", "US")
+    assert ratelimit.acquire("reddit", "search", "GB")
+    assert not ratelimit.acquire("reddit", "search", "US")
+
+
+def test_provider_defers_instead_of_hitting_429(quota, monkeypatch, settings):
+    settings.RESPONSE_CACHE_ENABLED = False
+    sent = []
+
+    class Response:
+        status_code = 200
+        headers = _x_headers(0)
+
+        def json(self):
+            return {"data": [{"text": "hello"}]}
+
+    class Session:
+        def request(self, method, url, **kwargs):
+            sent.append(url)
+            return Response()
+
+    monkeypatch.setattr("moods.providers.get_session", lambda name: Session())
+    provider = XProvider("token")
+    assert provider.sample_posts("US", "topic", 10) == ["hello"]
+    assert provider.sample_posts("US", "topic", 10) == []
+    assert len(sent) == 1
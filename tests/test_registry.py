@@ -0,0 +1,40 @@
+import pytest
+from django.core.cache import cache
+
+from moods import registry
+from moods.models import Country
+
+
+@pytest.fixture
+def countries(db, settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+    registry.invalidate()
+    Country.objects.create(code="US", name="United States", has_trends=True, woeid=23424977, centroid_lat=39.8, centroid_lng=-98.5)
+    Country.objects.create(code="GB", name="United Kingdom", has_trends=True, woeid=23424975, centroid_lat=54.0, centroid_lng=-2.0)
+    yield
+    registry.invalidate()
+
+
+def test_lookups_need_no_queries_once_loaded(countries, django_assert_num_queries):
+    registry.get_registry()
+    with django_assert_num_queries(0):
+        assert registry.get_registry().get("us").woeid == 23424977
+        assert [country.code for country in registry.countries_for(["GB", "US", "XX"])] == ["US", "GB"]
+        country = registry.get_country("GB")
+    assert country.pk == Country.objects.get(code="GB").pk
+    assert registry.get_country("XX") is None
+
+
+def test_local_saves_and_remote_versions_invalidate(countries, settings):
+    registry.get_registry()
+    Country.objects.filter(code="US").update(woeid=1)
+    assert registry.get_registry().get("US").woeid == 23424977
+
+    # Another process changed the table and published a new version.
+    settings.COUNTRY_REGISTRY_CHECK_SECONDS = 0
+    registry._publish_version()
+    assert registry.get_registry().get("US").woeid == 1
+
+    Country.objects.filter(code="GB").delete()
+    assert registry.get_registry().get("GB") is None
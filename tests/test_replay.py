@@ -0,0 +1,93 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from moods.providers import MockProvider, provider_from_settings
+from moods.replay import RecordingProvider, ReplayError, ReplayProvider, load_recording
+
+
+def test_recording_replays_offline(tmp_path):
+    path = tmp_path / "session.jsonl.gz"
+    recorder = RecordingProvider(MockProvider(), path)
+    trends = recorder.get_trends("US")
+    posts = {trend.topic: recorder.sample_posts("US", trend.topic, 3) for trend in trends}
+
+    replay = ReplayProvider(path)
+    assert replay.get_trends("US") == trends
+    assert {topic: replay.sample_posts("US", topic, 3) for topic in posts} == posts
+    # Countries and topics never recorded still get recorded data, stably.
+    assert replay.get_trends("ZZ") == trends
+    assert replay.sample_posts("ZZ", "unseen", 3) == replay.sample_posts("ZZ", "unseen", 3)
+    assert len(replay.sample_posts("ZZ", "unseen", 3)) == 3
+
+
+def _write(path, events):
+    with gzip.open(path, "wt") as handle:
+        for event in events:
+            handle.write(json.dumps(event) + "\n")
+
+
+def test_time_scale_loop_and_multiplier(tmp_path, monkeypatch):
+    path = tmp_path / "timeline.jsonl.gz"
+    _write(
+        path,
+        [
+            {"t": 1000.0, "call": "get_trends", "country": "US", "result": [["early", 1.0]]},
+            {"t": 1000.0, "call": "sample_posts", "country": "US", "topic": "early", "result": ["a", "b"]},
+            {"t": 1060.0, "call": "get_trends", "country": "US", "result": [["late", 1.0]]},
+            {"t": 1060.0, "call": "sample_posts", "country": "US", "topic": "late", "result": ["c", "d"]},
+            {"t": 1120.0, "call": "sample_posts", "country": "US", "topic": "late", "result": ["e"]},
+        ],
+    )
+    recording = load_recording(path)
+    assert recording.duration == 120
+    clock = {"now": recording.started}
+    monkeypatch.setattr("moods.replay.time.monotonic", lambda: clock["now"])
+
+    replay = ReplayProvider(path, time_scale=10, multiplier=2)
+    assert replay.get_trends("US")[0].topic == "early"
+    clock["now"] += 7  # 70s into the recording
+    assert replay.get_trends("US")[0].topic == "late"
+    assert replay.sample_posts("US", "late", 5) == ["c", "d", "e"]
+    clock["now"] += 6  # wraps around to 10s
+    assert replay.get_trends("US")[0].topic == "early"
+    assert ReplayProvider(path, time_scale=10, loop=False).get_trends("US")[0].topic == "late"
+
+
+def test_injected_errors_and_settings(tmp_path, settings):
+    path = tmp_path / "errors.jsonl.gz"
+    RecordingProvider(MockProvider(), path).get_trends("US")
+    with pytest.raises(ReplayError):
+        ReplayProvider(path, error_rate=1.0).get_trends("US")
+
+    settings.PROVIDER = "replay"
+    settings.REPLAY_PATH = str(path)
+    assert isinstance(provider_from_settings(), ReplayProvider)
+    settings.PROVIDER = "record"
+    settings.RECORD_PROVIDER = "mock"
+    recorder = provider_from_settings()
+    assert isinstance(recorder, RecordingProvider) and isinstance(recorder.provider, MockProvider)
+
+
+def test_concurrent_recorders_keep_the_file_readable(tmp_path):
+    path = tmp_path / "shared.jsonl.gz"
+
+    def record(worker):
+        recorder = RecordingProvider(MockProvider(), path)
+        for _ in range(50):
+            recorder.sample_posts("US", f"topic {worker}", 3)
+
+    threads = [threading.Thread(target=record, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(load_recording(path).pool) == 200
+
+    # A member cut short by a recorder that died mid-write only loses that entry.
+    with open(path, "ab") as handle:
+        member = gzip.compress(json.dumps({"t": 1, "call": "get_trends", "country": "US", "result": []}).encode())
+        handle.write(member[: len(member) // 2])
+    assert len(load_recording(path).pool) == 200
@@ -0,0 +1,149 @@
+import time
+
+import pytest
+import requests
+from django.core.cache import cache
+
+from moods import resilience
+from moods.providers import CompositeProvider, XProvider
+
+
+@pytest.fixture
+def breaker(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.CIRCUIT_FAILURE_THRESHOLD = 3
+    settings.CIRCUIT_COOLDOWN = 0.2
+    cache.clear()
+    resilience._latencies.clear()
+    resilience._failing.clear()
+    yield
+    cache.clear()
+    resilience._latencies.clear()
+    resilience._failing.clear()
+
+
+class FlakySession:
+    def __init__(self):
+        self.calls = 0
+        self.down = True
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise requests.ConnectionError("upstream down")
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"data": [{"text": "back up"}]}'
+        return response
+
+
+def test_circuit_opens_fails_fast_and_closes_after_a_probe(breaker, monkeypatch):
+    session = FlakySession()
+    monkeypatch.setattr("moods.providers.get_session", lambda name: session)
+    provider = XProvider("token")
+    for _ in range(5):
+        assert provider.sample_posts("US", "storm", 10) == []
+    assert session.calls == 3
+    assert resilience.is_open("x", "search")
+    # Other endpoints keep their own circuit.
+    assert not resilience.is_open("x", "trends")
+
+    time.sleep(0.25)
+    assert provider.sample_posts("US", "storm", 10) == []
+    assert session.calls == 4
+    # The failed probe reopens the circuit for twice the cooldown.
+    assert cache.get("circuit:x:search")["cooldown"] == pytest.approx(0.4)
+
+    session.down = False
+    time.sleep(0.45)
+    assert provider.sample_posts("US", "storm", 10) == ["back up"]
+    assert provider.sample_posts("US", "storm", 10) == ["back up"]
+    assert not resilience.is_open("x", "search")
+
+
+class Source:
+    def __init__(self, name):
+        self.name = name
+        self.limits = []
+
+    def sample_posts(self, country, topic, limit):
+        self.limits.append(limit)
+        return [f"{self.name} post"] * limit
+
+
+def test_composite_gives_the_whole_budget_to_the_healthy_source(breaker):
+    x, reddit = Source("x"), Source("reddit")
+    provider = CompositeProvider(x, reddit)
+    assert len(provider.sample_posts("US", "storm", 20)) == 20
+    assert x.limits and reddit.limits
+
+    for _ in range(3):
+        resilience.record_outcome("x", "search", ok=False)
+    x.limits.clear()
+    assert provider.sample_posts("US", "storm", 20) == ["reddit post"] * 20
+    assert x.limits == []
+
+
+def test_timeouts_follow_observed_latency(breaker, settings):
+    settings.ADAPTIVE_TIMEOUT_MIN = 0.1
+    assert resilience.timeout_for("x", "search", 10) == 10
+    for _ in range(50):
+        resilience.record_outcome("x", "search", ok=True, latency=0.2)
+    assert resilience.timeout_for("x", "search", 10) == pytest.approx(0.6)
+    settings.ADAPTIVE_TIMEOUT_MIN = 1
+    assert resilience.timeout_for("x", "search", 10) == 1
+    settings.ADAPTIVE_TIMEOUTS = False
+    assert resilience.timeout_for("x", "search", 10) == 10
+
+
+def test_slow_trend_calls_are_hedged(breaker, settings):
+    settings.HEDGE_ENDPOINTS = {"trends"}
+    for _ in range(50):
+        resilience.record_outcome("x", "trends", ok=True, latency=0.01)
+    delays = iter([1.0, 0.0])
+
+    def call():
+        delay = next(delays)
+        time.sleep(delay)
+        return delay
+
+    started = time.monotonic()
+    assert resilience.hedged(("x", "trends", "US"), call) == 0.0
+    assert time.monotonic() - started < 0.5
+    # Endpoints not listed are sent once.
+    assert resilience.hedged(("x", "search", "US"), lambda: "once") == "once"
+
+
+def test_deferred_probe_is_released(breaker, monkeypatch):
+    session = FlakySession()
+    session.down = False
+    monkeypatch.setattr("moods.providers.get_session", lambda name: session)
+    monkeypatch.setattr("moods.providers.acquire", lambda *labels: False)
+    provider = XProvider("token")
+    for _ in range(3):
+        resilience.record_outcome("x", "search", ok=False)
+    time.sleep(0.25)
+    assert provider.sample_posts("US", "storm", 10) == []
+    assert session.calls == 0
+    assert cache.get("circuit:x:search:probe") is None
+
+    monkeypatch.setattr("moods.providers.acquire", lambda *labels: True)
+    assert provider.sample_posts("US", "storm", 10) == ["back up"]
+    assert not resilience.is_open("x", "search")
+
+
+def test_hedge_prefers_a_slower_success_over_a_server_error(breaker, settings):
+    settings.HEDGE_ENDPOINTS = {"trends"}
+    for _ in range(50):
+        resilience.record_outcome("x", "trends", ok=True, latency=0.01)
+    responses = iter([(0.05, 503), (0.2, 200)])
+
+    def call():
+        delay, status = next(responses)
+        time.sleep(delay)
+        response = requests.Response()
+        response.status_code = status
+        return response
+
+    assert resilience.hedged(("x", "trends", "US"), call).status_code == 200
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+
+from moods import response_cache
+from moods.providers import XProvider
+from moods.ratelimit import RequestDeferred
+
+LABELS = ("x", "trends", "US")
+
+
+class Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@pytest.fixture
+def shared_cache(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.RESPONSE_CACHE_TTLS = {"trends": 60}
+    settings.RATE_LIMIT_SCHEDULING = False
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_fresh_entries_are_served_without_a_request(shared_cache):
+    sent = []
+
+    def send(method, url, labels, **kwargs):
+        sent.append(kwargs["params"])
+        return Response(200, '{"data": [1]}')
+
+    first = response_cache.cached_request("GET", "https://api/t", LABELS, send, params={"a": 1, "b": 2})
+    again = response_cache.cached_request("GET", "https://api/t", LABELS, send, params={"b": 2, "a": 1})
+    other = response_cache.cached_request("GET", "https://api/t", LABELS, send, params={"a": 2})
+    assert first.text == again.text == '{"data": [1]}'
+    assert again.json() == {"data": [1]}
+    assert len(sent) == 2
+    assert other.status_code == 200
+
+
+def test_expired_entries_are_revalidated_or_served_stale(shared_cache, monkeypatch):
+    sent = []
+
+    def send(method, url, labels, **kwargs):
+        sent.append(kwargs["headers"])
+        return Response(304) if kwargs["headers"].get("If-None-Match") == '"v1"' else Response(200, "{}", {"etag": '"v1"'})
+
+    response_cache.cached_request("GET", "https://api/t", LABELS, send)
+    now = time.time()
+    monkeypatch.setattr(response_cache.time, "time", lambda: now + 120)
+    revalidated = response_cache.cached_request("GET", "https://api/t", LABELS, send)
+    assert revalidated.status_code == 200 and revalidated.text == "{}"
+    assert sent[1] == {"If-None-Match": '"v1"'}
+
+    monkeypatch.setattr(response_cache.time, "time", lambda: now + 240)
+
+    def deferred(method, url, labels, **kwargs):
+        raise RequestDeferred("budget spent")
+
+    assert response_cache.cached_request("GET", "https://api/t", LABELS, deferred).text == "{}"
+
+
+def test_concurrent_callers_share_one_upstream_call(shared_cache):
+    sent = []
+
+    def send(method, url, labels, **kwargs):
+        sent.append(1)
+        time.sleep(0.2)
+        return Response(200, '{"data": [{"name": "topic"}]}')
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(response_cache.cached_request("GET", "https://api/t", LABELS, send)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sent) == 1
+    assert {result.text for result in results} == {'{"data": [{"name": "topic"}]}'}
+
+
+def test_provider_trends_come_from_the_cache(shared_cache, monkeypatch):
+    sent = []
+
+    class Session:
+        def request(self, method, url, **kwargs):
+            sent.append(url)
+            return Response(200, '{"data": [{"text": "budget vote"}]}')
+
+    monkeypatch.setattr("moods.providers.get_session", lambda name: Session())
+    monkeypatch.setattr("moods.providers.country_woeid", lambda country: None)
+    provider = XProvider("token")
+    assert provider.get_trends("US") == provider.get_trends("US")
+    assert len(sent) == 1
@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+
+from moods.models import Country, MoodRollup, MoodSnapshot
+from moods.rollups import bucket_start, refresh_rollups
+from moods.scoring import MoodAccumulator, score_batch
+from moods.providers import TrendTopic
+from moods.services import refresh_country, summarize_accumulator
+
+NOW = datetime.datetime(2024, 5, 6, 13, 40, tzinfo=datetime.timezone.utc)
+TEXTS = ["great happy day", "awful sad news", "angry protest", "calm weather", "joy and love", "fear of storm"]
+
+
+@pytest.fixture
+def country(db, settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    settings.WINDOW_MINUTES = 15
+    return Country.objects.create(code="US", name="United States", has_trends=True, centroid_lat=0, centroid_lng=0)
+
+
+def make_snapshots(country, count):
+    accumulators = []
+    for index in range(count):
+        accumulator = MoodAccumulator.from_batch(score_batch(TEXTS[index % len(TEXTS) :] + TEXTS[:1]))
+        MoodSnapshot.objects.create(
+            country=country,
+            window_start=NOW - datetime.timedelta(minutes=15 * index),
+            window_minutes=15,
+            **summarize_accumulator(accumulator, True),
+        )
+        accumulators.append(accumulator)
+    return accumulators
+
+
+def test_bucket_start_aligns_to_utc_epoch():
+    assert bucket_start(NOW, 60) == datetime.datetime(2024, 5, 6, 13, tzinfo=datetime.timezone.utc)
+    assert bucket_start(NOW, 1440) == datetime.datetime(2024, 5, 6, tzinfo=datetime.timezone.utc)
+
+
+def test_rollups_merge_stored_aggregates_hierarchically(country):
+    accumulators = make_snapshots(country, 8)
+    refresh_rollups(now=NOW, since=NOW - datetime.timedelta(days=1))
+
+    hour = MoodRollup.objects.get(window_minutes=60, window_start=bucket_start(NOW, 60))
+    expected = MoodAccumulator()
+    for accumulator in accumulators[:3]:
+        expected.merge(accumulator)
+    assert hour.n_snapshots == 3
+    assert hour.n_items == expected.count
+    assert hour.mood_score == pytest.approx(expected.mood_score)
+
+    day = MoodRollup.objects.get(window_minutes=1440)
+    everything = MoodAccumulator()
+    for accumulator in accumulators:
+        everything.merge(accumulator)
+    assert day.n_snapshots == 8
+    assert day.n_items == everything.count
+    assert MoodAccumulator.from_dict(day.aggregate_state).variance == pytest.approx(everything.variance)
+    assert MoodRollup.objects.filter(window_minutes=10080).count() == 1
+
+
+def test_history_api_serves_rollups_by_resolution(client, country, settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    make_snapshots(country, 4)
+    refresh_rollups(since=NOW - datetime.timedelta(days=1), now=NOW)
+    MoodRollup.objects.filter(window_minutes=1440).update(window_start=datetime.datetime.now(datetime.timezone.utc))
+
+    response = client.get("/api/snapshots/US/history/?hours=24&resolution=1440")
+    assert response.status_code == 200
+    assert [row["window_minutes"] for row in response.json()] == [1440]
+    assert client.get("/api/snapshots/US/history/?resolution=45").status_code == 400
+
+
+class CursorProvider:
+    def __init__(self):
+        self.posts = []
+
+    def get_trends(self, country):
+        return [TrendTopic(topic="weather", weight=1.0)]
+
+    def sample_new_posts(self, country, topic, limit, cursor):
+        start = cursor or 0
+        return self.posts[start : start + limit], len(self.posts)
+
+
+def test_rollups_count_incremental_posts_once(country, settings, monkeypatch):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.CARRY_FORWARD_WEIGHT = 0.5
+    provider = CursorProvider()
+    starts = iter(bucket_start(NOW, 60) + datetime.timedelta(minutes=15 * index) for index in range(3))
+    monkeypatch.setattr("moods.services._window_start", lambda minutes: next(starts))
+    for index in range(3):
+        provider.posts += TEXTS[2 * index : 2 * index + 2]
+        snapshot = refresh_country(country, provider=provider, window_minutes=15)
+    # The latest window still weighs the carried-forward aggregate in, but counts only its own posts.
+    assert snapshot.drivers.get().weight > snapshot.n_items == 2
+
+    refresh_rollups(now=NOW, resolutions=(60,))
+    assert MoodRollup.objects.get(window_minutes=60).n_items == len(TEXTS)
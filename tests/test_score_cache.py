@@ -0,0 +1,41 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from moods import scoring
+from moods.lexicon import Lexicon
+from moods.score_cache import ScoreCache
+from moods.scoring import score_batch, score_text
+
+
+def test_score_cache_counts_hits_and_matches_uncached_scores():
+    cache = ScoreCache(max_entries=10)
+    texts = ["Happy news!", "Happy   news!", "bad crisis", "Happy news!"]
+    first = score_batch(texts, cache=cache)
+    assert cache.stats()["misses"] == 4
+    assert cache.stats()["size"] == 2
+    second = score_batch(texts, cache=cache)
+    assert cache.hits == 4
+    uncached = score_batch(texts)
+    assert (first.polarity == uncached.polarity).all()
+    assert (second.emotions == uncached.emotions).all()
+    assert score_text("bad crisis", cache=cache) == score_text("bad crisis")
+
+
+def test_score_cache_is_bounded_and_shared():
+    shared = LocMemCache("scores", {})
+    writer = ScoreCache(max_entries=2, shared=shared)
+    score_batch(["good", "bad", "sad"], cache=writer)
+    assert writer.stats()["size"] == 2
+
+    reader = ScoreCache(max_entries=2, shared=shared)
+    score_batch(["good", "bad"], cache=reader)
+    assert reader.shared_hits == 2
+    assert reader.misses == 0
+
+
+def test_score_cache_invalidates_on_lexicon_change(monkeypatch):
+    cache = ScoreCache()
+    assert score_batch(["great"], cache=cache).polarity[0] == 1.0
+    lexicon = Lexicon(scoring.EMOTIONS, {"great": (-1.0, [])}, name="inverted")
+    monkeypatch.setattr(scoring, "LEXICON", lexicon)
+    assert score_batch(["great"], cache=cache).polarity[0] == -1.0
+    assert cache.misses == 2
@@ -1,4 +1,6 @@
-from moods.scoring import aggregate_scores, score_text, select_emoji_label
+import pytest
+
+from moods.scoring import MoodAccumulator, aggregate_scores, score_batch, score_text, select_emoji_label, variance
 
 
 def test_score_text_deterministic():
@@ -22,3 +24,54 @@ def test_aggregate_scores():
     assert -1 <= aggregated.mood_score <= 1
     assert 0 <= aggregated.energy <= 1
     assert abs(sum(aggregated.emotions.values()) - 1.0) < 1e-6
+
+
+def test_score_batch_matches_score_text():
+    texts = ["Happy news! Great win!", "bad CRISIS, panic and fear 😨", "", "quiet update report"]
+    batch = score_batch(texts)
+    assert len(batch) == len(texts)
+    for index, text in enumerate(texts):
+        expected = score_text(text)
+        item = batch.item(index)
+        assert item.polarity == expected.polarity
+        assert item.energy == expected.energy
+        assert item.emotions == expected.emotions
+
+
+def test_aggregate_scores_accepts_batch():
+    texts = ["good joy", "sad loss", "angry protest"]
+    from_items = aggregate_scores([score_text(text) for text in texts])
+    from_batch = aggregate_scores(score_batch(texts))
+    assert abs(from_items.mood_score - from_batch.mood_score) < 1e-9
+    assert abs(from_items.energy - from_batch.energy) < 1e-9
+    assert from_items.emotions == pytest.approx(from_batch.emotions)
+    assert variance(score_batch(texts).polarity) == pytest.approx(variance([score_text(text).polarity for text in texts]))
+
+
+def test_mood_accumulator_merge_matches_single_pass():
+    texts = ["good joy win", "sad loss", "angry protest!", "fear panic", "happy update", "bad news"]
+    items = [score_text(text) for text in texts]
+    whole = MoodAccumulator()
+    for item in items:
+        whole.add(item)
+
+    left = MoodAccumulator.from_batch(score_batch(texts[:2]))
+    right = MoodAccumulator.from_dict(MoodAccumulator.from_batch(score_batch(texts[2:])).to_dict())
+    merged = left.merge(right)
+
+    assert merged.count == whole.count == len(texts)
+    assert merged.mood_score == pytest.approx(whole.mood_score)
+    assert merged.energy == pytest.approx(whole.energy)
+    assert merged.variance == pytest.approx(variance([item.polarity for item in items]))
+    assert merged.emotions == pytest.approx(whole.emotions)
+
+
+def test_accumulator_scaled_keeps_means():
+    accumulator = MoodAccumulator.from_batch(score_batch(["good great", "bad awful", "happy joy", "sad"]))
+    half = accumulator.scaled(0.5)
+    assert half.count == 2
+    assert half.polarity_mean == accumulator.polarity_mean
+    assert half.energy == pytest.approx(accumulator.energy)
+    assert half.variance == pytest.approx(accumulator.variance)
+    assert half.emotions == pytest.approx(accumulator.emotions)
+    assert accumulator.scaled(0).count == 0
@@ -0,0 +1,138 @@
+import pytest
+
+from moods.models import Country, MoodDriver, TextSample
+from moods.providers import MockProvider, TrendTopic
+from moods.services import refresh_all, refresh_country
+
+
+@pytest.fixture
+def country(db, settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    return Country.objects.create(
+        code="US",
+        name="United States",
+        has_trends=True,
+        woeid=23424977,
+        centroid_lat=39.8,
+        centroid_lng=-98.5,
+    )
+
+
+@pytest.mark.django_db
+def test_refresh_country_with_mock_provider(country):
+    snapshot = refresh_country(country, provider=MockProvider(), window_minutes=15)
+    assert snapshot is not None
+    assert snapshot.n_items == 25
+    assert -1 <= snapshot.mood_score <= 1
+    assert MoodDriver.objects.filter(snapshot=snapshot).count() == 5
+    assert TextSample.objects.filter(snapshot=snapshot).count() == 5
+    for driver in snapshot.drivers.all():
+        assert driver.n_items == 5
+        assert abs(sum(driver.emotion_probs.values()) - 1.0) < 1e-6
+
+
+FLOOD_HEADLINE = "Markets rally as inflation cools faster than expected across the region today"
+
+
+class FloodProvider:
+    def get_trends(self, country):
+        return [TrendTopic(topic="markets", weight=1.0), TrendTopic(topic="weather", weight=1.0)]
+
+    def sample_posts(self, country, topic, limit):
+        if topic == "markets":
+            return [FLOOD_HEADLINE] + [f"RT @user{index}: {FLOOD_HEADLINE}" for index in range(limit - 1)]
+        return ["Sunny and calm all week", "Heavy rain ruins the weekend plans"]
+
+
+@pytest.mark.django_db
+def test_refresh_country_collapses_duplicate_floods(country, settings):
+    settings.DEDUP_ENABLED = True
+    snapshot = refresh_country(country, provider=FloodProvider(), window_minutes=15)
+    assert snapshot.n_items == 3
+    assert snapshot.n_duplicates == 19
+    assert snapshot.drivers.get(topic="markets").n_items == 1
+
+    settings.DEDUP_ENABLED = False
+    snapshot = refresh_country(country, provider=FloodProvider(), window_minutes=15)
+    assert snapshot.n_items == 22
+    assert snapshot.n_duplicates == 0
+
+
+@pytest.mark.django_db
+def test_refresh_updates_drivers_and_samples_in_place(country):
+    snapshot = refresh_country(country, provider=MockProvider(), window_minutes=15)
+    driver_ids = set(snapshot.drivers.values_list("id", flat=True))
+    sample_ids = set(snapshot.samples.values_list("id", flat=True))
+
+    again = refresh_country(country, provider=MockProvider(), window_minutes=15)
+    assert again.pk == snapshot.pk
+    assert set(again.drivers.values_list("id", flat=True)) == driver_ids
+    assert set(again.samples.values_list("id", flat=True)) == sample_ids
+
+
+@pytest.mark.django_db
+def test_refresh_all_writes_a_cycle_in_constant_queries(country, settings, django_assert_max_num_queries):
+    codes = ["US"] + [f"Q{index}" for index in range(9)]
+    for code in codes[1:]:
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0, centroid_lng=0)
+    settings.TOP_COUNTRIES = codes
+    with django_assert_max_num_queries(10):
+        snapshots = refresh_all(provider=MockProvider(), window_minutes=15)
+    assert len(snapshots) == 10
+    assert MoodDriver.objects.count() == 50
+    assert TextSample.objects.count() == 50
+
+
+class CrossPostProvider:
+    def get_trends(self, country):
+        return [TrendTopic(topic="markets", weight=1.0), TrendTopic(topic="economy", weight=1.0)]
+
+    def sample_posts(self, country, topic, limit):
+        other = {"markets": "Shares slide on weak earnings", "economy": "Unemployment rises for a third month"}[topic]
+        return [FLOOD_HEADLINE, f"RT @desk: {FLOOD_HEADLINE}", other]
+
+
+@pytest.mark.django_db
+def test_dedup_collapses_posts_copied_across_topics(country, settings):
+    settings.DEDUP_ENABLED = True
+    snapshot = refresh_country(country, provider=CrossPostProvider(), window_minutes=15)
+    # One retweet per topic, then the headline again under the second topic.
+    assert snapshot.n_duplicates == 3
+    assert snapshot.n_items == 3
+    assert {driver.topic: driver.n_items for driver in snapshot.drivers.all()} == {"markets": 2, "economy": 1}
+
+
+class CursorProvider:
+    def __init__(self):
+        self.posts = ["Great win today", "Sad news tonight", "Happy fans celebrate"]
+        self.cursors = []
+
+    def get_trends(self, country):
+        return [TrendTopic(topic="sports", weight=1.0)]
+
+    def sample_new_posts(self, country, topic, limit, cursor):
+        self.cursors.append(cursor)
+        start = cursor or 0
+        return self.posts[start : start + limit], len(self.posts)
+
+
+@pytest.mark.django_db
+def test_incremental_refresh_fetches_new_posts_and_carries_aggregates(country, settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    settings.CARRY_FORWARD_WEIGHT = 0.5
+    provider = CursorProvider()
+    first = refresh_country(country, provider=provider, window_minutes=15)
+    assert first.n_items == 3
+
+    provider.posts += ["Angry crowd protest", "Joyful parade downtown"]
+    second = refresh_country(country, provider=provider, window_minutes=15)
+    assert provider.cursors == [None, 3]
+    # Counts and confidence cover this window's posts; the mood includes the carried share.
+    assert second.n_items == 2
+    assert second.drivers.get().n_items == 2
+    assert second.drivers.get().weight == 2 + 2
+
+    quiet = refresh_country(country, provider=provider, window_minutes=15)
+    assert quiet.n_items == 0
+    assert quiet.confidence == "LOW"
+    assert quiet.mood_score == pytest.approx(second.mood_score)
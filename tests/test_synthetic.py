@@ -0,0 +1,55 @@
+import random
+
+import pytest
+from django.core.management import call_command
+
+from moods.dedup import NearDuplicateFilter
+from moods.models import Country, MoodSnapshot
+from moods.synthetic import SyntheticProvider, WorkloadShape
+
+
+def test_synthetic_provider_is_deterministic_and_leaves_global_random_alone():
+    random.seed(123)
+    expected = random.random()
+    random.seed(123)
+    provider = SyntheticProvider(seed=5, shape=WorkloadShape(posts_per_topic=400))
+    trends = provider.get_trends("US")
+    posts = provider.sample_posts("US", trends[0].topic, limit=20)
+    assert random.random() == expected
+
+    again = SyntheticProvider(seed=5, shape=WorkloadShape(posts_per_topic=400))
+    assert again.sample_posts("US", trends[0].topic, limit=20) == posts
+    assert SyntheticProvider(seed=6).get_trends("US") != trends
+    assert len(posts) == 400 and len(trends) == 10
+
+
+def test_synthetic_text_statistics():
+    shape = WorkloadShape(posts_per_topic=2000, duplicate_rate=0.2)
+    posts = SyntheticProvider(shape=shape).sample_posts("US", "economy", limit=20)
+    lengths = sorted(len(post.split()) for post in posts)
+    assert 12 <= lengths[len(lengths) // 2] <= 22
+    dedup = NearDuplicateFilter(0.9)
+    dedup.filter(posts)
+    assert 0.1 < dedup.collapsed / len(posts) < 0.3
+    assert 0.1 < sum(any(ord(char) > 0x2000 for char in post) for post in posts) / len(posts) < 0.4
+    assert any(post.isupper() for post in posts)
+
+
+def test_trends_overlap_across_countries():
+    provider = SyntheticProvider(shape=WorkloadShape(topics_per_country=20, topic_pool=40, shared_topic_rate=0.5))
+    us = {trend.topic for trend in provider.get_trends("US")}
+    gb = {trend.topic for trend in provider.get_trends("GB")}
+    assert us & gb
+    assert any(topic.startswith("us ") for topic in us)
+
+
+@pytest.mark.django_db
+def test_generate_workload_command(settings, tmp_path):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    recording = tmp_path / "workload.jsonl.gz"
+    call_command("generate_workload", countries=12, posts_per_topic=5, refresh=True, record=str(recording))
+    assert Country.objects.filter(code__startswith="SYN").count() == 12
+    assert MoodSnapshot.objects.filter(country__code="SYN00011").exists()
+    assert recording.stat().st_size > 0
+    call_command("generate_workload", clear=True)
+    assert not Country.objects.filter(code__startswith="SYN").exists()
@@ -0,0 +1,117 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from moodclock.celery import app
+from moods.models import Country, MoodSnapshot
+from moods.providers import MockProvider
+from moods.tasks import collect_refresh_results, refresh_all_moods, refresh_country_mood
+
+
+@pytest.fixture
+def eager_celery(settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    settings.PROVIDER = "mock"
+    app.conf.task_always_eager = True
+    yield
+    app.conf.task_always_eager = False
+
+
+@pytest.mark.django_db
+def test_refresh_all_moods_fans_out_one_task_per_country(eager_celery, settings):
+    for code in ("US", "GB"):
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0, centroid_lng=0)
+    settings.TOP_COUNTRIES = ["US", "GB", "ZZ"]
+    assert refresh_all_moods() == 2
+    assert MoodSnapshot.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_refresh_country_mood_past_deadline_is_stale(eager_celery):
+    Country.objects.create(code="US", name="US", has_trends=True, centroid_lat=0, centroid_lng=0)
+    assert refresh_country_mood("US", 15, deadline=time.time() - 1) == {"country": "US", "status": "stale"}
+    assert refresh_country_mood("XX", 15) == {"country": "XX", "status": "failed"}
+    assert not MoodSnapshot.objects.exists()
+
+
+class SlowProvider(MockProvider):
+    def sample_posts(self, country, topic, limit):
+        time.sleep(0.2)
+        return super().sample_posts(country, topic, limit)
+
+
+@pytest.mark.django_db
+def test_refresh_country_mood_stops_when_deadline_passes_mid_task(eager_celery, monkeypatch):
+    Country.objects.create(code="US", name="US", has_trends=True, centroid_lat=0, centroid_lng=0)
+    monkeypatch.setattr("moods.services.provider_from_settings", SlowProvider)
+    assert refresh_country_mood("US", 15, deadline=time.time() + 0.1) == {"country": "US", "status": "stale"}
+    assert not MoodSnapshot.objects.exists()
+
+
+@pytest.mark.django_db
+def test_queued_country_tasks_expire_at_the_deadline(eager_celery, settings, monkeypatch):
+    chords = []
+    monkeypatch.setattr("moods.tasks.chord", lambda header: chords.append(header) or (lambda callback: None))
+    Country.objects.create(code="US", name="US", has_trends=True, centroid_lat=0, centroid_lng=0)
+    settings.TOP_COUNTRIES = ["US"]
+    settings.REFRESH_DEADLINE_SECONDS = 60
+    refresh_all_moods()
+    (task,) = chords[0].tasks
+    assert task.options["expires"].timestamp() == pytest.approx(task.args[2])
+    assert task.args[2] == pytest.approx(time.time() + 60, abs=5)
+
+
+@pytest.mark.django_db
+def test_collect_refresh_results_groups_by_status(eager_celery):
+    summary = collect_refresh_results(
+        [{"country": "US", "status": "ok"}, {"country": "GB", "status": "stale"}], started_at=time.time()
+    )
+    assert summary["ok"] == ["US"]
+    assert summary["stale"] == ["GB"]
+    assert summary["failed"] == []
+
+
+@pytest.mark.django_db
+def test_refresh_cycle_broadcasts_one_frame(eager_celery, settings, monkeypatch):
+    frames = []
+    monkeypatch.setattr("moods.tasks.broadcast_updates", frames.append)
+    monkeypatch.setattr("moods.signals.broadcast_updates", frames.append)
+    for code in ("US", "GB"):
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0, centroid_lng=0)
+    settings.TOP_COUNTRIES = ["US", "GB"]
+    refresh_all_moods()
+    assert [sorted(update["country"] for update in frame) for frame in frames] == [["GB", "US"]]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_standalone_refresh_broadcasts_on_commit(eager_celery, monkeypatch):
+    frames = []
+    monkeypatch.setattr("moods.signals.broadcast_updates", frames.append)
+    Country.objects.create(code="US", name="US", has_trends=True, centroid_lat=0, centroid_lng=0)
+    assert refresh_country_mood("US", 15) == {"country": "US", "status": "ok"}
+    assert [[update["country"] for update in frame] for frame in frames] == [["US"]]
+
+
+@pytest.mark.django_db
+def test_expired_country_task_does_not_drop_the_cycle_broadcast(eager_celery, settings, monkeypatch):
+    frames, chords = [], []
+    monkeypatch.setattr("moods.tasks.broadcast_updates", frames.append)
+    monkeypatch.setattr("moods.tasks.chord", lambda header: lambda callback: chords.append((header, callback)))
+    for code in ("US", "GB"):
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0, centroid_lng=0)
+    settings.TOP_COUNTRIES = ["US", "GB"]
+    refresh_all_moods()
+    (header, callback), = chords
+
+    # US finishes; GB expires in the queue, so Celery fails the chord and calls the errback.
+    us, _ = header.tasks
+    finished = {us.id: us.apply()}
+    revoked = SimpleNamespace(successful=lambda: False)
+    monkeypatch.setattr("moods.tasks.AsyncResult", lambda task_id: finished.get(task_id, revoked))
+    (errback,) = callback.options["link_error"]
+    summary = app.signature(errback)(None, RuntimeError("expired"), None)
+
+    assert summary["ok"] == ["US"]
+    assert summary["stale"] == ["GB"]
+    assert [[update["country"] for update in frame] for frame in frames] == [["US"]]
@@ -0,0 +1,136 @@
+from collections import Counter
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from moodclock.celery import app
+from moods import services
+from moods.models import Country, MoodSnapshot
+from moods.providers import TrendTopic
+from moods.services import refresh_all, refresh_all_async
+from moods.tasks import refresh_all_moods
+from moods.topics import normalize_topic
+
+
+class GlobalSearchProvider:
+    name = "global"
+    global_search = True
+
+    def __init__(self, trends):
+        self.trends = trends
+        self.calls = Counter()
+
+    def get_trends(self, country):
+        return [TrendTopic(topic=topic, weight=1.0) for topic in self.trends[country]]
+
+    def sample_posts(self, country, topic, limit):
+        self.calls[topic] += 1
+        return [f"{topic} is great and happy news", f"{topic} is a sad angry mess"]
+
+
+@pytest.fixture
+def countries(db, settings):
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    settings.TOP_COUNTRIES = ["US", "GB", "DE"]
+    settings.DEDUP_ENABLED = False
+    return [
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0.0, centroid_lng=0.0)
+        for code in settings.TOP_COUNTRIES
+    ]
+
+
+TRENDS = {
+    "US": ["#Election", "Storm"],
+    "GB": ["election", "Football"],
+    "DE": ["ＥＬＥＣＴＩＯＮ", "storm", "#election"],
+}
+
+
+def test_normalize_topic():
+    assert normalize_topic("  #World   Cup ") == normalize_topic("world cup") == "world cup"
+    assert normalize_topic("ＥＬＥＣＴＩＯＮ") == "election"
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    texts = []
+
+    def score_window(batch, cache=None):
+        texts.extend(batch)
+        return original(batch)
+
+    original = services.score_window
+    monkeypatch.setattr(services, "score_window", score_window)
+    return texts
+
+
+def test_refresh_all_fetches_and_scores_each_topic_once(countries, scored):
+    provider = GlobalSearchProvider(TRENDS)
+    snapshots = {snapshot.country.code: snapshot for snapshot in refresh_all(provider=provider)}
+    assert provider.calls == {"#Election": 1, "Storm": 1, "Football": 1}
+    assert len(scored) == 6
+    # DE lists election twice under different spellings; it counts once.
+    assert [snapshot.n_items for snapshot in snapshots.values()] == [4, 4, 4]
+    assert snapshots["US"].mood_score == snapshots["DE"].mood_score
+
+
+def test_async_refresh_shares_topics(countries, scored):
+    provider = GlobalSearchProvider(TRENDS)
+    async_to_sync(refresh_all_async)(provider=provider)
+    assert sum(provider.calls.values()) == 3
+    assert len(scored) == 6
+
+
+@pytest.fixture
+def eager_celery():
+    app.conf.task_always_eager = True
+    yield
+    app.conf.task_always_eager = False
+
+
+def test_refresh_chord_fetches_and_scores_each_topic_once(countries, scored, eager_celery, settings, monkeypatch):
+    # Every country task of the chord builds its own registry; they share through the cache.
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    provider = GlobalSearchProvider(TRENDS)
+    monkeypatch.setattr(services, "provider_from_settings", lambda: provider)
+    assert refresh_all_moods() == 3
+    assert provider.calls == {"#Election": 1, "Storm": 1, "Football": 1}
+    assert len(scored) == 6
+    snapshots = {snapshot.country.code: snapshot for snapshot in MoodSnapshot.objects.all()}
+    assert [snapshots[code].n_items for code in ("US", "GB", "DE")] == [4, 4, 4]
+    assert snapshots["US"].mood_score == snapshots["DE"].mood_score
+
+
+def test_country_scoped_providers_are_not_shared(countries, settings):
+    provider = GlobalSearchProvider(TRENDS)
+    provider.global_search = False
+    refresh_all(provider=provider)
+    assert sum(provider.calls.values()) == 6
+
+    settings.TOPIC_SHARING = False
+    provider = GlobalSearchProvider(TRENDS)
+    refresh_all(provider=provider)
+    assert sum(provider.calls.values()) == 6
+
+
+FLOODS = {
+    "election": ("Polls close as turnout hits a record high in the capital", "Ballots recounted after a bitter campaign"),
+    "storm": ("Coastal towns brace for hurricane winds overnight", "Flooded streets leave residents scared"),
+    "football": ("Underdogs lift the trophy after a stunning final", "Fans furious as the derby ends in defeat"),
+}
+
+
+class FloodingProvider(GlobalSearchProvider):
+    def sample_posts(self, country, topic, limit):
+        self.calls[topic] += 1
+        headline, other = FLOODS[normalize_topic(topic)]
+        return [headline] + [f"RT @user{index}: {headline}" for index in range(9)] + [other]
+
+
+def test_only_kept_posts_are_scored(countries, scored, settings):
+    settings.DEDUP_ENABLED = True
+    snapshots = refresh_all(provider=FloodingProvider(TRENDS))
+    # Three shared topics, each with one headline and one distinct post left to score.
+    assert len(scored) == 6
+    assert all(not text.startswith("RT ") for text in scored)
+    assert [(snapshot.n_items, snapshot.n_duplicates) for snapshot in snapshots] == [(4, 18)] * 3
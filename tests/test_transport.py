@@ -0,0 +1,73 @@
+import pytest
+
+from moods import transport
+from moods.providers import RedditProvider
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    transport._tokens.clear()
+    yield
+    transport._tokens.clear()
+
+
+def test_session_is_pooled_and_reused(settings):
+    settings.HTTP_POOL_SIZE = 7
+    session = transport.get_session("test-upstream")
+    assert transport.get_session("test-upstream") is session
+    adapter = session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == 7
+    assert adapter.max_retries.status_forcelist == (500, 502, 503, 504)
+
+
+def test_token_is_cached_until_expiry_and_shared(locmem_cache, monkeypatch):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return f"token-{len(calls)}", 3600
+
+    assert transport.get_token("reddit", "client", fetch) == "token-1"
+    assert transport.get_token("reddit", "client", fetch) == "token-1"
+    transport._tokens.clear()
+    assert transport.get_token("reddit", "client", fetch) == "token-1"
+    assert len(calls) == 1
+
+    monkeypatch.setattr(transport.time, "time", lambda: 10**12)
+    assert transport.get_token("reddit", "client", fetch) == "token-2"
+    transport.forget_token("reddit", "client")
+    assert transport.get_token("reddit", "client", fetch) == "token-3"
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = ""
+        self.headers = {}
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        if url == RedditProvider.TOKEN_URL:
+            return FakeResponse(200, {"access_token": "abc", "expires_in": 86400})
+        return FakeResponse(200, {"data": {"children": [{"data": {"title": "Hello", "name": "t3_1"}}]}})
+
+
+def test_reddit_provider_fetches_one_token_per_expiry(locmem_cache, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr("moods.providers.get_session", lambda name: session)
+    provider = RedditProvider("id", "secret", "agent")
+    provider.get_trends("US")
+    for topic in ("a", "b", "c"):
+        assert provider.sample_posts("US", topic, 5) == ["Hello"]
+    assert [url for _, url in session.calls].count(RedditProvider.TOKEN_URL) == 1
+    assert len(session.calls) == 1 + 2 + 3
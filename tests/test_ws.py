@@ -1,34 +1,27 @@
+import msgpack
 import pytest
 from asgiref.sync import sync_to_async
 from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import transaction
 from django.test import override_settings
 from django.utils import timezone
 
 from moodclock.asgi import application
+from moods import signals
 from moods.models import Country, MoodSnapshot
+from moods.persistence import SnapshotRecord, save_snapshots
 
+IN_MEMORY = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
-@pytest.mark.asyncio
-@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
-async def test_websocket_smoke(db):
-    country = await sync_to_async(Country.objects.create)(
-        code="US",
-        name="United States",
-        has_trends=True,
-        woeid=23424977,
-        centroid_lat=39.8,
-        centroid_lng=-98.5,
-    )
-
-    communicator = WebsocketCommunicator(application, "/ws/moods/")
-    connected, _ = await communicator.connect()
-    assert connected
 
-    await sync_to_async(MoodSnapshot.objects.create)(
+def _create_snapshot(country, mood_score=0.1):
+    return MoodSnapshot.objects.create(
         country=country,
         window_start=timezone.now(),
         window_minutes=15,
-        mood_score=0.1,
+        mood_score=mood_score,
         energy=0.2,
         emoji="😐",
         label="Neutral",
@@ -37,6 +30,222 @@ async def test_websocket_smoke(db):
         emotion_probs={"joy": 0.2, "neutral": 0.2, "anger": 0.2, "sadness": 0.2, "fear": 0.2},
     )
 
+
+def _record(country, mood_score):
+    return SnapshotRecord(
+        country=country,
+        window_start=timezone.now().replace(second=0, microsecond=0),
+        window_minutes=15,
+        values={
+            "mood_score": mood_score,
+            "energy": 0.2,
+            "emoji": "😐",
+            "label": "Neutral",
+            "confidence": "LOW",
+            "n_items": 5,
+            "emotion_probs": {},
+        },
+        drivers=[],
+        samples=[],
+    )
+
+
+def _countries(*codes):
+    return [
+        Country.objects.create(code=code, name=code, has_trends=True, centroid_lat=0, centroid_lng=0) for code in codes
+    ]
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY)
+async def test_websocket_smoke(transactional_db):
+    (country,) = await sync_to_async(_countries)("US")
+
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    connected, _ = await communicator.connect()
+    assert connected
+
+    await sync_to_async(_create_snapshot)(country)
+
+    message = await communicator.receive_json_from()
+    assert message["type"] == "delta"
+    assert [update["country"] for update in message["updates"]] == ["US"]
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY)
+async def test_cycle_is_one_frame_sent_after_commit(transactional_db):
+    countries = await sync_to_async(_countries)("US", "GB", "DE")
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    await communicator.connect()
+
+    def rolled_back():
+        with transaction.atomic():
+            _create_snapshot(countries[0], mood_score=0.9)
+            transaction.set_rollback(True)
+
+    await sync_to_async(rolled_back)()
+    await sync_to_async(save_snapshots)([_record(country, 0.5) for country in countries])
+
+    message = await communicator.receive_json_from()
+    assert message["type"] == "delta"
+    assert {update["country"] for update in message["updates"]} == {"US", "GB", "DE"}
+    assert {update["mood_score"] for update in message["updates"]} == {0.5}
+    assert await communicator.receive_nothing()
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY, BROADCAST_DEBOUNCE=60)
+async def test_debounce_merges_commits(transactional_db):
+    country, other = await sync_to_async(_countries)("US", "GB")
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    await communicator.connect()
+
+    for mood_score in (0.1, 0.2, 0.3):
+        await sync_to_async(save_snapshots)([_record(country, mood_score)])
+    await sync_to_async(_create_snapshot)(other)
+    assert await communicator.receive_nothing()
+    # The in-memory layer only delivers on the test's loop, so flush here instead of on the timer.
+    await sync_to_async(signals.flush_broadcasts)()
+
+    message = await communicator.receive_json_from()
+    assert sorted((update["country"], update["mood_score"]) for update in message["updates"]) == [
+        ("GB", 0.1),
+        ("US", 0.3),
+    ]
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY)
+async def test_subscriptions_receive_deltas_for_their_countries(transactional_db):
+    us, gb = await sync_to_async(_countries)("US", "GB")
+    jp = await sync_to_async(Country.objects.create)(
+        code="JP", name="Japan", has_trends=True, centroid_lat=36.0, centroid_lng=138.0
+    )
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    await communicator.connect()
+
+    bounds = {"south": 20, "west": 120, "north": 50, "east": 150}
+    await communicator.send_json_to({"type": "subscribe", "countries": ["us"], "bounds": bounds})
+    assert await communicator.receive_json_from() == {"type": "subscribed", "countries": ["JP", "US"]}
+
+    await sync_to_async(save_snapshots)([_record(country, 0.5) for country in (us, gb, jp)])
     message = await communicator.receive_json_from()
-    assert message["country"] == "US"
+    assert {update["country"] for update in message["updates"]} == {"US", "JP"}
+    assert set(message["updates"][0]) == {"country", "emoji", "mood_score", "energy"}
+
+    await sync_to_async(save_snapshots)([_record(us, 0.7), _record(jp, 0.5)])
+    message = await communicator.receive_json_from()
+    assert message["updates"] == [{"country": "US", "mood_score": 0.7}]
+
+    await communicator.send_json_to({"type": "unsubscribe"})
+    assert (await communicator.receive_json_from())["type"] == "error"
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY)
+async def test_msgpack_framing(transactional_db):
+    us, gb = await sync_to_async(_countries)("US", "GB")
+    communicator = WebsocketCommunicator(application, "/ws/moods/?format=msgpack")
+    await communicator.connect()
+    await communicator.send_to(bytes_data=msgpack.packb({"type": "subscribe", "countries": ["GB"]}))
+    assert msgpack.unpackb(await communicator.receive_from()) == {"type": "subscribed", "countries": ["GB"]}
+
+    await sync_to_async(save_snapshots)([_record(us, 0.5), _record(gb, 0.25)])
+    frame = msgpack.unpackb(await communicator.receive_from())
+    assert frame["updates"] == [{"country": "GB", "emoji": "😐", "mood_score": 0.25, "energy": 0.2}]
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY, CACHES=LOCMEM)
+async def test_reconnecting_client_gets_missed_updates(transactional_db):
+    await sync_to_async(cache.clear)()
+    us, gb = await sync_to_async(_countries)("US", "GB")
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    await communicator.connect()
+    await sync_to_async(save_snapshots)([_record(us, 0.1)])
+    seen = (await communicator.receive_json_from())["sequence"]
+    await communicator.disconnect()
+
+    await sync_to_async(save_snapshots)([_record(us, 0.2), _record(gb, 0.3)])
+    await sync_to_async(save_snapshots)([_record(us, 0.4)])
+
+    communicator = WebsocketCommunicator(application, f"/ws/moods/?since={seen}")
+    await communicator.connect()
+    message = await communicator.receive_json_from()
+    assert message["type"] == "delta"
+    assert message["sequence"] == seen + 2
+    assert sorted((update["country"], update["mood_score"]) for update in message["updates"]) == [
+        ("GB", 0.3),
+        ("US", 0.4),
+    ]
+
+    # Nothing was missed, so the replay is empty.
+    await communicator.send_json_to({"type": "subscribe", "countries": ["US"], "since": seen + 2})
+    assert (await communicator.receive_json_from())["type"] == "subscribed"
+    assert await communicator.receive_json_from() == {"type": "delta", "sequence": seen + 2, "updates": []}
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY, CACHES=LOCMEM, BROADCAST_BUFFER=2)
+async def test_gap_past_the_buffer_gets_full_state(transactional_db):
+    await sync_to_async(cache.clear)()
+    us, gb = await sync_to_async(_countries)("US", "GB")
+    for mood_score in (0.1, 0.2, 0.3):
+        await sync_to_async(save_snapshots)([_record(us, mood_score)])
+    await sync_to_async(save_snapshots)([_record(gb, 0.5)])
+
+    assert signals.updates_since(1) == (4, None)
+    assert signals.updates_since(2)[1] == [
+        {"country": "US", "emoji": "😐", "mood_score": 0.3, "energy": 0.2},
+        {"country": "GB", "emoji": "😐", "mood_score": 0.5, "energy": 0.2},
+    ]
+
+    communicator = WebsocketCommunicator(application, "/ws/moods/?since=1")
+    await communicator.connect()
+    message = await communicator.receive_json_from()
+    assert message["type"] == "state"
+    assert message["sequence"] == 4
+    assert sorted((update["country"], update["mood_score"]) for update in message["countries"]) == [
+        ("GB", 0.5),
+        ("US", 0.3),
+    ]
+
+    # Updates after the state frame only carry what changed.
+    await sync_to_async(save_snapshots)([_record(us, 0.6)])
+    message = await communicator.receive_json_from()
+    assert message == {"type": "delta", "sequence": 5, "updates": [{"country": "US", "mood_score": 0.6}]}
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS=IN_MEMORY, CACHES=LOCMEM)
+async def test_countries_added_to_a_subscription_get_their_latest_state(transactional_db):
+    await sync_to_async(cache.clear)()
+    us, gb = await sync_to_async(_countries)("US", "GB")
+    communicator = WebsocketCommunicator(application, "/ws/moods/")
+    await communicator.connect()
+    await communicator.send_json_to({"type": "subscribe", "countries": ["US"]})
+    assert (await communicator.receive_json_from())["type"] == "subscribed"
+
+    await sync_to_async(save_snapshots)([_record(us, 0.5), _record(gb, 0.25)])
+    assert [update["country"] for update in (await communicator.receive_json_from())["updates"]] == ["US"]
+
+    await communicator.send_json_to({"type": "subscribe", "countries": ["US", "GB"]})
+    assert await communicator.receive_json_from() == {"type": "subscribed", "countries": ["GB", "US"]}
+    assert await communicator.receive_json_from() == {
+        "type": "state",
+        "countries": [{"country": "GB", "emoji": "😐", "mood_score": 0.25, "energy": 0.2}],
+    }
+
+    # A bad ``since`` is rejected before the subscription changes.
+    await communicator.send_json_to({"type": "subscribe", "countries": ["GB"], "since": "soon"})
+    assert await communicator.receive_json_from() == {"type": "error", "detail": "Invalid subscription"}
+    assert await communicator.receive_nothing()
     await communicator.disconnect()